@@ -0,0 +1,126 @@
+"""
+Benchmark of the reporting-chain queries answered from the precomputed hierarchy (hierarchy.py) against walking the
+reportsTo column row by row, the way they'd be answered without it. Uses a synthetic directory (see bench_search.py)
+with everyone renamed to a unique name, so both ways agree on who's who.
+
+Usage:	python bench/bench_hierarchy.py [--people 100000] [--queries 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from org_graph import OrgGraph, nameKey, bossKey, COL_NAME, COL_BOSS
+from bench_search import makeDirectory
+
+
+"""
+walkChain:	the management chain above `name`, one boss lookup at a time
+"""
+def walkChain(graph, name):
+	out = []
+	seen = {name}
+	row = graph.byName(name)
+	while row is not None:
+		boss = bossKey(row[COL_BOSS])
+		if not boss or boss in seen:
+			break
+		seen.add(boss)
+		out.append(boss)
+		row = graph.byName(boss)
+	return out
+
+
+"""
+walkHeadcount:	the number of people under `name`, counted by walking down every branch
+"""
+def walkHeadcount(graph, name):
+	seen = {name}
+	stack = [name]
+	while stack:
+		for row in graph.children(stack.pop()):
+			child = nameKey(row[COL_NAME])
+			if child not in seen:
+				seen.add(child)
+				stack.append(child)
+	return len(seen) - 1
+
+
+def walkIsUnder(graph, name, manager):
+	return manager in walkChain(graph, name)
+
+
+def walkCommonManager(graph, a, b):
+	above_b = set(walkChain(graph, b)) | {b}
+	for boss in [a] + walkChain(graph, a):
+		if boss in above_b:
+			return boss
+	return None
+
+
+"""
+walkPath:	the path between `a` and `b` through their lowest common manager, from both management chains
+"""
+def walkPath(graph, a, b):
+	manager = walkCommonManager(graph, a, b)
+	if manager is None:
+		return None
+	up = [a] + walkChain(graph, a)
+	down = [b] + walkChain(graph, b)
+	return (up[:up.index(manager) + 1], down[:down.index(manager) + 1][::-1])
+
+
+"""
+uniqueNames:	returns `rows` with everyone given a unique first name, keeping the same reporting lines
+"""
+def uniqueNames(rows):
+	names = {row[0]: f'{row[0].split("_")[0]}_P{i}_{row[1].split()[1]}' for i, row in enumerate(rows)}
+	return [(names[row[0]], " ".join(names[row[0]].split("_")[1:]), names.get(row[COL_BOSS], ''), *row[3:]) for row in rows]
+
+
+"""
+timeIt:		runs `fn` over every query and returns (mean us per query, results)
+"""
+def timeIt(fn, queries):
+	start = time.perf_counter()
+	out = [fn(*q) for q in queries]
+	return ((time.perf_counter() - start) * 1e6 / len(queries), out)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--people', type=int, default=100000)
+	parser.add_argument('--queries', type=int, default=2000)
+	args = parser.parse_args()
+
+	tbl_rows = uniqueNames(makeDirectory(args.people)[0])
+	start = time.perf_counter()
+	graph = OrgGraph(tbl_rows)
+	load_ms = (time.perf_counter() - start) * 1000
+	hierarchy = graph.hierarchy()
+	print(f'{len(graph)} people loaded (graph and hierarchy) in {load_ms:.0f} ms')
+
+	rng = random.Random(2)
+	names = hierarchy.names
+	pairs = [(rng.choice(names), rng.choice(names)) for i in range(args.queries)]
+	managers = [(rng.choice(names[:200]),) for i in range(args.queries // 20)]	# people near the top: big subtrees
+
+	cases = [
+		('is under',		pairs,					lambda a, b: walkIsUnder(graph, a, b),			hierarchy.isUnder),
+		('chain',			[p[:1] for p in pairs],	lambda a: walkChain(graph, a),					hierarchy.chain),
+		('headcount',		managers,				lambda a: walkHeadcount(graph, a),				hierarchy.headcount),
+		('common manager',	pairs,					lambda a, b: walkCommonManager(graph, a, b),	hierarchy.lowestCommonManager),
+		('path',			pairs,					lambda a, b: walkPath(graph, a, b),				hierarchy.path),
+	]
+	print(f'{"query":<16} {"walk us":>10} {"hierarchy us":>13} {"speedup":>8}  same answers')
+	for label, queries, walk, fast in cases:
+		walk_us, walk_out = timeIt(walk, queries)
+		fast_us, fast_out = timeIt(fast, queries)
+		print(f'{label:<16} {walk_us:>10.2f} {fast_us:>13.2f} {walk_us / fast_us:>7.0f}x  {walk_out == fast_out}')
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,70 @@
+"""
+Measures the `/json` payload for trees of growing size: the one-string `json.dumps` response the route used to send,
+against the streamed response from json_stream.py (uncompressed, gzip and, if installed, brotli). Reports payload
+size, time to the first chunk (a stand-in for time-to-first-byte), and time to produce the whole response.
+
+Usage:	python bench/bench_json.py [--limits 100,1000,5000] [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import json_stream
+from org_graph import OrgGraph
+from tree_builder import Tree, addUser
+from bench_tree_scaling import makeBalancedOrg, GROUP_MAX, RESULT_SIZE
+
+
+"""
+timeStream:	returns (bytes sent, ms to the first non-empty chunk, ms to the whole response) for streaming `tree`
+"""
+def timeStream(tree, encoding):
+	start = time.perf_counter()
+	first = None
+	size = 0
+	for chunk in json_stream.compressChunks(json_stream.iterTree(tree), encoding):
+		if chunk and first is None:
+			first = time.perf_counter() - start
+		size += len(chunk)
+	return (size, first * 1000, (time.perf_counter() - start) * 1000)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--limits', default='100,1000,5000')
+	parser.add_argument('--runs', type=int, default=5)
+	args = parser.parse_args()
+
+	graph = OrgGraph(makeBalancedOrg(10, GROUP_MAX))
+	root = graph.byName('Top_Boss')
+	encodings = [None, 'gzip'] + (['br'] if json_stream.brotli is not None else [])
+	print(f'encoder: {"orjson" if json_stream.orjson is not None else "json"}'
+		+ ('' if json_stream.brotli is not None else ' (brotli not installed)'))
+	print(f'{"nodes":>7} {"response":>16} {"bytes":>10} {"first ms":>9} {"total ms":>9}')
+
+	for limit in [int(n) for n in args.limits.split(',')]:
+		tree = Tree(group_max=GROUP_MAX, node_limit=limit, result_size=RESULT_SIZE)
+		addUser(tree, graph, root, 'Top_Boss')
+
+		# before: the whole tree encoded into one string, nothing sent until it's done
+		start = time.perf_counter()
+		for i in range(args.runs):
+			body = json.dumps(tree.toDict()).encode('utf-8')
+		total = (time.perf_counter() - start) * 1000 / args.runs
+		print(f'{len(tree):>7} {"json.dumps":>16} {len(body):>10} {total:>9.2f} {total:>9.2f}')
+
+		# after: streamed in batches
+		for encoding in encodings:
+			results = [timeStream(tree, encoding) for i in range(args.runs)]
+			size = results[0][0]
+			first = sum(r[1] for r in results) / args.runs
+			total = sum(r[2] for r in results) / args.runs
+			print(f'{len(tree):>7} {"stream " + (encoding or "plain"):>16} {size:>10} {first:>9.2f} {total:>9.2f}')
+
+
+if __name__ == "__main__":
+	main()
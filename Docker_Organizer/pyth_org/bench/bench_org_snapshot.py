@@ -0,0 +1,173 @@
+"""
+Benchmark of the memory-mapped org directory snapshot (org_snapshot.py) against building the org graph in every
+worker. Reports how long a cold build takes versus writing the snapshot once and mapping it, the Python heap each
+one holds, tree build and reporting-chain query times off each, and the memory N worker processes use together
+(their Pss, which splits shared pages between the processes sharing them; Linux only). Checks that the trees and
+queries answered from the snapshot match the ones from the built graph, and exits with status 1 if any differ.
+
+Usage:	python bench/bench_org_snapshot.py [--people 100000] [--limits 300,5000] [--queries 20000] [--workers 4]
+"""
+
+import argparse
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from org_graph import OrgGraph, nameKey
+from org_snapshot import writeSnapshot, openSnapshot
+from tree_builder import Tree, addUser
+from make_org import makeOrg
+
+GROUP_MAX	= 5
+RESULT_SIZE	= 400
+
+# a worker process: loads the directory one way, touches all of it, reports its memory and waits to be let go
+WORKER = '''
+import pickle, sys
+sys.path.insert(0, {app_dir!r})
+from org_graph import OrgGraph
+from org_snapshot import openSnapshot
+
+def pss():
+	with open('/proc/self/smaps_rollup') as fp:
+		return next(int(line.split()[1]) for line in fp if line.startswith('Pss:'))
+
+before = pss()
+graph = OrgGraph()
+if {mapped}:
+	graph.loadSnapshot(openSnapshot({path!r}))
+else:
+	with open({rows!r}, 'rb') as fp:
+		graph.load(pickle.load(fp))
+for row in graph.rows():
+	graph.byID(row[0])
+for name in graph.hierarchy().names:
+	graph.children(name)
+	graph.byName(name)
+print(before, flush=True)
+sys.stdin.read()
+'''
+
+
+"""
+heapOf:		returns (result of `fn()`, seconds it took, KiB of Python heap still allocated by it afterwards)
+"""
+def heapOf(fn):
+	tracemalloc.start()
+	start = time.perf_counter()
+	result = fn()
+	seconds = time.perf_counter() - start
+	kib = tracemalloc.get_traced_memory()[0] / 1024
+	tracemalloc.stop()
+	return (result, seconds, kib)
+
+
+"""
+buildTree:	returns the tree under `name` built off `graph`, and the milliseconds it took
+"""
+def buildTree(graph, name, limit):
+	start = time.perf_counter()
+	tree = Tree(group_max=GROUP_MAX, node_limit=limit, result_size=RESULT_SIZE)
+	addUser(tree, graph, graph.byName(name), name)
+	return (tree.toDict(), (time.perf_counter() - start) * 1000)
+
+
+"""
+workerMemory:	starts `workers` processes that each load the directory (mapped or built) and returns the KiB of Pss
+				they add together, while all of them are up
+"""
+def workerMemory(workers, mapped, path, rows_path):
+	code = WORKER.format(app_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'), mapped=mapped,
+						path=path, rows=rows_path)
+	procs = [subprocess.Popen([sys.executable, '-c', code], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+			for i in range(workers)]
+	baseline = [int(proc.stdout.readline()) for proc in procs]
+	total = 0
+	for proc, before in zip(procs, baseline):
+		with open(f'/proc/{proc.pid}/smaps_rollup') as fp:
+			total += next(int(line.split()[1]) for line in fp if line.startswith('Pss:')) - before
+	for proc in procs:
+		proc.communicate('')
+	return total
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--people', type=int, default=100000)
+	parser.add_argument('--limits', default='300,5000', help='tree node limits to time')
+	parser.add_argument('--queries', type=int, default=20000, help='reporting-chain queries to time')
+	parser.add_argument('--workers', type=int, default=4, help='worker processes for the memory comparison; 0 skips it')
+	args = parser.parse_args()
+
+	rows = makeOrg(args.people)[0]
+	failed = False
+	with tempfile.TemporaryDirectory() as folder:
+		path = os.path.join(folder, 'org_directory.snap')
+		built, build_s, build_kib = heapOf(lambda: OrgGraph(rows))
+		start = time.perf_counter()
+		writeSnapshot(path, rows, 'bench', built.hierarchy())
+		write_s = time.perf_counter() - start
+
+		def mapIt():
+			graph = OrgGraph()
+			graph.loadSnapshot(openSnapshot(path, 'bench'))
+			return graph
+		mapped, open_s, open_kib = heapOf(mapIt)
+
+		print(f'{len(rows)} people, snapshot {os.path.getsize(path) / 1024:.0f} KiB')
+		print(f'{"":<22} {"ms":>9} {"heap KiB":>9}')
+		print(f'{"build graph":<22} {build_s * 1000:>9.1f} {build_kib:>9.0f}')
+		print(f'{"write snapshot":<22} {write_s * 1000:>9.1f}')
+		print(f'{"open snapshot":<22} {open_s * 1000:>9.1f} {open_kib:>9.0f}')
+
+		root = built.hierarchy().names[0]
+		print(f'\n{"tree limit":<22} {"built ms":>9} {"mapped ms":>9} {"nodes":>7}  same')
+		for limit in [int(n) for n in args.limits.split(',')]:
+			tree, built_ms = buildTree(built, root, limit)
+			other, mapped_ms = buildTree(mapped, root, limit)
+			same = tree == other
+			failed = failed or not same
+			print(f'{limit:<22} {built_ms:>9.1f} {mapped_ms:>9.1f} {len(tree["nodes"]):>7}  {same}')
+
+		rng = random.Random(1)
+		names = [nameKey(row[1]) for row in rows]
+		pairs = [(rng.choice(names), rng.choice(names)) for i in range(args.queries)]
+		queries = [
+			('chain', lambda graph, a, b: graph.hierarchy().chain(a)),
+			('headcount', lambda graph, a, b: graph.subtreeSize(a)),
+			('isUnder', lambda graph, a, b: graph.hierarchy().isUnder(a, b)),
+			('children', lambda graph, a, b: graph.children(a)),
+		]
+		print(f'\n{"query":<22} {"built us":>9} {"mapped us":>9}  same')
+		for name, fn in queries:
+			answers = []
+			times = []
+			for graph in (built, mapped):
+				start = time.perf_counter()
+				answers.append([fn(graph, a, b) for a, b in pairs])
+				times.append((time.perf_counter() - start) * 1e6 / len(pairs))
+			same = answers[0] == answers[1]
+			failed = failed or not same
+			print(f'{name:<22} {times[0]:>9.2f} {times[1]:>9.2f}  {same}')
+
+		if args.workers and os.path.exists('/proc/self/smaps_rollup'):
+			rows_path = os.path.join(folder, 'rows.pickle')
+			with open(rows_path, 'wb') as fp:
+				pickle.dump(rows, fp)
+			print(f'\n{args.workers} workers, Pss KiB: built {workerMemory(args.workers, False, path, rows_path)}, '
+				f'mapped {workerMemory(args.workers, True, path, rows_path)}')
+
+	if failed:
+		print('FAILED: the snapshot answers differently from the built graph')
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
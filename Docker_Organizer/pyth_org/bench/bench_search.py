@@ -0,0 +1,125 @@
+"""
+Latency benchmark for the search index on a synthetic directory (100k people by default). Compares an indexed
+search over every field against a plain substring scan of every row, which is what `like '%term%'` makes MySQL do.
+
+Also compares the fan-out search (`SearchIndex.fanOut`, every field searched in turn) against running the per-field
+searches on a thread pool.
+
+Usage:	python bench/bench_search.py [--people 100000] [--queries 500]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search_index import SearchIndex, FIELDS
+
+FIRST = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth', 'William',
+		'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen', 'Priya', 'Wei', 'Ana', 'Sean']
+LAST = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez', 'Hernandez',
+		'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', "O'Brien", 'Nguyen', 'Patel']
+ORGS = ['Network Engineering', 'Retail Operations', 'Customer Care', 'Digital', 'Finance', 'Legal', 'Marketing', 'Security']
+SKILLS = ['Python', 'Java', 'SQL', 'Kubernetes', 'Excel', 'Leadership', 'RF Design', 'Sales', 'Tableau', 'Go', 'Spark']
+
+
+"""
+makeDirectory:	returns (tbl_data rows, cust_data rows) for `people` made-up employees; about a third of them have
+				custom data
+"""
+def makeDirectory(people, seed=1):
+	rng = random.Random(seed)
+	tbl_rows = []
+	cust_rows = []
+	for i in range(people):
+		first = rng.choice(FIRST) + ('' if i < len(FIRST) else str(i % 997))
+		last = rng.choice(LAST)
+		boss = tbl_rows[rng.randrange(len(tbl_rows))][0] if tbl_rows else ''
+		tbl_rows.append((f'{i}_{first}_{last}', f'{first} {last}', boss, 'Engineer', 'Bellevue', rng.choice(ORGS)))
+		if i % 3 == 0:
+			cust_rows.append((f'{first}_{last}', rng.choice(['Engineer', 'Manager', 'Analyst', 'Architect']), '',
+							', '.join(rng.sample(SKILLS, 3)), '', '', ''))
+	return (tbl_rows, cust_rows)
+
+
+"""
+scanSearch:	the search as a table scan: every row of both tables checked for the term
+"""
+def scanSearch(tbl_rows, cust_rows, term):
+	term = term.lower()
+	out = 0
+	for row in tbl_rows:
+		if term in row[1].lower() or term in row[5].lower():
+			out += 1
+	for row in cust_rows:
+		if term in row[1].lower() or term in row[3].lower():
+			out += 1
+	return out
+
+
+"""
+percentiles:	returns the p50/p95/p99 of `times` (seconds) in milliseconds
+"""
+def percentiles(times):
+	times = sorted(times)
+	pick = lambda p: times[min(len(times) - 1, int(len(times) * p))] * 1000
+	return (pick(0.50), pick(0.95), pick(0.99))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--people', type=int, default=100000)
+	parser.add_argument('--queries', type=int, default=500)
+	args = parser.parse_args()
+
+	tbl_rows, cust_rows = makeDirectory(args.people)
+	rng = random.Random(2)
+	terms = [rng.choice([rng.choice(FIRST), rng.choice(LAST), rng.choice(SKILLS), rng.choice(ORGS), rng.choice(tbl_rows)[1]])
+			for i in range(args.queries)]
+
+	start = time.perf_counter()
+	index = SearchIndex()
+	index.load(tbl_rows, cust_rows)
+	print(f'index built for {len(index)} people in {time.perf_counter() - start:.2f}s')
+
+	for label, fn in (('index', lambda t: index.search(t, limit=400)), ('scan', lambda t: scanSearch(tbl_rows, cust_rows, t))):
+		times = []
+		for term in terms:
+			start = time.perf_counter()
+			fn(term)
+			times.append(time.perf_counter() - start)
+		p50, p95, p99 = percentiles(times)
+		print(f'{label:6s} p50 {p50:8.2f} ms   p95 {p95:8.2f} ms   p99 {p99:8.2f} ms')
+
+	# searches for a specific person are the common case and the ones that benefit most
+	names = [rng.choice(tbl_rows)[1] for i in range(args.queries)]
+	times = []
+	for term in names:
+		start = time.perf_counter()
+		index.search(term)
+		times.append(time.perf_counter() - start)
+	p50, p95, p99 = percentiles(times)
+	print(f'names  p50 {p50:8.2f} ms   p95 {p95:8.2f} ms   p99 {p99:8.2f} ms')
+
+	# the lookups are in-memory and hold the GIL, so running them on a thread pool doesn't make the fan-out faster
+	pool = ThreadPoolExecutor(max_workers=len(FIELDS))
+	fan_outs = (
+		('fan-out', lambda t: index.fanOut(t, limit=400)),
+		('pooled', lambda t: [f.result() for f in [pool.submit(index.search, t, [field], 400) for field in FIELDS]]),
+	)
+	for label, fn in fan_outs:
+		times = []
+		for term in terms:
+			start = time.perf_counter()
+			fn(term)
+			times.append(time.perf_counter() - start)
+		p50, p95, p99 = percentiles(times)
+		print(f'{label:7s} p50 {p50:7.2f} ms   p95 {p95:8.2f} ms   p99 {p99:8.2f} ms')
+	pool.shutdown()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,105 @@
+"""
+Benchmark comparing tree build latency of the old per-node SQL recursion in `createTree` against the in-memory
+org graph, and against the level-order build with one `reportsTo IN (...)` query per level. Runs against the same
+MySQL DB the server uses.
+
+Usage:	python bench/bench_tree.py [root name] [--host mysql] [--runs 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pymysql
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from org_graph import OrgGraph, nameKey
+from tree_builder import Tree, addUser, sqlLevel
+
+DB_TO_USE		= 'default'
+TABLE_TO_USE	= 'tbl_data'
+RESULT_SIZE		= 400
+NODES_ON_SCREEN	= 100
+GROUP_MAX		= 5
+
+
+"""
+sqlTree:	the tree build as `createTree` did it before the org graph: one `reportsTo like` query per visited node.
+			Returns the number of nodes added.
+"""
+def sqlTree(cursor, query, group, seen):
+	for_search = query.replace("\'", "\'\'")
+	cursor.execute(f'SELECT * from {DB_TO_USE}.{TABLE_TO_USE} where reportsTo like \'%{for_search}%\'')
+	for item in cursor.fetchmany(size=RESULT_SIZE):
+		item_name = nameKey(item[1])
+		if item_name not in seen:
+			seen.add(item_name)
+			if group < GROUP_MAX and len(seen) < NODES_ON_SCREEN:
+				sqlTree(cursor, item_name, group + 1, seen)
+	return len(seen)
+
+
+"""
+graphTree:	the same walk, answered from the org graph. Returns the number of nodes added.
+"""
+def graphTree(graph, query, group, seen):
+	for item in graph.children(query)[:RESULT_SIZE]:
+		item_name = nameKey(item[1])
+		if item_name not in seen:
+			seen.add(item_name)
+			if group < GROUP_MAX and len(seen) < NODES_ON_SCREEN:
+				graphTree(graph, item_name, group + 1, seen)
+	return len(seen)
+
+
+"""
+levelTree:	the level-order build from tree_builder.py, fetching each level with one query. Returns the number of nodes
+			added.
+"""
+def levelTree(cursor, graph, root):
+	tree = Tree(group_max=GROUP_MAX, node_limit=NODES_ON_SCREEN, result_size=RESULT_SIZE)
+	addUser(tree, graph, graph.byName(root), root, fetch=sqlLevel(cursor, f'{DB_TO_USE}.{TABLE_TO_USE}'))
+	return len(tree)
+
+
+"""
+timeIt:		runs `fn` `runs` times and returns (mean ms, result of the last run)
+"""
+def timeIt(fn, runs):
+	start = time.perf_counter()
+	for i in range(runs):
+		out = fn()
+	return ((time.perf_counter() - start) * 1000 / runs, out)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('root', nargs='?', default='David_Walker')
+	parser.add_argument('--host', default='mysql')
+	parser.add_argument('--port', type=int, default=3306)
+	parser.add_argument('--runs', type=int, default=20)
+	args = parser.parse_args()
+
+	conn = pymysql.connect(host=args.host, port=args.port, user='root', password='wp', database=DB_TO_USE)
+	cursor = conn.cursor()
+
+	start = time.perf_counter()
+	cursor.execute(f'SELECT * from {DB_TO_USE}.{TABLE_TO_USE}')
+	graph = OrgGraph(cursor.fetchall())
+	load_ms = (time.perf_counter() - start) * 1000
+
+	sql_ms, sql_nodes = timeIt(lambda: sqlTree(cursor, args.root, 1, set()), args.runs)
+	graph_ms, graph_nodes = timeIt(lambda: graphTree(graph, args.root, 1, set()), args.runs)
+	level_ms, level_nodes = timeIt(lambda: levelTree(cursor, graph, args.root), args.runs)
+
+	print(f'org graph:  {len(graph)} rows loaded in {load_ms:.1f} ms')
+	print(f'sql tree:   {sql_nodes} nodes, {sql_ms:.2f} ms/tree')
+	print(f'graph tree: {graph_nodes} nodes, {graph_ms:.3f} ms/tree')
+	print(f'level sql:  {level_nodes} nodes, {level_ms:.2f} ms/tree (one query per level)')
+	if graph_ms:
+		print(f'speedup:    {sql_ms / graph_ms:.0f}x')
+
+
+if __name__ == "__main__":
+	main()
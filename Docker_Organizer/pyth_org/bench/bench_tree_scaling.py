@@ -0,0 +1,92 @@
+"""
+Micro-benchmark of tree build time as the node limit grows. Compares the tree builders in tree_builder.py (node
+registry, compact records serialized at the end) against the previous builder, which scanned the whole node list
+for every child it added. The old builder counted expanded nodes against the limit rather than nodes on screen, so
+its trees come out bigger for the same limit; compare the per-node times.
+
+Usage:	python bench/bench_tree_scaling.py [--limits 100,500,1000,2000,5000] [--fan-out 10]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from org_graph import OrgGraph, nameKey
+from tree_builder import Tree, addUser
+
+GROUP_MAX	= 5
+RESULT_SIZE	= 400
+
+
+"""
+makeBalancedOrg:	returns rows for an org chart `depth` levels deep where every manager has `fan_out` reports
+"""
+def makeBalancedOrg(fan_out, depth):
+	rows = [('0_Top_Boss', 'Top Boss', '', 'CEO', 'HQ', 'Exec')]
+	level = [rows[0]]
+	for d in range(depth):
+		next_level = []
+		for boss in level:
+			for i in range(fan_out):
+				n = len(rows)
+				row = (f'{n}_P{n}_L{d}', f'P{n} L{d}', boss[0], 'Eng', 'HQ', 'Org')
+				rows.append(row)
+				next_level.append(row)
+		level = next_level
+	return rows
+
+
+"""
+legacyTree:	the tree build before the node registry: nodes and links as lists of dictionaries, with a scan of every
+			node so far to check whether a child is already in the tree
+"""
+def legacyTree(graph, query, group, data, counters, node_limit):
+	for item in graph.children(query)[:RESULT_SIZE]:
+		item_name = nameKey(item[1])
+		cont_node_flag = False
+		for node in data['nodes']:
+			if node['id'] == item_name:
+				cont_node_flag = True
+		if not cont_node_flag:
+			data['nodes'].append({"id": item_name, "group": group})
+			if group < GROUP_MAX and counters[0] < node_limit:
+				counters[0] += 1
+				legacyTree(graph, item_name, group + 1, data, counters, node_limit)
+		data['links'].append({"source": item_name, "target": query, "value": 1 / group})
+	return data
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--limits', default='100,500,1000,2000,5000')
+	parser.add_argument('--fan-out', type=int, default=10)
+	parser.add_argument('--runs', type=int, default=3)
+	args = parser.parse_args()
+
+	graph = OrgGraph(makeBalancedOrg(args.fan_out, GROUP_MAX))
+	root = graph.byName('Top_Boss')
+	print(f'org of {len(graph)} people, fan-out {args.fan_out}')
+	print(f'{"limit":>6} {"legacy nodes":>13} {"legacy us/node":>15} {"nodes":>7} {"registry us/node":>17}')
+
+	for limit in [int(n) for n in args.limits.split(',')]:
+		start = time.perf_counter()
+		for i in range(args.runs):
+			data = legacyTree(graph, 'Top_Boss', 1, {'nodes': [], 'links': []}, [1], limit)
+		legacy_ms = (time.perf_counter() - start) * 1000 / args.runs
+
+		start = time.perf_counter()
+		for i in range(args.runs):
+			tree = Tree(group_max=GROUP_MAX, node_limit=limit, result_size=RESULT_SIZE)
+			addUser(tree, graph, root, 'Top_Boss')
+			tree.toDict()
+		new_ms = (time.perf_counter() - start) * 1000 / args.runs
+
+		legacy_us = legacy_ms * 1000 / len(data['nodes'])
+		new_us = new_ms * 1000 / len(tree)
+		print(f'{limit:>6} {len(data["nodes"]):>13} {legacy_us:>15.2f} {len(tree):>7} {new_us:>17.2f}')
+
+
+if __name__ == "__main__":
+	main()
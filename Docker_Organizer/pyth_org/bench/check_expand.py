@@ -0,0 +1,79 @@
+"""
+Check of `/expand` (`expandNode`, and the descendant counts it serves) on every kind of node the front-end can click:
+people, the "Reports To: <name>" boss nodes of name searches, and the "Reports To: <uniqueID>" boss nodes of position
+and skills searches. Each node is expanded and must give the same people, and the same headcount, as expanding the
+person behind it by name. Uses a synthetic directory (see bench_search.py), so it needs no DB. Exits with status 1 if
+any node expands differently.
+
+Usage:	python bench/check_expand.py [--people 5000] [--nodes 200]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from org_graph import OrgGraph, nameKey, COL_NAME
+from tree_builder import Tree, addUser, peopleOnNode, expandNode, nodePerson
+from bench_search import makeDirectory
+from bench_hierarchy import uniqueNames
+
+GROUP_MAX	= 5
+NODE_LIMIT	= 300
+
+
+"""
+expand:		returns the set of people `/expand` adds under `node_id`, and the headcount it reports for the node
+"""
+def expand(graph, node_id):
+	tree = Tree(group_max=1, node_limit=NODE_LIMIT, result_size=400)
+	expandNode(tree, graph, node_id)
+	return (set(tree.nodes) - {node_id}, graph.subtreeSize(nodePerson(graph, node_id)[0]))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--people', type=int, default=5000)
+	parser.add_argument('--nodes', type=int, default=200, help='people whose trees are searched for')
+	args = parser.parse_args()
+
+	tbl_rows = uniqueNames(makeDirectory(args.people)[0])
+	graph = OrgGraph(tbl_rows)
+	names = [nameKey(row[COL_NAME]) for row in tbl_rows[1:args.nodes + 1]]
+
+	# the nodes of a name search for each person, and of one skills search matching all of them
+	node_ids = set()
+	for name in names:
+		tree = Tree(group_max=GROUP_MAX, node_limit=NODE_LIMIT, result_size=400)
+		addUser(tree, graph, graph.byName(name), name)
+		node_ids.update(tree.nodes)
+	tree = Tree(group_max=GROUP_MAX, node_limit=len(names) * 3 + 10, result_size=len(names))
+	peopleOnNode(tree, graph, [(name,) for name in names], 'Skill: Python', isSkill=True)
+	node_ids.update(node for node in tree.nodes if node != 'Skill: Python')
+
+	kinds = {'person': 0, 'boss by name': 0, 'boss by uniqueID': 0}
+	failed = []
+	for node_id in sorted(node_ids):
+		name, row = nodePerson(graph, node_id)
+		if ':' not in node_id:
+			kinds['person'] += 1
+		elif graph.byName(node_id.split(':')[-1].strip()) is not None:
+			kinds['boss by name'] += 1
+		else:
+			kinds['boss by uniqueID'] += 1
+		if row is None:
+			failed.append(f'{node_id}: nobody found')
+			continue
+		people, headcount = expand(graph, node_id)
+		if (people, headcount) != expand(graph, name) or headcount != graph.subtreeSize(name):
+			failed.append(f'{node_id}: {len(people)} people, headcount {headcount}; {name} has {graph.subtreeSize(name)}')
+
+	print(', '.join(f'{count} {kind} nodes' for kind, count in kinds.items()) + ' expanded')
+	if failed or not kinds['boss by uniqueID']:
+		print(f'FAILED: {len(failed)} nodes expanded differently from the person behind them, e.g. {failed[:1]}')
+		sys.exit(1)
+	print('OK: every node expands to the people under the person behind it')
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,104 @@
+"""
+Startup-time check for the server: imports `server.py` in fresh Python processes and checks that the import stays
+under a time budget and does no DB work (no connections opened, nothing loaded), since the .csv ingest and index
+building belong in the background startup (`createApp`). Also reports the slowest modules `server.py` imports
+(from `python -X importtime`) and how long the background startup then takes to be ready.
+
+Run it from the folder the server runs in (the .csv path is relative to it). Exits with status 1 if the import is
+over budget or touches the DB.
+
+Usage:	python bench/check_import_time.py [--budget 1.0] [--runs 5] [--top 10] [--no-ready]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# run in a fresh interpreter: time the import, look for DB work, then optionally time the background startup
+CHILD = '''
+import sys, time, json
+sys.path.insert(0, {app_dir!r})
+start = time.perf_counter()
+import server
+imported = time.perf_counter() - start
+out = {{'import': imported, 'connections': server.db_pool.stats()['open'], 'people': len(server.org_graph),
+		'started': server.startup.status()['seconds'] > 0}}
+if {ready}:
+	start = time.perf_counter()
+	server.createApp()
+	out['ready'] = time.perf_counter() - start if server.startup.wait(120) else None
+print('\\nIMPORT-CHECK ' + json.dumps(out))		# on its own line, whatever the startup thread printed
+'''
+
+
+"""
+runChild:	imports the server in a new process and returns what it measured; `importtime` adds Python's own
+			per-module import times (the child's stderr)
+"""
+def runChild(ready, importtime=False):
+	code = CHILD.format(app_dir=APP_DIR, ready=ready)
+	command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+	proc = subprocess.run(command, capture_output=True, text=True)
+	lines = [line for line in proc.stdout.splitlines() if line.startswith('IMPORT-CHECK ')]
+	if proc.returncode != 0 or not lines:
+		sys.exit(f'importing the server failed:\n{proc.stdout}\n{proc.stderr}')
+	return (json.loads(lines[-1][len('IMPORT-CHECK '):]), proc.stderr)
+
+
+"""
+slowestImports:	returns [(milliseconds, module)] for the modules `server.py` imports directly, slowest first, from
+				`-X importtime` output. A module's time includes everything it imports.
+"""
+def slowestImports(stderr, top):
+	found = []
+	for line in stderr.splitlines():
+		if not line.startswith('import time:') or '|' not in line:
+			continue
+		self_us, cumulative_us, name = line[len('import time:'):].split('|')
+		name = name[1:]
+		if not cumulative_us.strip().isdigit():
+			continue
+		if name.startswith('   ') or not name.startswith('  '):		# only direct imports of `server`
+			continue
+		found.append((int(cumulative_us) / 1000, name.strip()))
+	return sorted(found, reverse=True)[:top]
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--budget', type=float, default=1.0, help='seconds importing the server may take')
+	parser.add_argument('--runs', type=int, default=5, help='the import time is the best of this many runs')
+	parser.add_argument('--top', type=int, default=10, help='number of slowest imports listed')
+	parser.add_argument('--no-ready', action='store_true', help="don't time the background startup")
+	args = parser.parse_args()
+
+	runs = [runChild(ready=False)[0] for i in range(args.runs)]
+	best = min(run['import'] for run in runs)
+	touched = [run for run in runs if run['connections'] or run['people'] or run['started']]
+
+	result, stderr = runChild(ready=not args.no_ready, importtime=True)
+	print(f'{"import":<34} {"ms":>8}')
+	for ms, name in slowestImports(stderr, args.top):
+		print(f'{name:<34} {ms:>8.1f}')
+	print(f'\nimport server: {best * 1000:.0f} ms (best of {args.runs}; budget {args.budget * 1000:.0f} ms)')
+	if not args.no_ready:
+		print('ready: ' + (f'{result["ready"] * 1000:.0f} ms after createApp' if result['ready'] is not None else 'not ready after 120 s'))
+
+	failed = False
+	if best > args.budget:
+		print(f'FAILED: importing the server took {best:.2f}s, over the {args.budget:.2f}s budget')
+		failed = True
+	if touched:
+		print(f'FAILED: importing the server did DB work: {touched[0]}')
+		failed = True
+	if failed:
+		sys.exit(1)
+	print('OK: the import is under budget and leaves the DB alone')
+
+
+if __name__ == "__main__":
+	main()
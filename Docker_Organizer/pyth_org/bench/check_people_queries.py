@@ -0,0 +1,90 @@
+"""
+Query-count check for skill/position searches (`peopleOnNode`): builds the people tree for searches matching more and
+more people and counts the SQL statements run to find everyone's boss. Finding each person with its own
+`userName like` query (the old way) runs one statement per match; the batched lookup (`sqlLookup`) runs one, however
+many people match, and the in-memory lookup (`graphLookup`) runs none. The trees built each way are checked to match.
+Uses an in-memory SQLite copy of a synthetic directory (see bench_search.py), so it needs no MySQL.
+
+Usage:	python bench/check_people_queries.py [--people 20000] [--matches 10,100,1000,5000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from org_graph import OrgGraph, nameKey, COL_NAME
+from db_pool import ObservedConnection
+from tree_builder import Tree, peopleOnNode, graphLookup, sqlLookup
+from bench_search import makeDirectory
+from bench_hierarchy import uniqueNames
+from storage import SQLiteStorage
+
+TABLE = 'tbl_data'
+
+
+"""
+rowLookup:	the old lookup: one `userName like` query per person, keeping the first row found
+"""
+def rowLookup(cursor, table):
+	def lookup(names):
+		out = {}
+		for name in names:
+			cursor.execute(f'SELECT * from {table} where userName like %s', ['%' + name.replace('_', ' ') + '%'])
+			row = cursor.fetchone()
+			if row is not None:
+				out[name] = row
+		return out
+	return lookup
+
+
+"""
+buildTree:	returns (tree, statements run, ms) for the people tree of `result` using the lookup made by `make_lookup`
+"""
+def buildTree(graph, result, make_lookup, conn):
+	statements = []
+	observed = ObservedConnection(conn, lambda statement, args, seconds, rows: statements.append(statement))
+	start = time.perf_counter()
+	tree = Tree(group_max=5, node_limit=len(result) * 3 + 10, result_size=len(result))
+	peopleOnNode(tree, graph, result, 'Skill', isSkill=True, lookup=make_lookup(observed.cursor()))
+	return (tree, len(statements), (time.perf_counter() - start) * 1000)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--people', type=int, default=20000)
+	parser.add_argument('--matches', default='10,100,1000,5000')
+	args = parser.parse_args()
+
+	tbl_rows = uniqueNames(makeDirectory(args.people)[0])
+	graph = OrgGraph(tbl_rows)
+	storage = SQLiteStorage()
+	conn = storage.connect()
+	storage.setup(conn)
+	conn.cursor().executemany(f'INSERT INTO {TABLE} VALUES (%s, %s, %s, %s, %s, %s)', tbl_rows)
+	conn.commit()
+
+	lookups = [
+		('per person',	lambda cursor: rowLookup(cursor, TABLE)),
+		('batched',		lambda cursor: sqlLookup(cursor, TABLE)),
+		('in memory',	lambda cursor: graphLookup(graph)),
+	]
+	failed = False
+	print(f'{"matches":>8}  ' + '  '.join(f'{label + " queries":>18} {"ms":>8}' for label, make in lookups) + '  same trees')
+	for n in [int(m) for m in args.matches.split(',')]:
+		# a search result is a list of cust_data rows, the person's name first
+		result = [(nameKey(row[COL_NAME]),) for row in tbl_rows[:n]]
+		runs = [buildTree(graph, result, make, conn) for label, make in lookups]
+		same = all(tree.nodes == runs[0][0].nodes and sorted(tree.links) == sorted(runs[0][0].links) for tree, count, ms in runs)
+		print(f'{n:>8}  ' + '  '.join(f'{count:>18} {ms:>8.1f}' for tree, count, ms in runs) + f'  {same}')
+		failed = failed or not same or runs[1][1] != 1 or runs[2][1] != 0
+
+	if failed:
+		print('FAILED: the batched lookups ran more than one query or built different trees')
+		sys.exit(1)
+	print('OK: one query (batched) or none (in memory) for any number of matches')
+
+
+if __name__ == "__main__":
+	main()
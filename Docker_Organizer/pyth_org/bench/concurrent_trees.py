@@ -0,0 +1,117 @@
+"""
+Concurrent-session check for the per-session trees: two users search for different people at the same time, through
+the app itself (`app.test_client()`, so Flask sessions, `/organizer_tool` and `/json` all take part), and every tree
+served back is checked to be that user's own. Each user's `/json` is fetched both from their session (no `?tree=`)
+and by the tree id their page was rendered with (`?tree=<id>`).
+
+Users are logged in with a signed ID token cookie, the way flask_oidc keeps a login, so no Okta round trip is needed.
+Run it from the folder the server runs in (`client_secrets.json` and the .csv are read from there). Uses the embedded
+SQLite storage unless `STORAGE` is set, so no DB server is needed. Exits with status 1 if any user got a tree that
+isn't theirs.
+
+Usage:	python bench/concurrent_trees.py [--threads 8] [--rounds 25]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+os.environ.setdefault('STORAGE', 'sqlite')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import server
+
+TREE_ID = re.compile(r'/json\?tree=([0-9a-f]+)')
+
+
+"""
+logIn:		returns a test client logged in as `user`, with a session of its own
+"""
+def logIn(user):
+	client = server.app.test_client()
+	name = server.app.config['OIDC_ID_TOKEN_COOKIE_NAME']
+	token = server.oidc.cookie_serializer.dumps({'sub': user, 'exp': time.time() + 3600}).decode()
+	try:
+		client.set_cookie('localhost', name, token)		# Werkzeug before 2.3
+	except TypeError:
+		client.set_cookie(name, token)
+	return client
+
+
+"""
+searchFor:	searches for `person` as `client` and returns (node ids from `/json`, node ids from `/json?tree=<id>`)
+"""
+def searchFor(client, person):
+	page = client.post('/organizer_tool', data={'go': 'GO', 'search_text': person.replace('_', ' ')})
+	if page.status_code != 200:
+		raise RuntimeError(f'searching for {person} returned {page.status_code}')
+	found = TREE_ID.search(page.get_data(as_text=True))
+	if found is None:
+		raise RuntimeError(f'the page for {person} has no tree id')
+	by_session = json.loads(client.get('/json').data)
+	by_id = json.loads(client.get(f'/json?tree={found.group(1)}').data)
+	return ({node['id'] for node in by_session['nodes']}, {node['id'] for node in by_id['nodes']})
+
+
+"""
+pickPeople:	returns two people reporting to `server.TOP_NODE` with reports of their own, so their trees differ
+"""
+def pickPeople():
+	graph = server.org_graph
+	managers = [server.nameKey(row[1]) for row in graph.children(server.TOP_NODE)]
+	managers = [name for name in managers if graph.children(name)]
+	if len(managers) < 2:
+		sys.exit(f'{server.TOP_NODE} needs two reports with reports of their own')
+	return managers[:2]
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--threads', type=int, default=8, help='threads per user')
+	parser.add_argument('--rounds', type=int, default=25, help='searches per thread')
+	args = parser.parse_args()
+
+	server.createApp(wait=True)
+	people = dict(zip(('user-a', 'user-b'), pickPeople()))
+
+	# each user's tree, searched for alone
+	expected = {}
+	for user, person in people.items():
+		by_session, by_id = searchFor(logIn(user), person)
+		if by_session != by_id or person not in by_session:
+			sys.exit(f'FAILED: {user} searching for {person} alone got the wrong tree')
+		expected[user] = by_session
+	if expected['user-a'] == expected['user-b']:
+		sys.exit('FAILED: the two people have the same tree; the check would prove nothing')
+
+	errors = []
+	def worker(user, person):
+		for i in range(args.rounds):
+			client = logIn(user)
+			try:
+				for how, nodes in zip(('/json', '/json?tree='), searchFor(client, person)):
+					if nodes != expected[user]:
+						errors.append(f'{user} got the wrong tree from {how}: {len(nodes ^ expected[user])} nodes differ')
+			except Exception as e:
+				errors.append(f'{user}: {e!r}')
+
+	start = time.perf_counter()
+	threads = [threading.Thread(target=worker, args=item) for item in people.items() for n in range(args.threads)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.perf_counter() - start
+
+	print(f'{len(threads) * args.rounds} searches by 2 users ({", ".join(people.values())}) on {len(threads)} threads in {elapsed:.2f}s')
+	if errors:
+		print(f'FAILED: {len(errors)} responses were wrong, e.g. {errors[0]}')
+		sys.exit(1)
+	print('OK: every user got their own tree, from their session and by tree id')
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,88 @@
+"""
+Load test for a running organizer server: `--users` simulated users (200 by default) each request the given paths in
+a loop, as fast as the server answers, for `--seconds`. Reports throughput, latency percentiles and errors per server,
+so the same load can be run against two servers (e.g. the sync build and the async one) and compared side by side.
+
+`{name}` in a path is replaced by a random person from `--names` (one name per line, formatted <first>_<last>), so
+lookups like `/node_data?node={name}` don't all hit the same cached node.
+
+Usage:	python bench/load_test.py --server sync=http://localhost:5000 --server async=http://localhost:5001 \
+			[--users 200] [--seconds 20] [--path '/node_data?node={name}'] [--names names.txt]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_search import percentiles
+
+
+"""
+user:		one simulated user: requests a random path until `deadline`, adding each request's latency to `times`
+			and counting failed requests in `errors`
+"""
+async def user(session, base, paths, names, deadline, times, errors, rng):
+	while time.perf_counter() < deadline:
+		path = rng.choice(paths).replace('{name}', rng.choice(names))
+		start = time.perf_counter()
+		try:
+			async with session.get(base + path) as response:
+				await response.read()
+				if response.status >= 400:
+					errors.append(response.status)
+					continue
+		except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+			errors.append(type(e).__name__)
+			continue
+		times.append(time.perf_counter() - start)
+
+
+"""
+run:		puts `users` simulated users on the server at `base` for `seconds`, and returns (requests per second,
+			latencies in seconds, errors)
+"""
+async def run(base, paths, names, users, seconds):
+	times = []
+	errors = []
+	connector = aiohttp.TCPConnector(limit=users)
+	timeout = aiohttp.ClientTimeout(total=60)
+	async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+		deadline = time.perf_counter() + seconds
+		start = time.perf_counter()
+		await asyncio.gather(*(user(session, base, paths, names, deadline, times, errors, random.Random(i)) for i in range(users)))
+		elapsed = time.perf_counter() - start
+	return (len(times) / elapsed, times, errors)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--server', action='append', required=True, help='label=base URL of a server to load; repeat to compare')
+	parser.add_argument('--path', action='append', help="path to request; repeat for a mix (default: '/node_data?node={name}')")
+	parser.add_argument('--names', help='file of names to fill `{name}` with (default: David_Walker)')
+	parser.add_argument('--users', type=int, default=200)
+	parser.add_argument('--seconds', type=float, default=20)
+	args = parser.parse_args()
+
+	paths = args.path or ['/node_data?node={name}']
+	names = ['David_Walker']
+	if args.names:
+		with open(args.names) as fp:
+			names = [line.strip() for line in fp if line.strip()]
+
+	print(f'{args.users} users for {args.seconds:.0f}s per server, paths: {", ".join(paths)}')
+	print(f'{"server":<10} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"requests":>9} {"errors":>7}')
+	for server in args.server:
+		label, base = server.split('=', 1)
+		rps, times, errors = asyncio.run(run(base.rstrip('/'), paths, names, args.users, args.seconds))
+		p50, p95, p99 = percentiles(times) if times else (0, 0, 0)
+		print(f'{label:<10} {rps:>9.1f} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {len(times):>9} {len(errors):>7}')
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,126 @@
+"""
+Synthetic org-chart generator. Writes a made-up directory in the format `server.py` ingests (the Workday .csv:
+uniqueID, userName, reportsTo, title, location, orgName) plus matching `cust_data` rows, so the app can be loaded and
+benchmarked without the real export. The shape is configurable: headcount, average fan-out (reports per manager),
+depth, and how many people share a name with someone else or have an apostrophe in their name.
+
+Usage:	python bench/make_org.py --out data/ [--people 10000] [--fan-out 8] [--depth 6] [--collisions 0.02]
+			[--apostrophes 0.03] [--cust 0.33] [--seed 1]
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_search import FIRST, LAST, ORGS, SKILLS
+
+TBL_HEADER	= ['uniqueID', 'userName', 'reportsTo', 'title', 'location', 'orgName']
+CUST_HEADER	= ['user', 'position', 'email', 'skills', 'team_dscrp', 'distros', 'share_pnts']
+APOSTROPHE_LAST = ["O'Brien", "D'Angelo", "O'Neil", "N'Diaye", "D'Souza", "O'Connor"]
+TITLES		= ['Engineer', 'Sr. Engineer', 'Analyst', 'Architect', 'Designer', 'Specialist', 'Consultant']
+MANAGER_TITLES = ['Manager', 'Sr. Manager', 'Director', 'Sr. Director', 'VP']
+LOCATIONS	= ['Bellevue', 'Overland Park', 'Atlanta', 'Frisco', 'Albuquerque', 'Remote']
+
+
+"""
+makeOrg:	returns (tbl_data rows, cust_data rows) for a made-up org chart of `people` employees under one root.
+			Managers get about `fan_out` reports each, level by level; once `depth` levels are full, the remaining
+			people go to random managers on the last level of managers.
+
+----Variables----
+people:			number of employees
+fan_out:		average number of reports per manager
+depth:			the most levels below the root
+collisions:		share of people given the name of someone already in the directory (other than the root)
+apostrophes:	share of people with an apostrophe in their last name
+cust:			share of people with custom data (`cust_data`)
+seed:			random seed; the same arguments always make the same org
+"""
+def makeOrg(people, fan_out=8, depth=6, collisions=0.02, apostrophes=0.03, cust=0.33, seed=1):
+	rng = random.Random(seed)
+	tbl_rows = []
+	cust_rows = []
+	taken = set()
+	names = []
+
+	def newName():
+		# anyone but the root can share a name; a second person named like the root would give the root a boss
+		if len(names) > 1 and rng.random() < collisions:
+			return rng.choice(names[1:])
+		first = rng.choice(FIRST)
+		last = rng.choice(APOSTROPHE_LAST) if rng.random() < apostrophes else rng.choice(LAST)
+		base, n = first, 1
+		while (first, last) in taken:
+			n += 1
+			first = f'{base}{n}'
+		taken.add((first, last))
+		names.append((first, last))
+		return (first, last)
+
+	def add(boss, level):
+		first, last = newName()
+		i = len(tbl_rows)
+		org = boss[5] if boss is not None and level > 1 else rng.choice(ORGS)
+		row = (f'{i}_{first}_{last}', f'{first} {last}', boss[0] if boss else '', rng.choice(TITLES),
+				rng.choice(LOCATIONS), org if boss else 'Executive')
+		tbl_rows.append(row)
+		if rng.random() < cust:
+			cust_rows.append((f'{first}_{last}', rng.choice(TITLES), f'{first}.{last}@example.com'.lower().replace("'", ''),
+							', '.join(rng.sample(SKILLS, rng.randint(1, 4))), f'{org} team', '', ''))
+		return row
+
+	level = [add(None, 0)]
+	for d in range(1, depth + 1):
+		next_level = []
+		for boss in level:
+			for i in range(max(1, int(rng.gauss(fan_out, fan_out / 3)))):
+				if len(tbl_rows) >= people:
+					break
+				next_level.append(add(boss, d))
+		if len(tbl_rows) >= people or not next_level:
+			break
+		if d < depth:
+			level = next_level
+	while len(tbl_rows) < people:
+		add(rng.choice(level), depth)
+
+	# people with reports get a manager's title
+	bosses = {row[2] for row in tbl_rows}
+	tbl_rows = [row[:3] + (rng.choice(MANAGER_TITLES),) + row[4:] if row[0] in bosses else row for row in tbl_rows]
+	return (tbl_rows, cust_rows)
+
+
+"""
+writeCSV:	writes `rows` with a header row to the .csv file at `path`, in the encoding the ingest reads
+"""
+def writeCSV(path, header, rows):
+	with open(path, 'w', encoding='ISO-8859-1', newline='') as fp:
+		writer = csv.writer(fp, delimiter=',', quotechar='"')
+		writer.writerow(header)
+		writer.writerows(rows)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--out', required=True, help='folder the org.csv and cust_data.csv files are written to')
+	parser.add_argument('--people', type=int, default=10000)
+	parser.add_argument('--fan-out', type=int, default=8)
+	parser.add_argument('--depth', type=int, default=6)
+	parser.add_argument('--collisions', type=float, default=0.02)
+	parser.add_argument('--apostrophes', type=float, default=0.03)
+	parser.add_argument('--cust', type=float, default=0.33)
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+
+	tbl_rows, cust_rows = makeOrg(args.people, args.fan_out, args.depth, args.collisions, args.apostrophes, args.cust, args.seed)
+	os.makedirs(args.out, exist_ok=True)
+	writeCSV(os.path.join(args.out, 'org.csv'), TBL_HEADER, tbl_rows)
+	writeCSV(os.path.join(args.out, 'cust_data.csv'), CUST_HEADER, cust_rows)
+	print(f'{len(tbl_rows)} people ({len(cust_rows)} with custom data) written to {args.out}; root is {tbl_rows[0][1]}')
+
+
+if __name__ == "__main__":
+	main()
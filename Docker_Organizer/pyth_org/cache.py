@@ -0,0 +1,112 @@
+"""
+Bounded, thread-safe LRU cache with optional time-to-live, used for finished trees and node detail lookups. Keeps
+hit/miss/eviction counters so cache effectiveness can be monitored.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+"""
+LRUCache:	least recently used cache of at most `max_size` entries. Entries older than `ttl` seconds are treated
+			as missing; a `ttl` of None keeps entries until they are evicted or invalidated.
+
+----Variables----
+max_size:	the most entries kept before the least recently used one is dropped
+ttl:		seconds an entry stays valid, or None for no expiry
+"""
+class LRUCache:
+
+	def __init__(self, max_size=1000, ttl=None):
+		self._lock = threading.Lock()
+		self._data = OrderedDict()		# key -> (time stored, value)
+		self.max_size = max_size
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.invalidations = 0
+		self.stale_puts = 0
+		self.generation = 0				# bumped by every invalidation, even of keys that weren't cached (see `put`)
+
+	def __len__(self):
+		return len(self._data)
+
+	"""
+	get:	returns the value cached for `key`, or `default` if there is none (or it has expired)
+	"""
+	def get(self, key, default=None):
+		with self._lock:
+			entry = self._data.get(key)
+			if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+				del self._data[key]
+				self.evictions += 1
+				entry = None
+			if entry is None:
+				self.misses += 1
+				return default
+			self._data.move_to_end(key)
+			self.hits += 1
+			return entry[1]
+
+	"""
+	put:	caches `value` under `key`, dropping the least recently used entries if the cache is full. Pass the cache's
+			`generation` from before `value` was read to have the put skipped if anything was invalidated since, so a
+			value read just before an invalidation isn't cached after it. Returns whether it was cached.
+	"""
+	def put(self, key, value, generation=None):
+		with self._lock:
+			if generation is not None and generation != self.generation:
+				self.stale_puts += 1
+				return False
+			self._data[key] = (time.monotonic(), value)
+			self._data.move_to_end(key)
+			while len(self._data) > self.max_size:
+				self._data.popitem(last=False)
+				self.evictions += 1
+			return True
+
+	"""
+	invalidate:	drops the entry for `key`, if any
+	"""
+	def invalidate(self, key):
+		with self._lock:
+			self.generation += 1
+			if self._data.pop(key, None) is not None:
+				self.invalidations += 1
+
+	"""
+	invalidateWhere:	drops every entry for which `test(key, value)` is true
+	"""
+	def invalidateWhere(self, test):
+		with self._lock:
+			self.generation += 1
+			stale = [key for key, entry in self._data.items() if test(key, entry[1])]
+			for key in stale:
+				del self._data[key]
+			self.invalidations += len(stale)
+
+	def clear(self):
+		with self._lock:
+			self.generation += 1
+			self.invalidations += len(self._data)
+			self._data.clear()
+
+	"""
+	stats:	returns the cache's counters as a dictionary
+	"""
+	def stats(self):
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				'size':				len(self._data),
+				'max_size':			self.max_size,
+				'ttl':				self.ttl,
+				'hits':				self.hits,
+				'misses':			self.misses,
+				'hit_rate':			round(self.hits / lookups, 4) if lookups else None,
+				'evictions':		self.evictions,
+				'invalidations':	self.invalidations,
+				'stale_puts':		self.stale_puts,
+			}
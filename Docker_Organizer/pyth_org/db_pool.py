@@ -0,0 +1,248 @@
+"""
+Bounded pool of MySQL connections. Each request checks a connection out of the pool instead of sharing one
+connection across the whole server, connections are health-checked before being handed out, and new connections
+are retried with exponential backoff when the DB is unreachable. The pool keeps counters (wait time, connections in
+use, errors) for monitoring.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+"""
+PoolTimeout:	raised when no connection could be checked out of the pool within its timeout
+"""
+class PoolTimeout(Exception):
+	pass
+
+
+"""
+ConnectionPool:	thread-safe pool of up to `max_size` DB connections.
+
+----Variables----
+connect:		function returning a new DB-API connection
+max_size:		the most connections the pool will have open at once
+timeout:		seconds to wait for a free connection before raising `PoolTimeout`
+retries:		attempts made to open a new connection before giving up
+backoff:		seconds to wait after the first failed attempt; doubled after each failure
+"""
+class ConnectionPool:
+
+	def __init__(self, connect, max_size=10, timeout=10.0, retries=5, backoff=0.5):
+		self._connect = connect
+		self._cond = threading.Condition()
+		self._idle = []			# connections ready to be handed out
+		self._size = 0			# connections open, idle or in use
+		self.max_size = max_size
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+
+		# counters exposed by `stats`
+		self._checkouts = 0
+		self._waits = 0
+		self._wait_time = 0.0
+		self._max_wait = 0.0
+		self._errors = 0
+		self._reconnects = 0
+
+	"""
+	newConnection:	opens a new connection, retrying with exponential backoff. Raises the last error if every
+					attempt fails.
+	"""
+	def newConnection(self):
+		delay = self.backoff
+		for attempt in range(1, self.retries + 1):
+			try:
+				return self._connect()
+			except Exception as e:
+				with self._cond:
+					self._errors += 1
+				print(f"--------Error connecting server.py to mysql backend! (attempt {attempt}/{self.retries}): {e}--------")
+				if attempt == self.retries:
+					raise
+				time.sleep(delay)
+				delay *= 2
+
+	"""
+	healthy:	pings `conn`, letting the driver reconnect it if the server dropped it. Returns False if the
+				connection can't be used anymore.
+	"""
+	def healthy(self, conn):
+		try:
+			conn.ping(reconnect=True)
+			return True
+		except Exception:
+			with self._cond:
+				self._errors += 1
+			return False
+
+	"""
+	acquire:	checks a connection out of the pool, waiting up to `timeout` seconds for one to be free
+	"""
+	def acquire(self):
+		start = time.perf_counter()
+		with self._cond:
+			waited = False
+			while not self._idle and self._size >= self.max_size:
+				waited = True
+				remaining = self.timeout - (time.perf_counter() - start)
+				if remaining <= 0:
+					self._errors += 1
+					raise PoolTimeout(f'no DB connection free after {self.timeout}s ({self._size} in use)')
+				self._cond.wait(remaining)
+
+			conn = self._idle.pop() if self._idle else None
+			if conn is None:
+				self._size += 1			# reserve the slot before connecting outside the lock
+
+			wait = time.perf_counter() - start
+			self._checkouts += 1
+			self._wait_time += wait
+			self._max_wait = max(self._max_wait, wait)
+			if waited:
+				self._waits += 1
+
+		if conn is not None and not self.healthy(conn):
+			self._close(conn)
+			conn = None
+			with self._cond:
+				self._reconnects += 1
+
+		if conn is None:
+			try:
+				conn = self.newConnection()
+			except Exception:
+				with self._cond:
+					self._size -= 1
+					self._cond.notify()
+				raise
+		return conn
+
+	"""
+	release:	returns `conn` to the pool. Any open transaction is rolled back; a connection that can't be rolled
+				back (or that the caller marks as `broken`) is closed instead of being reused.
+	"""
+	def release(self, conn, broken=False):
+		if not broken:
+			try:
+				conn.rollback()
+			except Exception:
+				broken = True
+
+		with self._cond:
+			if broken:
+				self._errors += 1
+				self._size -= 1
+			else:
+				self._idle.append(conn)
+			self._cond.notify()
+
+		if broken:
+			self._close(conn)
+
+	"""
+	spare:		returns how many connections could be checked out right now without waiting
+	"""
+	def spare(self):
+		with self._cond:
+			return len(self._idle) + self.max_size - self._size
+
+	"""
+	connection:	context manager checking a connection out for the duration of a `with` block
+	"""
+	@contextmanager
+	def connection(self):
+		conn = self.acquire()
+		broken = False
+		try:
+			yield conn
+		except Exception:
+			broken = not self.healthy(conn)
+			raise
+		finally:
+			self.release(conn, broken=broken)
+
+	def _close(self, conn):
+		try:
+			conn.close()
+		except Exception:
+			pass
+
+	"""
+	stats:	returns the pool's counters as a dictionary
+	"""
+	def stats(self):
+		with self._cond:
+			return {
+				'max_size':			self.max_size,
+				'open':				self._size,
+				'in_use':			self._size - len(self._idle),
+				'idle':				len(self._idle),
+				'checkouts':		self._checkouts,
+				'waits':			self._waits,
+				'wait_time_total':	round(self._wait_time, 6),
+				'wait_time_max':	round(self._max_wait, 6),
+				'errors':			self._errors,
+				'reconnects':		self._reconnects,
+			}
+
+
+"""
+ObservedConnection:	wraps a DB connection so every query run through its cursors is reported to `on_query`, e.g. to
+					count the queries issued per request. Everything else is passed through to the connection.
+
+----Variables----
+conn:				the connection to wrap
+on_query:			called after every `execute`/`executemany` with (statement, arguments, seconds taken, rows affected
+					or returned; -1 if unknown)
+"""
+class ObservedConnection:
+
+	def __init__(self, conn, on_query):
+		self._conn = conn
+		self._on_query = on_query
+
+	def cursor(self, *args, **kwargs):
+		return _ObservedCursor(self._conn.cursor(*args, **kwargs), self._on_query)
+
+	def __getattr__(self, name):
+		return getattr(self._conn, name)
+
+
+class _ObservedCursor:
+
+	def __init__(self, cursor, on_query):
+		self._cursor = cursor
+		self._on_query = on_query
+
+	def execute(self, query, args=None):
+		start = time.perf_counter()
+		try:
+			return self._cursor.execute(query, args)
+		finally:
+			self._on_query(query, args, time.perf_counter() - start, self._rows())
+
+	def executemany(self, query, args):
+		start = time.perf_counter()
+		try:
+			return self._cursor.executemany(query, args)
+		finally:
+			self._on_query(query, args, time.perf_counter() - start, self._rows())
+
+	def _rows(self):
+		rows = getattr(self._cursor, 'rowcount', -1)
+		return rows if isinstance(rows, int) else -1
+
+	def __iter__(self):
+		return iter(self._cursor)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self._cursor.close()
+
+	def __getattr__(self, name):
+		return getattr(self._cursor, name)
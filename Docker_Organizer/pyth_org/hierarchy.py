@@ -0,0 +1,129 @@
+"""
+Precomputed reporting-chain structure for the org chart. Everyone gets an interval from an Euler tour (depth-first
+walk) of the hierarchy: the people under a manager are exactly the people whose tour position falls inside the
+manager's interval. That makes "is X under Y" and "how many people are under Y" constant-time lookups, and the parent
+and depth kept alongside answer management-chain and lowest-common-manager queries without touching the DB.
+"""
+
+
+"""
+Hierarchy:	Euler-tour intervals, parents and depths for everyone in the org chart, keyed by name (nameKey). Built once
+			per load of `tbl_data` (see `OrgGraph.load`) and read-only afterwards.
+
+			People caught in a reporting loop (e.g. from bad data) can't be placed in the tour. They still get their
+			direct-report count, but aren't "under" anyone.
+
+----Variables----
+roots:		names of the people at the top of the org chart (whose boss isn't in the directory)
+reports:	name of a boss -> names of the people reporting to them
+"""
+class Hierarchy:
+	__slots__ = ('index', 'names', 'parent', 'depth', 'tin', 'tout', 'loops')
+
+	def __init__(self, roots, reports):
+		self.index = {}			# nameKey -> position in the arrays below
+		self.names = []			# position -> nameKey
+		self.parent = []		# position -> position of their boss, or -1 at the top
+		self.depth = []			# position -> number of bosses above them
+		self.tin = []			# position -> where they come in the tour
+		self.tout = []			# position -> where the tour leaves the people under them (exclusive)
+		self.loops = {}			# nameKey -> direct reports, for people in reporting loops
+
+		clock = 0
+		for root in roots:
+			if root in self.index:
+				continue
+			self._add(root, -1, 0, clock)
+			clock += 1
+			stack = [(self.index[root], iter(reports.get(root, ())))]
+			while stack:
+				pos, it = stack[-1]
+				name = next(it, None)
+				if name is None:
+					self.tout[pos] = clock
+					stack.pop()
+					continue
+				if name in self.index:
+					continue
+				self._add(name, pos, self.depth[pos] + 1, clock)
+				clock += 1
+				stack.append((self.index[name], iter(reports.get(name, ()))))
+
+		for name, names in reports.items():
+			if name not in self.index:
+				self.loops[name] = len(names)
+
+	def _add(self, name, parent, depth, clock):
+		self.index[name] = len(self.names)
+		self.names.append(name)
+		self.parent.append(parent)
+		self.depth.append(depth)
+		self.tin.append(clock)
+		self.tout.append(clock + 1)
+
+	def __contains__(self, name):
+		return name in self.index
+
+	"""
+	isUnder:	returns True if `name` reports to `manager`, directly or indirectly
+	"""
+	def isUnder(self, name, manager):
+		a = self.index.get(name)
+		b = self.index.get(manager)
+		if a is None or b is None:
+			return False
+		return self.tin[b] < self.tin[a] < self.tout[b]
+
+	"""
+	headcount:	returns the number of people under `manager` (direct and indirect reports)
+	"""
+	def headcount(self, manager):
+		b = self.index.get(manager)
+		if b is None:
+			return self.loops.get(manager, 0)
+		return self.tout[b] - self.tin[b] - 1
+
+	"""
+	chain:	returns the management chain above `name`, from their boss up to the top of the org chart
+	"""
+	def chain(self, name):
+		out = []
+		pos = self.index.get(name)
+		if pos is None:
+			return out
+		pos = self.parent[pos]
+		while pos != -1:
+			out.append(self.names[pos])
+			pos = self.parent[pos]
+		return out
+
+	"""
+	lowestCommonManager:	returns the closest manager that both `a` and `b` are under, or None if they're in separate
+							org charts. If one of them manages the other, that person is returned.
+	"""
+	def lowestCommonManager(self, a, b):
+		x = self.index.get(a)
+		y = self.index.get(b)
+		if x is None or y is None:
+			return None
+
+		# climb from `a` until the people under x include `b`
+		while x != -1 and not self.tin[x] <= self.tin[y] < self.tout[x]:
+			x = self.parent[x]
+		return self.names[x] if x != -1 else None
+
+	"""
+	path:	returns the path between `a` and `b` through their lowest common manager as a tuple of (names from `a` up to
+			the manager, names from the manager down to `b`), or None if they're in separate org charts
+	"""
+	def path(self, a, b):
+		manager = self.lowestCommonManager(a, b)
+		if manager is None:
+			return None
+		up = [a]
+		while up[-1] != manager:
+			up.append(self.names[self.parent[self.index[up[-1]]]])
+		down = [b]
+		while down[-1] != manager:
+			down.append(self.names[self.parent[self.index[down[-1]]]])
+		return (up, down[::-1])
@@ -0,0 +1,284 @@
+"""
+Bulk loading of the .csv (Workday) org chart export into the hierarchy table. Rows are streamed from the file and
+inserted in batches with `executemany` inside a single transaction, or handed to MySQL in one go with
+`LOAD DATA LOCAL INFILE` when the connection allows it.
+
+`reloadCSV` avoids reloading at all when the file hasn't changed since the last load, and otherwise applies only
+the rows that were inserted, updated or deleted (keyed on uniqueID), so the table is never left empty.
+"""
+
+import csv
+import hashlib
+import time
+
+CSV_ENCODING	= "ISO-8859-1"		# encoding of the Workday export
+BATCH_SIZE		= 5000				# default number of rows sent to the DB per `executemany`
+META_TABLE		= 'ingest_meta'		# table keeping the fingerprint of the last file loaded
+STAGE_SUFFIX	= '_stage'			# suffix of the staging table used to apply changed rows
+
+
+"""
+readCSV:	Generator yielding the rows of the .csv file at `path`, skipping the header row.
+
+----Variables----
+path:		location of the .csv file
+"""
+def readCSV(path):
+	with open(path, encoding=CSV_ENCODING, newline='') as fp:
+		reader = csv.reader(fp, delimiter=",", quotechar='"')
+		next(reader, None)		# first row holds the column headers
+		for row in reader:
+			if row:
+				yield row
+
+
+"""
+insertRows:	Inserts `rows` into `table` in batches of `batch_size` using parameterized `executemany` calls. Does not
+			commit; the caller owns the transaction. Returns the number of rows inserted.
+
+----Variables----
+cursor:		DB cursor to run the inserts on
+table:		the (optionally DB-qualified) table to insert into
+rows:		iterable of rows, each a sequence of column values
+batch_size:	number of rows sent per `executemany`
+"""
+def insertRows(cursor, table, rows, batch_size=BATCH_SIZE):
+	count = 0
+	batch = []
+	s = None
+	for row in rows:
+		if s is None:
+			s = f'INSERT into {table} values({", ".join(["%s"] * len(row))})'
+		batch.append(row)
+		if len(batch) >= batch_size:
+			cursor.executemany(s, batch)
+			count += len(batch)
+			batch = []
+	if batch:
+		cursor.executemany(s, batch)
+		count += len(batch)
+	return count
+
+
+"""
+lineTerminator:	Returns the line ending of the .csv file at `path` as it's written in SQL: '\\r\\n' for Windows line
+				endings (as Workday exports them), '\\n' otherwise. Read from the header row.
+"""
+def lineTerminator(path):
+	with open(path, 'rb') as fp:
+		header = fp.readline()
+	return '\\r\\n' if header.endswith(b'\r\n') else '\\n'
+
+
+"""
+loadDataInfile:	Loads the .csv file with MySQL's `LOAD DATA LOCAL INFILE`, skipping the header row. Only works if the
+				connection was opened with `local_infile` enabled. Lines are split on the file's own line ending, so
+				a carriage return never ends up in the last column and the rows match those `readCSV` gives the
+				batched inserts. Returns the number of rows loaded.
+"""
+def loadDataInfile(cursor, table, path):
+	s = (f'LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET latin1 '
+		'FIELDS TERMINATED BY \',\' OPTIONALLY ENCLOSED BY \'"\' '
+		f'LINES TERMINATED BY \'{lineTerminator(path)}\' IGNORE 1 LINES')
+	cursor.execute(s, (path,))
+	return cursor.rowcount
+
+
+"""
+ingestCSV:	Loads the .csv file at `path` into `table` in a single transaction and reports the load rate.
+			Returns a tuple of (rows loaded, seconds taken).
+
+----Variables----
+conn:			DB connection; committed on success and rolled back on failure
+table:			the table to load the rows into
+path:			location of the .csv file
+batch_size:		number of rows per `executemany` batch
+use_load_data:	try `LOAD DATA LOCAL INFILE` first, falling back to batched inserts if the server refuses it
+"""
+def ingestCSV(conn, table, path, batch_size=BATCH_SIZE, use_load_data=False):
+	cursor = conn.cursor()
+	start = time.perf_counter()
+	count = None
+
+	try:
+		if use_load_data:
+			try:
+				count = loadDataInfile(cursor, table, path)
+			except Exception as e:
+				print(f'LOAD DATA LOCAL INFILE unavailable ({e}), falling back to batched inserts')
+				conn.rollback()
+				count = None
+
+		if count is None:
+			count = insertRows(cursor, table, readCSV(path), batch_size=batch_size)
+		conn.commit()
+	except Exception:
+		conn.rollback()
+		raise
+	finally:
+		cursor.close()
+
+	elapsed = time.perf_counter() - start
+	rate = count / elapsed if elapsed > 0 else float(count)
+	print(f'Loaded {count} rows into {table} in {elapsed:.2f}s ({rate:.0f} rows/sec)')
+	return (count, elapsed)
+
+
+"""
+fileFingerprint:	Returns a hash of the contents of the file at `path`.
+"""
+def fileFingerprint(path):
+	h = hashlib.sha256()
+	with open(path, 'rb') as fp:
+		for chunk in iter(lambda: fp.read(1 << 20), b''):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+"""
+rowHash:	Returns a hash of a row's values, used to tell whether a person's entry changed between two loads.
+			Trailing whitespace is ignored since the DB may not keep it.
+"""
+def rowHash(row):
+	j = '\x1f'.join(('' if w is None else str(w)).rstrip() for w in row)
+	return hashlib.md5(j.encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+"""
+createMeta:	creates the metadata table if it doesn't exist yet. DDL: MySQL commits the open transaction first.
+"""
+def createMeta(cursor):
+	cursor.execute(f'CREATE TABLE IF NOT EXISTS {META_TABLE} (name varchar(128) primary key, value varchar(128))')
+
+
+"""
+getFingerprint / setFingerprint:	read and write the fingerprint stored for `table` in the metadata table.
+"""
+def getFingerprint(cursor, table):
+	createMeta(cursor)
+	cursor.execute(f'SELECT value from {META_TABLE} where name=%s', (table,))
+	result = cursor.fetchone()
+	return result[0] if result else None
+
+def setFingerprint(cursor, table, fingerprint):
+	cursor.execute(f'REPLACE into {META_TABLE} values(%s, %s)', (table, fingerprint))
+
+
+"""
+diffRows:	Compares the rows in the .csv file against the rows already in the table, keyed on uniqueID (the first
+			column). Returns a tuple of (rows to insert or replace, uniqueIDs to delete, number of updated rows).
+
+----Variables----
+cursor:		DB cursor used to read the current table
+table:		the table to compare against
+path:		location of the .csv file
+"""
+def diffRows(cursor, table, path):
+	cursor.execute(f'SELECT * from {table}')
+	current = {row[0]: rowHash(row) for row in cursor.fetchall()}
+
+	changed = []
+	updated = 0
+	seen = set()
+	for row in readCSV(path):
+		seen.add(row[0])
+		old = current.get(row[0])
+		if old is None:
+			changed.append(row)
+		elif old != rowHash(row):
+			changed.append(row)
+			updated += 1
+
+	deleted = [unique_id for unique_id in current if unique_id not in seen]
+	return (changed, deleted, updated)
+
+
+"""
+applyDiff:	Applies a diff from `diffRows` to `table`. Changed rows are first loaded into a staging table, then moved
+			into `table` in one transaction together with the deletes, so readers see either the old or the new data.
+
+----Variables----
+conn:		DB connection
+table:		the table to update
+changed:	rows to insert, replacing any existing row with the same uniqueID
+deleted:	uniqueIDs of rows to remove
+batch_size:	number of rows per `executemany` batch
+"""
+def applyDiff(conn, table, changed, deleted, batch_size=BATCH_SIZE, fingerprint=None):
+	stage = table + STAGE_SUFFIX
+	cursor = conn.cursor()
+	try:
+		# DDL commits implicitly in MySQL, so set up the staging table before the transaction starts
+		cursor.execute(f'CREATE TABLE IF NOT EXISTS {stage} LIKE {table}')
+		cursor.execute(f'TRUNCATE TABLE {stage}')
+		insertRows(cursor, stage, changed, batch_size=batch_size)
+
+		remove = deleted + [row[0] for row in changed]
+		for i in range(0, len(remove), batch_size):
+			batch = remove[i:i + batch_size]
+			cursor.execute(f'DELETE FROM {table} where uniqueID in ({", ".join(["%s"] * len(batch))})', batch)
+		cursor.execute(f'INSERT into {table} SELECT * from {stage}')
+		if fingerprint:
+			setFingerprint(cursor, table, fingerprint)
+		conn.commit()
+	except Exception:
+		conn.rollback()
+		raise
+	finally:
+		cursor.close()
+
+
+"""
+reloadCSV:	Brings `table` in line with the .csv file at `path`. Skips the file entirely if its fingerprint matches the
+			last load, does a bulk load if the table is empty, and otherwise applies only the changed rows.
+			Returns a dictionary describing what was done.
+
+----Variables----
+conn:			DB connection
+table:			the table to load the rows into
+path:			location of the .csv file
+batch_size:		number of rows per `executemany` batch
+use_load_data:	passed on to `ingestCSV` for full loads
+force:			reload even if the fingerprint is unchanged
+"""
+def reloadCSV(conn, table, path, batch_size=BATCH_SIZE, use_load_data=False, force=False):
+	start = time.perf_counter()
+	fingerprint = fileFingerprint(path)
+	stats = {'mode': None, 'inserted': 0, 'updated': 0, 'deleted': 0, 'fingerprint': fingerprint}
+
+	cursor = conn.cursor()
+	try:
+		stored = getFingerprint(cursor, table)
+		cursor.execute(f'SELECT 1 from {table} LIMIT 1')
+		is_empty = cursor.fetchone() is None
+		conn.commit()
+	finally:
+		cursor.close()
+
+	if stored == fingerprint and not is_empty and not force:
+		stats['mode'] = 'unchanged'
+		print(f'{path} unchanged since last load, skipping ingest')
+
+	elif is_empty:
+		stats['mode'] = 'full'
+		stats['inserted'], elapsed = ingestCSV(conn, table, path, batch_size=batch_size, use_load_data=use_load_data)
+		cursor = conn.cursor()
+		setFingerprint(cursor, table, fingerprint)
+		conn.commit()
+		cursor.close()
+
+	else:
+		stats['mode'] = 'incremental'
+		cursor = conn.cursor()
+		try:
+			changed, deleted, updated = diffRows(cursor, table, path)
+		finally:
+			cursor.close()
+		applyDiff(conn, table, changed, deleted, batch_size=batch_size, fingerprint=fingerprint)
+		stats['inserted'] = len(changed) - updated
+		stats['updated'] = updated
+		stats['deleted'] = len(deleted)
+		print(f'Applied {stats["inserted"]} inserts, {updated} updates and {len(deleted)} deletes to {table}')
+
+	stats['seconds'] = round(time.perf_counter() - start, 3)
+	return stats
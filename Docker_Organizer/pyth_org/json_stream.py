@@ -0,0 +1,117 @@
+"""
+Streams a tree to the front-end as JSON. The nodes and links are encoded in batches instead of as one big string, so
+the first bytes go out before the whole tree is encoded, and the batches are compressed with gzip or brotli when the
+browser accepts it. Every tree gets an ETag computed from its content, so the page can revalidate a tree it already
+has instead of downloading it again.
+
+orjson (faster encoder) and brotli are used if they're installed; without them the standard `json` module and gzip
+are used.
+"""
+
+import hashlib
+import json
+import zlib
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+BATCH_SIZE			= 500		# nodes or links encoded per chunk of the response
+MIN_COMPRESS_NODES	= 20		# trees smaller than this are sent uncompressed
+GZIP_LEVEL			= 6
+BROTLI_QUALITY		= 5			# brotli's higher qualities are too slow to use per request
+
+
+"""
+encode:	encodes `obj` to JSON bytes, with orjson if it's available
+"""
+if orjson is not None:
+	def encode(obj):
+		return orjson.dumps(obj)
+else:
+	def encode(obj):
+		return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+"""
+treeETag:	returns the ETag of `tree` (unquoted) as sent with `encoding`, computed from its nodes, links and truncation
+			counts. Finished trees don't change, so the hash is computed once and kept on the tree. The ETag is strong,
+			so each content encoding gets its own (e.g. "<hash>-gzip"); the bytes sent differ between them.
+"""
+def treeETag(tree, encoding=None):
+	if tree.etag is None:
+		tree.etag = hashlib.sha1(repr((tree.nodes, tree.links, tree.truncated)).encode('utf-8')).hexdigest()[:20]
+	if encoding is None:
+		return tree.etag
+	return f'{tree.etag}-{encoding}'
+
+
+"""
+iterTree:	yields `tree` as chunks of JSON bytes, in the same format as `json.dumps(tree.toDict())`:
+			{"nodes": [{"id": .., "group": ..}, ..], "links": [{"source": .., "target": .., "value": ..}, ..]}
+"""
+def iterTree(tree, batch_size=BATCH_SIZE):
+	nodes = list(tree.nodes.items())
+	links = tree.links
+
+	yield b'{"nodes":['
+	for i in range(0, len(nodes), batch_size):
+		batch = encode([tree.nodeRecord(node_id, group) for node_id, group in nodes[i:i + batch_size]])
+		yield (b',' if i else b'') + batch[1:-1]
+
+	yield b'],"links":['
+	for i in range(0, len(links), batch_size):
+		batch = encode([{"source": source, "target": target, "value": value} for source, target, value in links[i:i + batch_size]])
+		yield (b',' if i else b'') + batch[1:-1]
+	yield b']}'
+
+
+"""
+chooseEncoding:	returns the content encoding to send `tree` with ('br', 'gzip', or None) given the request's
+				Accept-Encoding header
+
+----Variables----
+accept_encodings:	the request's `accept_encodings` (werkzeug's parsed Accept-Encoding header)
+tree:				the tree being sent
+"""
+def chooseEncoding(accept_encodings, tree):
+	if len(tree) < MIN_COMPRESS_NODES:
+		return None
+	if brotli is not None and accept_encodings['br']:
+		return 'br'
+	if accept_encodings['gzip']:
+		return 'gzip'
+	return None
+
+
+"""
+compressChunks:	compresses the chunks from `chunks` as they come in, with `encoding` ('br', 'gzip', or None)
+"""
+def compressChunks(chunks, encoding):
+	if encoding is None:
+		yield from chunks
+		return
+
+	if encoding == 'br':
+		compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+		compress, finish = compressor.process, compressor.finish
+	else:
+		compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)		# wbits=31 writes a gzip header and trailer
+		compress, finish = compressor.compress, compressor.flush
+
+	first = True
+	for chunk in chunks:
+		out = compress(chunk)
+		if first and encoding == 'gzip':
+			# flush the first chunk straight away so the browser gets the start of the response early
+			out += compressor.flush(zlib.Z_SYNC_FLUSH)
+			first = False
+		if out:
+			yield out
+	yield finish()
@@ -0,0 +1,178 @@
+"""
+Minimal Prometheus-style metrics: counters, gauges and histograms with labels, rendered in the Prometheus text format
+by `/metrics`. Recording a value is a dictionary update under a lock (a microsecond or so), so the hooks can sit on
+the hot path of every request.
+"""
+
+import threading
+from bisect import bisect_left
+
+# default histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+"""
+_labelText:	formats label names and values the way the text format wants them: {name="value",...}
+"""
+def _labelText(names, values, extra=None):
+	pairs = list(zip(names, values))
+	if extra is not None:
+		pairs.append(extra)
+	if not pairs:
+		return ''
+	return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+	if value == float('inf'):
+		return '+Inf'
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+"""
+Counter:	a count that only goes up, e.g. requests served
+
+----Variables----
+name:		metric name
+help:		one-line description shown by `/metrics`
+labels:		names of the labels every value is recorded under
+"""
+class Counter:
+	kind = 'counter'
+
+	def __init__(self, name, help, labels=()):
+		self.name = name
+		self.help = help
+		self.labels = tuple(labels)
+		self._lock = threading.Lock()
+		self._values = {}		# label values -> count
+
+	def inc(self, *label_values, amount=1):
+		with self._lock:
+			self._values[label_values] = self._values.get(label_values, 0) + amount
+
+	def value(self, *label_values):
+		return self._values.get(label_values, 0)
+
+	def samples(self):
+		with self._lock:
+			values = list(self._values.items())
+		return [(self.name, _labelText(self.labels, key), value) for key, value in values]
+
+
+"""
+Gauge:	a value that goes up and down. Either set explicitly, or read from `fn` when the metrics are rendered
+		(`fn` returns a number, or a dictionary of label value -> number for a gauge with one label).
+
+----Variables----
+name:		metric name
+help:		one-line description shown by `/metrics`
+labels:		names of the labels every value is recorded under
+fn:			function read at render time instead of set values
+"""
+class Gauge:
+	kind = 'gauge'
+
+	def __init__(self, name, help, labels=(), fn=None):
+		self.name = name
+		self.help = help
+		self.labels = tuple(labels)
+		self.fn = fn
+		self._lock = threading.Lock()
+		self._values = {}
+
+	def set(self, value, *label_values):
+		with self._lock:
+			self._values[label_values] = value
+
+	def samples(self):
+		if self.fn is not None:
+			value = self.fn()
+			if isinstance(value, dict):
+				return [(self.name, _labelText(self.labels, (key,)), v) for key, v in value.items() if v is not None]
+			return [(self.name, '', value)] if value is not None else []
+		with self._lock:
+			values = list(self._values.items())
+		return [(self.name, _labelText(self.labels, key), value) for key, value in values]
+
+
+"""
+Histogram:	counts of observed values (e.g. request latencies) in cumulative buckets, plus their sum and count
+
+----Variables----
+name:		metric name
+help:		one-line description shown by `/metrics`
+labels:		names of the labels every value is recorded under
+buckets:	upper bounds of the buckets, ascending
+"""
+class Histogram:
+	kind = 'histogram'
+
+	def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+		self.name = name
+		self.help = help
+		self.labels = tuple(labels)
+		self.buckets = tuple(buckets)
+		self._lock = threading.Lock()
+		self._values = {}		# label values -> [count per bucket (the last one is +Inf), sum, count]
+
+	def observe(self, value, *label_values):
+		i = bisect_left(self.buckets, value)
+		with self._lock:
+			entry = self._values.get(label_values)
+			if entry is None:
+				entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0, 0]
+			entry[0][i] += 1
+			entry[1] += value
+			entry[2] += 1
+
+	def samples(self):
+		with self._lock:
+			values = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+		out = []
+		for key, counts, total, count in values:
+			cumulative = 0
+			for bound, n in zip(self.buckets + (float('inf'),), counts):
+				cumulative += n
+				out.append((self.name + '_bucket', _labelText(self.labels, key, ('le', _number(bound))), cumulative))
+			out.append((self.name + '_sum', _labelText(self.labels, key), total))
+			out.append((self.name + '_count', _labelText(self.labels, key), count))
+		return out
+
+
+"""
+Registry:	the set of metrics served by `/metrics`
+"""
+class Registry:
+
+	def __init__(self):
+		self._metrics = []
+
+	def register(self, metric):
+		self._metrics.append(metric)
+		return metric
+
+	def counter(self, name, help, labels=()):
+		return self.register(Counter(name, help, labels))
+
+	def gauge(self, name, help, labels=(), fn=None):
+		return self.register(Gauge(name, help, labels, fn))
+
+	def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+		return self.register(Histogram(name, help, labels, buckets))
+
+	"""
+	render:	returns every metric in the Prometheus text exposition format
+	"""
+	def render(self):
+		lines = []
+		for metric in self._metrics:
+			lines.append(f'# HELP {metric.name} {metric.help}')
+			lines.append(f'# TYPE {metric.name} {metric.kind}')
+			for name, labels, value in metric.samples():
+				lines.append(f'{name}{labels} {_number(value)}')
+		return '\n'.join(lines) + '\n'
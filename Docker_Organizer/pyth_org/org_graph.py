@@ -0,0 +1,172 @@
+"""
+In-memory index of the org chart hierarchy stored in `tbl_data`. The graph is built once from the rows of the
+table and answers the parent/child lookups used by the tree builders in server.py, so rendering a tree no longer
+costs one MySQL round-trip per node.
+"""
+
+import threading
+from collections import namedtuple
+from hierarchy import Hierarchy
+
+# column positions of a row in `tbl_data`
+COL_ID			= 0		# uniqueID, formatted <id>_<first name>_<last name>
+COL_NAME		= 1		# userName, formatted <first name> <last name>
+COL_BOSS		= 2		# reportsTo, formatted like uniqueID
+COL_TITLE		= 3
+COL_LOCATION	= 4
+COL_ORG			= 5		# orgName
+
+SNAPSHOT_GRACE	= 30	# seconds a replaced snapshot stays mapped for the requests still reading from it
+
+# the maps making up one loaded copy of the directory
+#	by_id:		uniqueID -> row
+#	by_name:	nameKey -> list of rows sharing that name
+#	children:	nameKey of a boss -> list of rows reporting to them
+#	rows:		every row, in load order
+#	hierarchy:	the `Hierarchy` (reporting-chain intervals) of everyone in the directory
+_OrgMaps = namedtuple('_OrgMaps', ['by_id', 'by_name', 'children', 'rows', 'hierarchy'])
+
+
+"""
+nameKey:	Formats a person's name the way the nodes of the tree are named: <first name>_<last name>
+
+----Variables----
+user_name:	a name from the userName column, i.e. <first name> <last name>
+"""
+def nameKey(user_name):
+	if not user_name:
+		return ""
+	temp = user_name.split()
+	if len(temp) > 1:
+		return temp[0] + '_' + temp[1]
+	return temp[0] if temp else ""
+
+
+"""
+bossKey:	Formats the boss named in a reportsTo (or uniqueID) entry the same way as `nameKey`. Returns an empty
+			string if there is no boss listed.
+
+----Variables----
+reports_to:	an entry from the reportsTo column, i.e. <id>_<first name>_<last name>
+"""
+def bossKey(reports_to):
+	if not reports_to or not reports_to.strip():
+		return ""
+	temp = reports_to.strip().split("_")
+	if len(temp) > 2:
+		return temp[1] + '_' + temp[2]
+	return nameKey(reports_to.replace("_", " "))
+
+
+"""
+OrgGraph:	parent->children adjacency and id->row maps for the rows of `tbl_data`. A reload builds a complete
+			new set of maps and swaps them in at once, so requests being served during a reload see either the
+			old or the new directory but never a half-built one.
+"""
+class OrgGraph:
+
+	def __init__(self, rows=None):
+		self._lock = threading.Lock()
+		self._maps = _OrgMaps({}, {}, {}, [], Hierarchy([], {}))
+		self._snapshot = None		# the `OrgSnapshot` the maps come from, if any
+		if rows is not None:
+			self.load(rows)
+
+	"""
+	load:	(re)builds the graph from the rows of `tbl_data`
+
+	----Variables----
+	rows:	iterable of tuples in the column order of `tbl_data`
+	"""
+	def load(self, rows):
+		by_id = {}
+		by_name = {}
+		children = {}
+		all_rows = []
+
+		for row in rows:
+			row = tuple(row)
+			all_rows.append(row)
+			by_id[row[COL_ID]] = row
+			by_name.setdefault(nameKey(row[COL_NAME]), []).append(row)
+
+			boss = bossKey(row[COL_BOSS])
+			if boss:
+				children.setdefault(boss, []).append(row)
+
+		# everyone whose boss isn't in the directory is at the top of an org chart
+		roots = [name for name, temp in by_name.items() if not any(bossKey(row[COL_BOSS]) in by_name for row in temp)]
+		reports = {boss: [nameKey(row[COL_NAME]) for row in temp] for boss, temp in children.items()}
+		hierarchy = Hierarchy(roots, reports)
+
+		# swap the new maps in together
+		self._swap(_OrgMaps(by_id, by_name, children, all_rows, hierarchy), None)
+
+	"""
+	loadSnapshot:	swaps in the directory stored in an `OrgSnapshot` (see org_snapshot.py). Lookups are then answered
+					from the snapshot's mapped file, which every worker process shares, instead of from maps built here.
+					The graph owns the snapshot from then on and closes it once it's replaced.
+
+	----Variables----
+	snapshot:		the `OrgSnapshot` to use
+	"""
+	def loadSnapshot(self, snapshot):
+		self._swap(_OrgMaps(snapshot.by_id, snapshot.by_name, snapshot.children, snapshot.rows, snapshot.hierarchy), snapshot)
+
+	# swaps in new maps; a snapshot they replace is closed once the requests still reading from it had time to finish
+	def _swap(self, maps, snapshot):
+		with self._lock:
+			old = self._snapshot
+			self._maps = maps
+			self._snapshot = snapshot
+		if old is not None and old is not snapshot:
+			timer = threading.Timer(SNAPSHOT_GRACE, old.close)
+			timer.daemon = True
+			timer.start()
+
+	def __len__(self):
+		return len(self._maps.rows)
+
+	def rows(self):
+		return self._maps.rows
+
+	"""
+	children:	returns the rows of everyone reporting directly to `name`
+
+	----Variables----
+	name:		the boss' name, formatted <first name>_<last name>
+	"""
+	def children(self, name):
+		return self._maps.children.get(name, [])
+
+	"""
+	subtreeSize:	returns the number of people under `name` (their direct reports, their reports' reports, and so on)
+
+	----Variables----
+	name:		the boss' name, formatted <first name>_<last name>
+	"""
+	def subtreeSize(self, name):
+		return self._maps.hierarchy.headcount(name)
+
+	"""
+	hierarchy:	returns the `Hierarchy` of the loaded directory, for reporting-chain queries
+	"""
+	def hierarchy(self):
+		return self._maps.hierarchy
+
+	"""
+	byName:		returns the row for `name`, or None if they're not in the directory. If the name is shared by more
+				than one person, the first one loaded is returned
+
+	----Variables----
+	name:		the person's name, formatted <first name>_<last name>
+	"""
+	def byName(self, name):
+		temp = self._maps.by_name.get(name)
+		return temp[0] if temp else None
+
+	"""
+	byID:		returns the row for the uniqueID `unique_id`, or None if there is no such row
+	"""
+	def byID(self, unique_id):
+		return self._maps.by_id.get(unique_id)
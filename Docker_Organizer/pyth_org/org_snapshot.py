@@ -0,0 +1,390 @@
+"""
+Compact, memory-mapped snapshot of the org directory (`tbl_data`). The snapshot is written once after an ingest, and
+every worker process maps it read-only instead of building its own dictionaries of the directory, so N workers share
+one copy of it in the page cache and a warm start only has to open a file.
+
+The file is columnar: every distinct string is stored once (and referred to by its integer id), each column of
+`tbl_data` is an array of string ids, people's boss and reports are integer arrays (children as offsets into one
+array), and the reporting-chain arrays of `Hierarchy` are stored as they are. Names and uniqueIDs are found through
+hash tables in the file. `OrgSnapshot` reads it all through zero-copy views of the mapped file; rows are decoded to
+tuples only when asked for.
+
+Only the org graph (`OrgGraph.loadSnapshot`) is shared this way. The search index and suggestions are built from the
+snapshot's rows, but every worker keeps its own copy of them.
+
+The memory is traded for time: every lookup decodes its row again, so trees build about four times slower than off a
+built graph (see bench/bench_org_snapshot.py). `server.py` only uses it when `ORG_SNAPSHOT_DIR` is set.
+
+Layout:	8-byte magic, 4-byte header length, JSON header (counts, the data version, and where each section starts), then
+		the sections, each 8-byte aligned. Integers are in the byte order of the machine that wrote the file.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from org_graph import OrgGraph, nameKey, bossKey, COL_ID, COL_NAME, COL_BOSS
+from hierarchy import Hierarchy
+
+ORG_SNAPSHOT_FILE	= 'org_directory.snap'
+MAGIC				= b'ORGSNAP1'
+COLUMNS				= 6			# columns of `tbl_data`
+
+
+def _hash(data):
+	return zlib.crc32(data)
+
+
+"""
+_hashTable:	returns an open-addressing hash table (an array of slot -> item + 1, 0 for empty) of `keys`, a list of byte
+			strings; a key seen twice points at its last item, as a dictionary would
+"""
+def _hashTable(keys):
+	size = 8
+	while size < len(keys) * 2:
+		size *= 2
+	table = array('I', bytes(4 * size))
+	mask = size - 1
+	first = {}
+	for item, key in enumerate(keys):
+		if key in first:
+			table[first[key]] = item + 1
+			continue
+		slot = _hash(key) & mask
+		while table[slot]:
+			slot = (slot + 1) & mask
+		table[slot] = item + 1
+		first[key] = slot
+	return table
+
+
+"""
+writeSnapshot:	writes the snapshot of `rows` (the rows of `tbl_data`) to `path`. The file is written next to `path`
+				and moved into place, so processes opening `path` meanwhile get either the old or the new snapshot.
+
+----Variables----
+path:			where to write the snapshot
+rows:			the rows of `tbl_data`
+version:		version of the data (e.g. the ingest fingerprint of `tbl_data`), checked by `openSnapshot`
+hierarchy:		the `Hierarchy` of `rows`, if already built
+"""
+def writeSnapshot(path, rows, version, hierarchy=None):
+	rows = [tuple(row) for row in rows]
+	n = len(rows)
+	if hierarchy is None:
+		hierarchy = OrgGraph(rows).hierarchy()
+
+	strings = {}		# interned strings -> id
+	def intern(s):
+		s = '' if s is None else str(s)
+		i = strings.get(s)
+		if i is None:
+			i = strings[s] = len(strings)
+		return i
+
+	columns = array('I', bytes(4 * COLUMNS * n))
+	for r, row in enumerate(rows):
+		for c in range(COLUMNS):
+			columns[c * n + r] = intern(row[c] if c < len(row) else '')
+
+	# everyone's name and everyone named as a boss, each with the rows under that name and the rows reporting to it
+	names = {}
+	name_rows = {}
+	children = {}
+	def nameID(name):
+		i = names.get(name)
+		if i is None:
+			i = names[name] = len(names)
+		return i
+	for r, row in enumerate(rows):
+		name_rows.setdefault(nameID(nameKey(row[COL_NAME])), []).append(r)
+		boss = bossKey(row[COL_BOSS])
+		if boss:
+			children.setdefault(nameID(boss), []).append(r)
+	for name in hierarchy.loops:
+		nameID(name)
+	m = len(names)
+
+	def csr(groups):
+		offsets = array('I', [0])
+		items = array('I')
+		for i in range(m):
+			items.extend(groups.get(i, ()))
+			offsets.append(len(items))
+		return (offsets, items)
+
+	name_rows_off, name_rows_items = csr(name_rows)
+	child_off, child_items = csr(children)
+	name_list = list(names)
+	name_str = array('I', [intern(name) for name in name_list])
+
+	# the reporting-chain arrays, by position in the tour, and each name's position
+	h_pos = array('i', [hierarchy.index.get(name, -1) for name in name_list])
+	h_name = array('I', [names[name] for name in hierarchy.names])
+	h_loops = array('I', [hierarchy.loops.get(name, 0) for name in name_list])
+
+	data = [s.encode('utf-8', 'surrogateescape') for s in strings]
+	str_off = array('I', [0])
+	for s in data:
+		str_off.append(str_off[-1] + len(s))
+
+	sections = [
+		('str_off',			str_off),
+		('str_data',		b''.join(data)),
+		('columns',			columns),
+		('name_str',		name_str),
+		('name_hash',		_hashTable([data[i] for i in name_str])),
+		('name_rows_off',	name_rows_off),
+		('name_rows',		name_rows_items),
+		('child_off',		child_off),
+		('child_rows',		child_items),
+		('id_hash',			_hashTable([data[columns[COL_ID * n + r]] for r in range(n)])),
+		('h_pos',			h_pos),
+		('h_name',			h_name),
+		('h_parent',		array('i', hierarchy.parent)),
+		('h_depth',			array('I', hierarchy.depth)),
+		('h_tin',			array('I', hierarchy.tin)),
+		('h_tout',			array('I', hierarchy.tout)),
+		('h_loops',			h_loops),
+	]
+
+	header = {'version': version, 'rows': n, 'strings': len(strings), 'names': m, 'byteorder': sys.byteorder, 'sections': {}}
+	blobs = [(name, section.tobytes() if isinstance(section, array) else section, section.typecode if isinstance(section, array) else 'B')
+			for name, section in sections]
+	# the header holds the offsets, which depend on the header's length: size it with placeholder offsets first
+	header_len = len(json.dumps(dict(header, sections={name: [10 ** 12, len(blob), code] for name, blob, code in blobs})))
+	start = (len(MAGIC) + 4 + header_len + 7) // 8 * 8
+	offset = start
+	for name, blob, code in blobs:
+		header['sections'][name] = [offset, len(blob), code]
+		offset = (offset + len(blob) + 7) // 8 * 8
+	text = json.dumps(header).encode()
+
+	temp = f'{path}.{os.getpid()}.tmp'
+	with open(temp, 'wb') as fp:
+		fp.write(MAGIC + struct.pack('<I', len(text)) + text)
+		for name, blob, code in blobs:
+			fp.write(bytes(header['sections'][name][0] - fp.tell()))
+			fp.write(blob)
+	os.replace(temp, path)
+	return offset
+
+
+"""
+openSnapshot:	returns the `OrgSnapshot` at `path` if there is one for `version` (any version if None), else None
+"""
+def openSnapshot(path, version=None):
+	if not path or not os.path.exists(path):
+		return None
+	try:
+		snapshot = OrgSnapshot(path)
+	except (OSError, ValueError) as e:
+		print(f'Could not read the org snapshot {path}: {e}')
+		return None
+	if version is not None and snapshot.version != version:
+		snapshot.close()
+		return None
+	return snapshot
+
+
+"""
+OrgSnapshot:	a snapshot file mapped read-only. `by_id`, `by_name`, `children`, `rows` and `hierarchy` answer the same
+				lookups as the maps of `OrgGraph` (see `OrgGraph.loadSnapshot`), straight from the mapped pages.
+
+----Variables----
+path:			the snapshot file
+"""
+class OrgSnapshot:
+
+	def __init__(self, path):
+		self.path = path
+		with open(path, 'rb') as fp:
+			self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+		view = memoryview(self._mm)
+		if bytes(view[:len(MAGIC)]) != MAGIC:
+			raise ValueError('not an org snapshot')
+		size = struct.unpack('<I', view[len(MAGIC):len(MAGIC) + 4])[0]
+		header = json.loads(bytes(view[len(MAGIC) + 4:len(MAGIC) + 4 + size]))
+		if header['byteorder'] != sys.byteorder:
+			raise ValueError('written on a machine with another byte order')
+		self.version = header['version']
+		self.count = header['rows']
+		for name, (offset, length, code) in header['sections'].items():
+			section = view[offset:offset + length]
+			setattr(self, '_' + name, section if code == 'B' else section.cast(code))
+		self.by_id = _ByID(self)
+		self.by_name = _ByName(self)
+		self.children = _Children(self)
+		self.rows = _Rows(self)
+		self.hierarchy = MappedHierarchy(self)
+
+	def __len__(self):
+		return self.count
+
+	def string(self, i):
+		return str(self._str_data[self._str_off[i]:self._str_off[i + 1]], 'utf-8', 'surrogateescape')
+
+	def row(self, r):
+		columns, offsets, data = self._columns, self._str_off, self._str_data
+		out = []
+		for i in range(r, COLUMNS * self.count, self.count):
+			s = columns[i]
+			out.append(str(data[offsets[s]:offsets[s + 1]], 'utf-8', 'surrogateescape'))
+		return tuple(out)
+
+	def _find(self, table, key, keyOf):
+		data = key.encode('utf-8', 'surrogateescape')
+		mask = len(table) - 1
+		slot = _hash(data) & mask
+		while table[slot]:
+			item = table[slot] - 1
+			i = keyOf(item)
+			if self._str_data[self._str_off[i]:self._str_off[i + 1]] == data:
+				return item
+			slot = (slot + 1) & mask
+		return -1
+
+	"""
+	nameIndex:	returns the index of the name `name` (formatted like `nameKey`) in the snapshot, or -1
+	"""
+	def nameIndex(self, name):
+		return self._find(self._name_hash, name, self._name_str.__getitem__)
+
+	"""
+	rowIndex:	returns the row number of the uniqueID `unique_id`, or -1
+	"""
+	def rowIndex(self, unique_id):
+		n = self.count
+		return self._find(self._id_hash, unique_id, lambda r: self._columns[COL_ID * n + r])
+
+	def rowsOf(self, offsets, items, i):
+		return [self.row(r) for r in items[offsets[i]:offsets[i + 1]]]
+
+	"""
+	close:		unmaps the file once nothing refers to its pages any more
+	"""
+	def close(self):
+		for name in list(vars(self)):
+			if name.startswith('_') and isinstance(getattr(self, name), memoryview):
+				getattr(self, name).release()
+		try:
+			self._mm.close()
+		except BufferError:
+			pass
+
+
+# the lookups of `OrgGraph`'s maps, answered from a snapshot
+
+class _ByID:
+	def __init__(self, snapshot):
+		self._s = snapshot
+
+	def get(self, unique_id, default=None):
+		r = self._s.rowIndex(unique_id)
+		return self._s.row(r) if r != -1 else default
+
+
+class _ByName:
+	def __init__(self, snapshot):
+		self._s = snapshot
+
+	def get(self, name, default=None):
+		i = self._s.nameIndex(name)
+		rows = self._s.rowsOf(self._s._name_rows_off, self._s._name_rows, i) if i != -1 else None
+		return rows if rows else default
+
+
+class _Children:
+	def __init__(self, snapshot):
+		self._s = snapshot
+
+	def get(self, name, default=None):
+		i = self._s.nameIndex(name)
+		rows = self._s.rowsOf(self._s._child_off, self._s._child_rows, i) if i != -1 else None
+		return rows if rows else default
+
+
+class _Rows:
+	def __init__(self, snapshot):
+		self._s = snapshot
+
+	def __len__(self):
+		return self._s.count
+
+	def __getitem__(self, r):
+		if isinstance(r, slice):
+			return [self._s.row(i) for i in range(*r.indices(self._s.count))]
+		if r < 0:
+			r += self._s.count
+		if not 0 <= r < self._s.count:
+			raise IndexError(r)
+		return self._s.row(r)
+
+	def __iter__(self):
+		return (self._s.row(r) for r in range(self._s.count))
+
+
+class _HierarchyIndex:
+	def __init__(self, snapshot):
+		self._s = snapshot
+
+	def get(self, name, default=None):
+		i = self._s.nameIndex(name)
+		pos = self._s._h_pos[i] if i != -1 else -1
+		return pos if pos != -1 else default
+
+	def __getitem__(self, name):
+		pos = self.get(name)
+		if pos is None:
+			raise KeyError(name)
+		return pos
+
+	def __contains__(self, name):
+		return self.get(name) is not None
+
+	def __len__(self):
+		return len(self._s._h_name)
+
+
+class _HierarchyNames:
+	def __init__(self, snapshot):
+		self._s = snapshot
+
+	def __len__(self):
+		return len(self._s._h_name)
+
+	def __getitem__(self, pos):
+		return self._s.string(self._s._name_str[self._s._h_name[pos]])
+
+	def __iter__(self):
+		return (self[pos] for pos in range(len(self)))
+
+
+class _Loops:
+	def __init__(self, snapshot):
+		self._s = snapshot
+
+	def get(self, name, default=None):
+		i = self._s.nameIndex(name)
+		count = self._s._h_loops[i] if i != -1 else 0
+		return count if count else default
+
+
+"""
+MappedHierarchy:	the `Hierarchy` stored in a snapshot; the same queries, answered from the mapped arrays
+"""
+class MappedHierarchy(Hierarchy):
+	__slots__ = ()
+
+	def __init__(self, snapshot):
+		self.index = _HierarchyIndex(snapshot)
+		self.names = _HierarchyNames(snapshot)
+		self.parent = snapshot._h_parent
+		self.depth = snapshot._h_depth
+		self.tin = snapshot._h_tin
+		self.tout = snapshot._h_tout
+		self.loops = _Loops(snapshot)
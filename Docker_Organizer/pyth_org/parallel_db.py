@@ -0,0 +1,91 @@
+"""
+Concurrent DB lookups for the views. A view hands several queries over at once (`ParallelDB.gather`) instead of running
+them one after another, so it waits for one DB round-trip instead of one per query.
+
+The first query runs on the calling thread and the others on a shared set of worker threads, each on a connection of
+its own from the regular `ConnectionPool` (so they get the pool's health checks and show up in its stats). Running
+side by side takes one connection per query, so when the pool hasn't got that many to spare (e.g. under load) the
+queries run one after another on the calling thread's connection instead, and a lookup never holds more than one.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+"""
+ParallelDB:	runs DB queries side by side on worker threads.
+
+----Variables----
+pool:		the `ConnectionPool` the queries run on
+max_size:	the most worker threads, shared by every caller
+"""
+class ParallelDB:
+
+	def __init__(self, pool, max_size=10):
+		self.pool = pool
+		self.max_size = max_size
+		self._lock = threading.Lock()
+		self._executor = None		# made on first use
+
+		self.parallel = 0			# `gather` calls whose queries ran side by side
+		self.serial = 0				# `gather` calls run one query after another, for lack of spare connections
+
+	"""
+	gather:		runs every query at the same time and returns their results in order as tuples of (rows, column names)
+
+	----Variables----
+	queries:	tuples of (statement, args) or (statement, args, one); `one` returns only the first row (or None)
+	on_query:	called for every query with (statement, arguments, seconds taken, rows returned), from the calling
+				thread once they're all done; see `ObservedConnection`
+	"""
+	def gather(self, *queries, on_query=None):
+		side_by_side = len(queries) > 1 and self.pool.spare() >= len(queries)
+		with self.pool.connection() as conn:
+			if side_by_side:
+				futures = [self._workers().submit(self._pooledQuery, *q) for q in queries[1:]]
+				results = [self._query(conn, *queries[0])] + [future.result() for future in futures]
+			else:
+				results = [self._query(conn, *q) for q in queries]
+		with self._lock:
+			if side_by_side:
+				self.parallel += 1
+			else:
+				self.serial += 1
+
+		out = []
+		for q, (rows, columns, seconds) in zip(queries, results):
+			if on_query is not None:
+				one = len(q) > 2 and q[2]
+				on_query(q[0], q[1], seconds, (1 if rows else 0) if one else len(rows))
+			out.append((rows, columns))
+		return out
+
+	def _workers(self):
+		with self._lock:
+			if self._executor is None:
+				self._executor = ThreadPoolExecutor(max_workers=self.max_size, thread_name_prefix='parallel-db')
+			return self._executor
+
+	def _pooledQuery(self, statement, args=None, one=False):
+		with self.pool.connection() as conn:
+			return self._query(conn, statement, args, one)
+
+	def _query(self, conn, statement, args=None, one=False):
+		start = time.perf_counter()
+		cursor = conn.cursor()
+		try:
+			cursor.execute(statement, args)
+			rows = cursor.fetchone() if one else list(cursor.fetchall())
+			columns = [column[0] for column in cursor.description] if cursor.description else None
+			conn.commit()
+		finally:
+			cursor.close()
+		return (rows, columns, time.perf_counter() - start)
+
+	"""
+	stats:	returns how many lookups ran side by side and how many one query after another, as a dictionary
+	"""
+	def stats(self):
+		with self._lock:
+			return {'max_size': self.max_size, 'parallel': self.parallel, 'serial': self.serial}
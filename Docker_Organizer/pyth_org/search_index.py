@@ -0,0 +1,378 @@
+"""
+In-memory search index over the people in the directory. Replaces the `like '%term%'` table scans used by the
+search bar: every searchable field (name, org, title from `tbl_data`; position and skills from `cust_data`) is
+broken into trigrams, and a search only looks at the people sharing the rarest trigram of the search term before
+checking the actual match. Results from all fields come back from one call, ranked by field and match quality.
+"""
+
+import threading
+import time
+
+from org_graph import nameKey
+from storage import CUST_COLUMNS
+
+# searchable fields --> (table the field comes from, column position in that table, weight used for ranking).
+# the weights follow the order the search bar has always tried the fields in
+FIELDS = {
+	'userName':	('tbl_data', 1, 4),
+	'position':	('cust_data', 1, 3),
+	'skills':	('cust_data', 3, 2),
+	'orgName':	('tbl_data', 5, 1),
+}
+
+GRAM = 3				# length of the n-grams in the index
+SEPARATORS = " ,_;/"	# characters that separate the words (or comma-separated entries) of a field
+
+# how closely a field has to match the search term, best first
+MATCH_EXACT		= 4		# the whole field is the search term
+MATCH_TOKEN		= 3		# one of the field's words (or comma-separated entries) is the search term
+MATCH_PREFIX	= 2		# one of the field's words starts with the search term
+MATCH_SUBSTRING	= 1		# the search term shows up somewhere in the field
+
+
+"""
+grams:	returns the set of n-grams in `text`
+"""
+def grams(text):
+	return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+"""
+matchQuality:	returns how well `text` matches `term` (both lowercase), or 0 if `term` isn't in `text`
+"""
+def matchQuality(text, term):
+	pos = text.find(term)
+	if pos < 0:
+		return 0
+	if text == term:
+		return MATCH_EXACT
+
+	quality = MATCH_SUBSTRING
+	while pos >= 0:
+		if pos == 0 or text[pos - 1] in SEPARATORS:
+			end = pos + len(term)
+			if end == len(text) or text[end] in SEPARATORS:
+				return MATCH_TOKEN
+			quality = MATCH_PREFIX
+		pos = text.find(term, pos + 1)
+	return quality
+
+
+"""
+SearchHit:	one result of a search: a person's row from the table the matched field comes from, the field that
+			matched, and the score used to rank it.
+"""
+class SearchHit:
+	__slots__ = ('score', 'field', 'quality', 'row')
+
+	def __init__(self, score, field, quality, row):
+		self.score = score
+		self.field = field
+		self.quality = quality
+		self.row = row
+
+	def __repr__(self):
+		return f'SearchHit({self.field}, {self.score}, {self.row[:2]!r})'
+
+
+"""
+SearchResults:	the result of a fan-out search (`SearchIndex.fanOut`): the hits of every field merged and ranked, the hits
+				of each field on their own, and the seconds each field took to search.
+"""
+class SearchResults:
+	__slots__ = ('term', 'hits', 'by_field', 'timings')
+
+	def __init__(self, term, hits, by_field, timings):
+		self.term = term
+		self.hits = hits			# every `SearchHit`, best first; on a tie, in the order of `FIELDS`
+		self.by_field = by_field	# field -> rows that matched in it, best first
+		self.timings = timings		# field -> seconds taken to search it
+
+	"""
+	bestField:	returns the field of the best-ranked hit, or None if nothing matched
+	"""
+	def bestField(self):
+		return self.hits[0].field if self.hits else None
+
+	"""
+	report:		returns the results as a dictionary, with at most `limit` of the merged hits
+	"""
+	def report(self, limit=None):
+		return {
+			'term':			self.term,
+			'best':			self.bestField(),
+			'counts':		{field: len(rows) for field, rows in self.by_field.items()},
+			'timings_ms':	{field: round(seconds * 1000, 3) for field, seconds in self.timings.items()},
+			'hits':			[{
+				'id':		nameKey(hit.row[1]) if FIELDS[hit.field][0] == 'tbl_data' else hit.row[0],
+				'field':	hit.field,
+				'score':	hit.score,
+				'quality':	hit.quality,
+				'row':		list(hit.row),
+			} for hit in self.hits[:limit]],
+		}
+
+
+"""
+SearchIndex:	trigram index over the searchable fields of every person. Built from the rows of `tbl_data` and
+				`cust_data`; custom data edits are applied with `setCustField` / `addCust` so the index stays in
+				sync without a rebuild.
+
+				Fields like org names and skills repeat across thousands of people, so the index works on distinct
+				field values: each gram points at the values containing it, and each value at the people who have it.
+				A match is then only checked once per value rather than once per person.
+
+				The four maps are kept together in one state tuple, swapped whole by `load`: a search takes the state
+				once and uses only it, so it never pairs the postings of a new load with the docs of the old one.
+"""
+class SearchIndex:
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		# (docs, by_user, values, postings):
+		#	docs		doc id -> {'row': tbl_data row or None, 'cust': cust_data row or None, '<field>': lowercase text}
+		#	by_user		nameKey -> doc ids of the people with that name
+		#	values		field -> lowercase value -> list of doc ids with that value
+		#	postings	field -> gram -> list of values containing that gram
+		self._state = ([], {}, {field: {} for field in FIELDS}, {field: {} for field in FIELDS})
+
+	def __len__(self):
+		return len(self._state[0])
+
+	"""
+	load:	(re)builds the index from the rows of both tables
+
+	----Variables----
+	tbl_rows:	rows of `tbl_data`
+	cust_rows:	rows of `cust_data`
+	"""
+	def load(self, tbl_rows, cust_rows):
+		docs = []
+		by_user = {}
+		values = {field: {} for field in FIELDS}
+		postings = {field: {} for field in FIELDS}
+
+		for row in tbl_rows:
+			doc = {'row': tuple(row), 'cust': None}
+			by_user.setdefault(nameKey(row[1]), []).append(len(docs))
+			docs.append(doc)
+
+		for row in cust_rows:
+			row = tuple(row)
+			ids = by_user.get(row[0])
+			if not ids:
+				ids = by_user[row[0]] = [len(docs)]
+				docs.append({'row': None, 'cust': None})
+			for doc_id in ids:
+				docs[doc_id]['cust'] = row
+
+		for doc_id, doc in enumerate(docs):
+			self._indexDoc(values, postings, doc_id, doc, FIELDS)
+
+		with self._lock:
+			self._state = (docs, by_user, values, postings)
+
+	def _indexDoc(self, values, postings, doc_id, doc, fields):
+		for field in fields:
+			table, col, weight = FIELDS[field]
+			src = doc['row'] if table == 'tbl_data' else doc['cust']
+			text = (src[col] or "").lower() if src else ""
+			doc[field] = text
+			if not text:
+				continue
+			ids = values[field].get(text)
+			if ids is None:
+				ids = values[field][text] = []
+				for gram in grams(text):
+					postings[field].setdefault(gram, []).append(text)
+			ids.append(doc_id)
+
+	def _unindexDoc(self, values, postings, doc_id, doc, fields):
+		for field in fields:
+			text = doc.get(field)
+			ids = values[field].get(text) if text else None
+			if not ids or doc_id not in ids:
+				continue
+			ids.remove(doc_id)
+			if ids:
+				continue
+			# nobody has this value any more: drop it and its grams
+			del values[field][text]
+			for gram in grams(text):
+				lst = postings[field].get(gram)
+				if lst and text in lst:
+					lst.remove(text)
+					if not lst:
+						del postings[field][gram]
+
+	"""
+	setCustField:	applies an edit of one custom data column to the index
+
+	----Variables----
+	user:			the person's name as stored in `cust_data`: <first name>_<last name>
+	column:			the `cust_data` column that changed
+	value:			its new value
+	"""
+	def setCustField(self, user, column, value):
+		col = CUST_COLUMNS.index(column)
+		with self._lock:
+			docs, by_user, values, postings = self._state
+			ids = by_user.get(user)
+			if not ids:
+				return
+			for doc_id in ids:
+				doc = docs[doc_id]
+				cust = list(doc['cust'] or [user] + [""] * (len(CUST_COLUMNS) - 1))
+				cust[col] = value
+				doc['cust'] = tuple(cust)
+				fields = [f for f in FIELDS if FIELDS[f][0] == 'cust_data']
+				self._unindexDoc(values, postings, doc_id, doc, fields)		# so the old value stops matching
+				self._indexDoc(values, postings, doc_id, doc, fields)
+
+	"""
+	person:	returns the (`tbl_data` row, `cust_data` row) of the first person named `user`; either can be None
+	"""
+	def person(self, user):
+		docs, by_user, values, postings = self._state
+		ids = by_user.get(user)
+		if not ids:
+			return (None, None)
+		doc = docs[ids[0]]
+		return (doc['row'], doc['cust'])
+
+	"""
+	addCust:	adds an empty custom data entry for `user` to the index
+	"""
+	def addCust(self, user):
+		with self._lock:
+			docs, by_user, values, postings = self._state
+			ids = by_user.get(user)
+			if not ids:
+				ids = by_user[user] = [len(docs)]
+				docs.append({'row': None, 'cust': None})
+			for doc_id in ids:
+				if docs[doc_id]['cust'] is None:
+					docs[doc_id]['cust'] = (user,) + ("",) * (len(CUST_COLUMNS) - 1)
+					self._indexDoc(values, postings, doc_id, docs[doc_id], [f for f in FIELDS if FIELDS[f][0] == 'cust_data'])
+
+	"""
+	_matchValues:	returns (match quality, value) for every distinct value of `field` containing `term` in `state`, best
+					first. The candidates are copied under the lock, since custom data edits change the maps from other
+					request threads.
+	"""
+	def _matchValues(self, state, field, term):
+		with self._lock:
+			if len(term) < GRAM:
+				candidates = list(state[2][field])
+			else:
+				postings = state[3][field]
+				candidates = None
+				for gram in grams(term):
+					lst = postings.get(gram)
+					if not lst:
+						return []
+					if candidates is None or len(lst) < len(candidates):
+						candidates = lst
+				candidates = list(candidates)
+
+		out = []
+		for text in candidates:
+			quality = matchQuality(text, term)
+			if quality:
+				out.append((quality, text))
+		out.sort(key=lambda match: -match[0])
+		return out
+
+	"""
+	_matches:	yields (doc id, match quality) for every person in `state` whose `field` contains `term`, best match first
+	"""
+	def _matches(self, state, field, term):
+		docs = state[0]
+		matches = self._matchValues(state, field, term)
+		with self._lock:
+			values = state[2][field]
+			matches = [(quality, text, list(values.get(text, ()))) for quality, text in matches]
+		for quality, text, ids in matches:
+			for doc_id in ids:
+				if docs[doc_id].get(field) == text:		# skip people whose value was edited since the lookup
+					yield (doc_id, quality)
+
+	"""
+	search:		searches `fields` (all of them by default) for `term` and returns a list of `SearchHit`, best match
+				first. Custom data fields return `cust_data` rows, the others return `tbl_data` rows. A person
+				matching in several fields shows up once per field.
+
+	----Variables----
+	term:		the search term; matched case-insensitively anywhere in a field
+	fields:		names of the fields to search, from `FIELDS`
+	limit:		the most hits returned per field; no limit by default
+	"""
+	def search(self, term, fields=None, limit=None):
+		term = (term or "").strip().lower()
+		if not term:
+			return []
+		state = self._state
+		docs = state[0]
+		hits = []
+
+		for field in (fields or FIELDS):
+			table, col, weight = FIELDS[field]
+			key = 'row' if table == 'tbl_data' else 'cust'
+			seen = set()
+			for doc_id, quality in self._matches(state, field, term):
+				row = docs[doc_id][key]
+				# people sharing a name share their custom data row; only report it once
+				if row[0] in seen:
+					continue
+				seen.add(row[0])
+				hits.append(SearchHit(quality * weight, field, quality, row))
+				if limit and len(seen) >= limit:
+					break
+
+		hits.sort(key=lambda hit: -hit.score)
+		return hits
+
+	"""
+	fanOut:		searches every field in `fields` (all of them by default) for `term`, timing each one, and returns a
+				`SearchResults` with the hits of all fields merged and ranked by score.
+
+	----Variables----
+	term:		the search term; see `search`
+	fields:		names of the fields to search, from `FIELDS`
+	limit:		the most hits returned per field; no limit by default
+	"""
+	def fanOut(self, term, fields=None, limit=None):
+		hits = []
+		by_field = {}
+		timings = {}
+		for field in (fields or FIELDS):
+			start = time.perf_counter()
+			field_hits = self.search(term, fields=[field], limit=limit)
+			timings[field] = time.perf_counter() - start
+			if field_hits:
+				by_field[field] = [hit.row for hit in field_hits]
+				hits.extend(field_hits)
+
+		hits.sort(key=lambda hit: -hit.score)		# stable, so ties stay in the order of `FIELDS`
+		return SearchResults(term, hits, by_field, timings)
+
+	"""
+	searchField:	returns the rows matching `term` in one field, in the order they were loaded (the order a
+					`like '%term%'` query on that column returns them in)
+	"""
+	def searchField(self, term, field):
+		table, col, weight = FIELDS[field]
+		key = 'row' if table == 'tbl_data' else 'cust'
+		term = (term or "").strip().lower()
+		if not term:
+			return []
+		state = self._state
+		docs = state[0]
+		out = []
+		seen = set()
+		for doc_id in sorted(doc_id for doc_id, quality in self._matches(state, field, term)):
+			row = docs[doc_id][key]
+			if row[0] not in seen:
+				seen.add(row[0])
+				out.append(row)
+		return out
@@ -5,18 +5,30 @@ Date:	7/15/2021
 """
 
 # Import dependencies
-from inspect import FullArgSpec
-from re import S, search
-import re
-from typing import Sequence
-from flask import Flask, render_template, redirect, url_for, request, jsonify, make_response
+from flask import Flask, Response, render_template, redirect, url_for, request, jsonify, make_response, session, g
 from flaskext.mysql import MySQL
 from flask_oidc import OpenIDConnect
-from okta.client import Client as UsersClient
-import csv
 import sys
+import os
+import time
 import json
-import requests
+import atexit
+from org_graph import OrgGraph, nameKey, COL_ORG
+from org_snapshot import writeSnapshot, openSnapshot, ORG_SNAPSHOT_FILE
+from ingest import reloadCSV, getFingerprint
+from db_pool import ConnectionPool, ObservedConnection
+from parallel_db import ParallelDB
+from storage import MySQLStorage, SQLiteStorage, CUST_COLUMNS
+from startup import Startup
+from write_behind import WriteBehind, CustWatcher, applyEdits
+from search_index import SearchIndex
+from suggest import Suggester
+from tree_builder import Tree, treeID, addUser, peopleOnNode, expandNode, nodePerson, addPath, addShared
+from cache import LRUCache
+from snapshots import TreeSnapshots
+from metrics import Registry
+from sql_trace import Tracer
+from json_stream import treeETag, iterTree, chooseEncoding, compressChunks
 
 # CSV data we use for the DB -- replace with WORKDAY data later
 # CSV_DIR = './datacsv.csv' # <---- old, outdated data used for debugging
@@ -27,10 +39,31 @@ DB_TO_USE		= 'default'						# name of the DB itself
 TABLE_TO_USE	= 'tbl_data'				# name of the hierarchy data table in the DB (comes from the .csv/Workday data)
 CUST_DAT		= 'cust_data'				# name of the custom data table in the DB
 RESULT_SIZE 	= 400						# limits amount of results returned in a query to this number
-NODES_ON_SCREEN = 100						# limits the number of nodes on screen at a given time
+NODES_ON_SCREEN = int(os.environ.get('NODES_ON_SCREEN', 300))	# limits the number of nodes on screen at a given time; trees build in linear time, so thousands is fine
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 5000))	# rows per batch when loading the .csv into the DB
+INGEST_LOAD_DATA = os.environ.get('INGEST_LOAD_DATA', '0') == '1'	# load the .csv with `LOAD DATA LOCAL INFILE` (MySQL only) before falling back to batched inserts
+INGEST_LOCK_TIMEOUT = float(os.environ.get('INGEST_LOCK_TIMEOUT', 600))	# seconds a worker waits for another worker's load of the .csv to finish
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))			# most MySQL connections open at once (per worker process)
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))	# seconds a request waits for a free connection
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR')		# folder the tree snapshots are saved to so restarts can reuse them; memory only if unset
+SNAPSHOT_TOP_N = int(os.environ.get('SNAPSHOT_TOP_N', 20))	# number of most-viewed people whose trees are kept as snapshots
+SNAPSHOT_REFRESH_INTERVAL = float(os.environ.get('SNAPSHOT_REFRESH_INTERVAL', 60))	# fewest seconds between adding snapshots for trees that became most viewed
+ORG_SNAPSHOT_DIR = os.environ.get('ORG_SNAPSHOT_DIR')	# folder the mapped org directory snapshot is kept in (see org_snapshot.py); opt-in: workers share one copy, but rows are decoded on every lookup, so large trees build ~4x slower. Each worker builds its own copy if unset
+SQL_TRACE = os.environ.get('SQL_TRACE', '0') == '1'		# trace the SQL of every request (see sql_trace.py); admins can also ask per request with `X-SQL-Trace: 1`
+STORAGE = os.environ.get('STORAGE', 'mysql')			# where the tables live: 'mysql' (the `mysql` container) or 'sqlite' (embedded; no DB server needed)
+SQLITE_PATH = os.environ.get('SQLITE_PATH', ':memory:')	# SQLite file for `STORAGE=sqlite`; in memory (reloaded from the .csv on every start) by default
+CUST_WRITE_INTERVAL = float(os.environ.get('CUST_WRITE_INTERVAL', 0.25))	# seconds custom data edits are held to be written in one batch (see write_behind.py); 0 writes each edit right away
+CUST_SYNC_INTERVAL = float(os.environ.get('CUST_SYNC_INTERVAL', 2))	# seconds between checks for custom data edits written by other worker processes (see `custDataSynced`)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')		# token required by the admin endpoints (sent as `X-Admin-Token`); disabled if unset
 
 # Other Constants
 GROUP_MAX 		= 5							# limits the degrees of seaparation used in creating the visual tree
+SUGGEST_LIMIT	= 10						# number of suggestions served per keystroke
+TREE_STORE_SIZE = 1000						# number of finished trees each worker keeps around for `/json`
+TREE_CACHE_TTL	= 600						# seconds a finished tree is reused before being rebuilt
+NODE_CACHE_SIZE = 5000						# number of node detail lookups (`/node_data`) each worker caches
+NODE_CACHE_TTL	= 300						# seconds a node detail lookup is reused before going back to the DB
+STARTUP_RETRY	= 5							# seconds to wait before retrying a failed startup step (e.g. the DB isn't up yet)
 TOP_NODE 		= "David_Walker"			# Preset name of the top individual in the database -- the root node to all employees.
 WP_INDEX = '/2D_front_end/splash.html'		# splash page seen by user when they visit `https://<URL>/`
 WP_DASH = '/2D_front_end/index.html'		# page that actually has the organizer tool
@@ -55,288 +88,435 @@ app.config['MYSQL_DATABASE_PASSWORD'] = 'wp'
 app.config['MYSQL_DATABASE_DB'] = 'default'
 app.config['MYSQL_DATABASE_HOST'] = 'mysql'		# for docker container, use `host.docker.internal`
 mysql.init_app(app)
+if INGEST_LOAD_DATA:
+	mysql.connect_args['local_infile'] = True		# lets `LOAD DATA LOCAL INFILE` send the .csv from this container; pymysql refuses it otherwise
+
+# where the tables live (see storage.py)
+if STORAGE == 'sqlite':
+	storage = SQLiteStorage(SQLITE_PATH)
+elif STORAGE == 'mysql':
+	storage = MySQLStorage(mysql.connect)
+else:
+	sys.exit(f'Unknown STORAGE {STORAGE!r}; use mysql or sqlite')
+
+# pool of connections to the DB; each request checks out its own connection (see `getDB`)
+db_pool = ConnectionPool(storage.connect, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT)
+
+# runs queries side by side on `db_pool` (e.g. for `/node_data`), or one after another when the pool is short of connections
+parallel_db = ParallelDB(db_pool, max_size=DB_POOL_SIZE)
+
+# custom data edits, written to the DB in batches in the background; anything still queued is written on exit
+cust_writes = WriteBehind(db_pool, storage, f'{DB_TO_USE}.{CUST_DAT}', interval=CUST_WRITE_INTERVAL)
+atexit.register(cust_writes.close)
+
+# finished trees, shared by every request in this process and keyed by tree id (see `tree_builder.treeID`).
+# everything else about a user's visit -- their last search, the node they clicked on, their Okta name and email --
+# lives in their Flask session, so any worker process or thread can serve any request
+tree_store = LRUCache(max_size=TREE_STORE_SIZE, ttl=TREE_CACHE_TTL)
+
+# DB rows behind the details shown when a node is clicked, keyed by the node's name
+node_cache = LRUCache(max_size=NODE_CACHE_SIZE, ttl=NODE_CACHE_TTL)
+
+# metrics served by `/metrics`
+metrics = Registry()
+
+# SQL tracing of requests, for finding slow queries and N+1 patterns; see `/admin/traces`
+tracer = Tracer(enabled=SQL_TRACE)
+m_request_seconds = metrics.histogram('organizer_request_duration_seconds', 'Time spent handling a request, by route', ['route'])
+m_requests = metrics.counter('organizer_requests_total', 'Requests handled, by route and status code', ['route', 'status'])
+m_sql_per_request = metrics.histogram('organizer_sql_queries_per_request', 'SQL queries issued while handling a request, by route', ['route'], buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+m_sql_queries = metrics.counter('organizer_sql_queries_total', 'SQL queries issued while handling requests')
+m_tree_nodes = metrics.histogram('organizer_tree_nodes', 'Nodes in each tree built, by kind of tree', ['kind'], buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000))
+m_tree_depth = metrics.histogram('organizer_tree_depth', 'Deepest group in each tree built, by kind of tree', ['kind'], buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10))
+m_tree_seconds = metrics.histogram('organizer_tree_build_seconds', 'Time spent building each tree, by kind of tree', ['kind'])
+m_ingest_seconds = metrics.gauge('organizer_ingest_last_duration_seconds', 'Duration of the last .csv ingest')
+m_ingest_rows = metrics.gauge('organizer_ingest_last_rows', 'Rows written by the last .csv ingest, by kind of change', ['change'])
+m_search_seconds = metrics.histogram('organizer_search_field_seconds', 'Time spent searching each field of the search index, by field', ['field'], buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+m_ingests = metrics.counter('organizer_ingests_total', 'Ingests of the .csv, by mode', ['mode'])
 
-# establish connection with the MySQL DB
-limit = 0
-while limit < 3:
-	try :
-		conn = mysql.connect()
-		break
-	except:
-		print("--------Error connecting server.py to mysql backend!--------")
-		limit += 1
-cursor = conn.cursor()
-
-# remove everything from main table in the database upon startup
-print('Truncating table...')
-# s = f'USE {DB_TO_USE}'
-# cursor.execute(s)
-s = f'TRUNCATE TABLE {TABLE_TO_USE}'
-cursor.execute(s)
-conn.commit()		# commit the transaction with the DB
-
-# set default search query values
-search_q = None
-result = None
-column_number = 1			# number associated with column in `column_search`; indexed at zero
-previously_searched = ""	# keeps track of the last search
-previous_result	= ""		# keeps track of last result
-email = ""					# the user's email given by Okta
-name = None					# the user's name given by Okta
-node = ""					# the node (name) clicked on by the user
-isCustData = False			# global flag used to add custom data for a node (name)
-node_num = 1				# used to track the number of nodes on screen
-node_num_flag = False		# global flag used to render "too many nodes!" message
-multi_list_src = None		# keeps track of the multiple search results (names) the user can choose from for a given search
-render_back_bttn = False	# global flag that determines whether or not to render the on-screen back button
-
-# set up the main data structure
-# this struc becomes a JSON object that is sent to the front-end and used to render the 2D nodes
-send_data = {'nodes':[],  'links': []}
-
-# process the .csv data provided and put it into the DB --> note, this step needs to be replaced in the future with data taken from Workday!
-print('Loading data into DB...')
-with open(CSV_DIR, encoding="ISO-8859-1") as fp:
-	reader = csv.reader(fp, delimiter=",", quotechar='"')
-	for row in reader:
-		# Converts each row to a formatted string, similar to the output of `print(row)`
-		j = ', '.join('"{0}"'.format(w) for w in row)	
-
-		# insert data into DB
-		s = f'INSERT into {TABLE_TO_USE} values({j})'
-		cursor.execute(s) 
-
-# Remove the first row from the DB, since it contains the column headers
-print('Deleting unneeded first row...')
-cursor.execute(f'DELETE FROM `{TABLE_TO_USE}` LIMIT 1')
-conn.commit()
+"""
+recordIngest:	Records the outcome of a `reloadCSV` in the metrics.
 
+----Variables----
+stats:			the dictionary returned by `reloadCSV`
+seconds:		how long the ingest took
+"""
+def recordIngest(stats, seconds):
+	m_ingests.inc(stats['mode'])
+	m_ingest_seconds.set(seconds)
+	for change in ('inserted', 'updated', 'deleted'):
+		m_ingest_rows.set(stats[change], change)
 
-########################################################################	Functions	########################################################################
+"""
+loadTables:		Creates the tables if needed and processes the .csv data provided into the DB --> note, this step needs to be
+				replaced in the future with data taken from Workday! Only rows that changed since the last load are written;
+				nothing is done if the file itself is unchanged. Runs in the background at startup (see `createApp`).
+"""
+def loadTables():
+	print('Loading data into DB...')
+	with db_pool.connection() as conn:
+		storage.setup(conn)
+		ingest_start = time.perf_counter()
+		recordIngest(reloadTable(conn), time.perf_counter() - ingest_start)
 
 """
-searchDB:		searches the DB for a term and returns the result from the DB. Dending on flags, returns a tuple or, if multiple
-				results are found, a list of tuples from the DB. Returns cursor with DB search result by default.
+reloadTable:	Runs `reloadCSV` on the hierarchy table while holding the DB-wide ingest lock, so worker processes starting
+				together (or an `/admin/reload` during startup) load the .csv one at a time and share the stage table
+				safely. A worker that had to wait finds the fingerprint already stored and skips the load.
 
 ----Variables----
-search_term:	the input for the search
-column:			the column in the DB to search 
-table:			the table in the DB to search
-fetchAll:		flags whether or not to fetch all results from DB
-fetchOne:		flags whether or not to fetch one result from DB
-"""
-def searchDB(search_term, column, table, fetchAll=False, fetchOne=False):
-	term = search_term.replace("\'", "\'\'")	
-	s = f'SELECT * from {DB_TO_USE}.{table} where {column} like \'%{term}%\''
-	cursor.execute(s)
-	if fetchAll:
-		return cursor.fetchall()
-	elif fetchOne:
-		return cursor.fetchone()
-	return cursor
-
-"""
-checkForCustData:	Returns true if an entry for the selected node is found in the database. Returns false otherwise.
-					Also set the global flag `isCustData` to match the main return. i.e. if there is an entry in the custom
-					database, the function will both set `isCustData` to True and return True
+conn:			DB connection
+force:			reload even if the .csv is unchanged
+"""
+def reloadTable(conn, force=False):
+	with storage.lock(conn, f'{DB_TO_USE}.{TABLE_TO_USE}.ingest', INGEST_LOCK_TIMEOUT):
+		return reloadCSV(conn, TABLE_TO_USE, CSV_DIR, batch_size=INGEST_BATCH_SIZE, use_load_data=INGEST_LOAD_DATA and STORAGE == 'mysql', force=force)
 
-----Variables----
-node:				the node we want to check to see if it has an entry. String. Formatted <first name>_<last name>
+# in-memory copy of the hierarchy; the tree builders answer from this instead of querying the DB per node
+org_graph = OrgGraph()
+
+# in-memory search index over names, titles, orgs and skills; the search bar uses this instead of `like` scans
+search_index = SearchIndex()
+
+# type-ahead suggestions for the search bar, served by `/suggest`
+suggester = Suggester()
+
+# prebuilt trees for the default (`TOP_NODE`) tree and the most-viewed people, rebuilt in the background on every reload
+# and whenever another tree makes it into the most viewed
+snapshots = TreeSnapshots(directory=SNAPSHOT_DIR, top_n=SNAPSHOT_TOP_N, refresh_interval=SNAPSHOT_REFRESH_INTERVAL)
+
+# cache and pool gauges, read when `/metrics` is served
+caches = {'trees': tree_store, 'nodes': node_cache, 'suggestions': suggester.cache}
+metrics.gauge('organizer_cache_hit_rate', 'Share of cache lookups that were hits, by cache', ['cache'], fn=lambda: {name: cache.stats()['hit_rate'] for name, cache in caches.items()})
+metrics.gauge('organizer_cache_entries', 'Entries in each cache', ['cache'], fn=lambda: {name: len(cache) for name, cache in caches.items()})
+metrics.gauge('organizer_tree_snapshots', 'Trees kept as snapshots', fn=lambda: len(snapshots))
+metrics.gauge('organizer_db_pool_connections', 'DB connections in the pool, by state', ['state'], fn=lambda: {state: db_pool.stats()[state] for state in ('in_use', 'idle')})
+metrics.gauge('organizer_people', 'People in the org graph', fn=lambda: len(org_graph))
+metrics.gauge('organizer_cust_writes_pending', 'Custom data edits queued and not written to the DB yet', fn=lambda: len(cust_writes))
+
+
+########################################################################	Functions	########################################################################
+
+"""
+getDB:		Returns the DB connection checked out for the current request, checking one out of the pool on first use.
+			The connection goes back to the pool when the request ends (see `releaseDB`). Queries run on it are counted
+			for `/metrics`.
 """
-def checkForCustData(node):
-	global isCustData
-	node = node.replace("\'", "\'\'")
-	s = f'SELECT * from {DB_TO_USE}.{CUST_DAT} where user like \'%{node}%\''
-	cursor.execute(s)
-	result = cursor.fetchone()
-	if result:
-		isCustData = True
-		return True
-	isCustData = False
-	return False
+def getDB():
+	if 'db' not in g:
+		g.db = db_pool.acquire()
+		g.db_observed = ObservedConnection(g.db, countQuery)
+	return g.db_observed
 
+"""
+countQuery:	Counts a query run on the current request's DB connection (see `ObservedConnection`), and adds it to the
+			request's SQL trace if it's being traced
+"""
+def countQuery(statement, args, seconds, rows):
+	g.sql_queries = g.get('sql_queries', 0) + 1
+	m_sql_queries.inc()
+	trace = g.get('sql_trace')
+	if trace is not None:
+		trace.add(statement, seconds, rows)
+
+@app.before_request
+def startTimer():
+	g.start_time = time.perf_counter()
+	if tracer.enabled or (request.headers.get('X-SQL-Trace') == '1' and isAdmin()):
+		g.sql_trace = tracer.start(request.url_rule.rule if request.url_rule is not None else 'unmatched', request.method)
+
+# record each request's latency and SQL query count in the metrics
+@app.after_request
+def recordRequest(response):
+	route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+	if 'start_time' in g:
+		m_request_seconds.observe(time.perf_counter() - g.start_time, route)
+	m_requests.inc(route, str(response.status_code))
+	m_sql_per_request.observe(g.get('sql_queries', 0), route)
+	trace = g.pop('sql_trace', None)
+	if trace is not None:
+		tracer.finish(trace)
+	return response
+
+@app.teardown_appcontext
+def releaseDB(exc):
+	conn = g.pop('db', None)
+	if conn is not None:
+		db_pool.release(conn, broken=(exc is not None and not db_pool.healthy(conn)))
 
 """
-createTree:		Recursively searches the reportsTo column in order to add to the `send_data` data structure.
-				The struc is formatted as a dictionary, which can be later translated to a JSON object in order 
-				to be used by the front-end script. 
+refreshIndexes:		Rebuilds the in-memory org graph, search index and suggestions from the contents of `tbl_data` and `cust_data`,
+					and starts rebuilding the tree snapshots. Must be called whenever the hierarchy table is reloaded (e.g.
+					from the .csv or Workday) so the trees and searches stay consistent with the DB. With `ORG_SNAPSHOT_DIR` set,
+					the org graph is mapped from the snapshot of `tbl_data` for the current ingest fingerprint, written by the
+					first worker to get here, instead of being built in every worker. Only the org graph is shared that way:
+					the search index and suggestions are built by streaming over the snapshot's rows, but each worker still
+					keeps its own copy of them (the search index holds every person's row).
+"""
+def refreshIndexes():
+	with cust_watcher.paused():
+		edits = cust_writes.pending()		# custom data edits not written to the DB yet
+		path = os.path.join(ORG_SNAPSHOT_DIR, ORG_SNAPSHOT_FILE) if ORG_SNAPSHOT_DIR else None
+		with db_pool.connection() as conn:
+			cursor = conn.cursor()
+			version = getFingerprint(cursor, TABLE_TO_USE)
+			org_snapshot = openSnapshot(path, version) if version is not None else None		# another worker may have written it already
+			if org_snapshot is None:
+				cursor.execute(f'SELECT * from {DB_TO_USE}.{TABLE_TO_USE}')
+				tbl_rows = cursor.fetchall()
+			cust_version = cust_watcher.version(cursor)
+			cursor.execute(f'SELECT * from {DB_TO_USE}.{CUST_DAT}')
+			cust_rows, _ = applyEdits(cursor.fetchall(), [column[0] for column in cursor.description], edits)
+			conn.commit()
+		if org_snapshot is None and path:
+			try:
+				writeSnapshot(path, tbl_rows, version)
+				org_snapshot = openSnapshot(path)
+			except OSError as e:
+				print(f'Could not write the org snapshot {path}: {e}')
+		if org_snapshot is not None:
+			org_graph.loadSnapshot(org_snapshot)
+			tbl_rows = org_snapshot.rows		# decoded one row at a time as the indexes are built
+		else:
+			org_graph.load(tbl_rows)
+		search_index.load(tbl_rows, cust_rows)
+		suggester.load(tbl_rows, cust_rows)
+		cust_watcher.seen(cust_version)
+	tree_store.clear()
+	node_cache.clear()
+	print(f'Org graph and search index loaded with {len(org_graph)} people')
+	refreshSnapshots(version)
+
+"""
+searchFields:	Searches every searchable field for `search_q` (see `SearchIndex.fanOut`) and returns the `SearchResults`:
+				the hits of every field merged and ranked, each field's matching rows (best match first and at most 
+				`RESULT_SIZE` per field) and how long each field took. Name and org matches are `tbl_data` rows; position
+				and skills matches are `cust_data` rows.
+"""
+def searchFields(search_q):
+	results = search_index.fanOut(search_q, limit=RESULT_SIZE)
+	for field, seconds in results.timings.items():
+		m_search_seconds.observe(seconds, field)
+	return results
+
+"""
+custDataChanged:	Drops everything cached from `cust_data` for `user` after their custom data was edited: their node 
+					details (and those of any node whose `like` lookup matches them) and trees built from position or 
+					skills searches.
 
 ----Variables----
-query:			a string representing the person we're searching for in that iteration.
-group:			the degree of separation a node has from the root of the three
-is_mult_list:	flag used to override the degrees of separation from a displayed node; used to display one layer of names from a search returning multiple results
-"""
-def createTree(query, group, is_mult_list=False):
-	global send_data	# establish the data structure as a global variable
-	global conn			# establish the mysql variables as global variables
-	global cursor
-	global node_num		
-	global node_num_flag
-
-	# base case: search for input `query`, and if it's null, return from the fuction w/ null
-	for_search = query.replace("\'", "\'\'")		# modify the query so we can actually search or names containing approstrophes in the DB
-	s = f'SELECT * from {DB_TO_USE}.{TABLE_TO_USE} where reportsTo like \'%{for_search}%\''
-	cursor.execute(s)
-	temp_list = cursor.fetchmany(size=RESULT_SIZE)
-	# cursor.fetchall()		# fetch the rest of the rows in order to execute new statements
-	
-	if temp_list:		# if `temp_list` is not empty, i.e. there are children nodes beneath the current node
-		# return None			# return without describing any new links
+user:				the person whose custom data changed, formatted <first name>_<last name>
+"""
+def custDataChanged(user):
+	node_cache.invalidateWhere(lambda key, value: key in user)
+	tree_store.invalidateWhere(lambda key, tree: tree.spec is not None and tree.spec[0] == 'people' and tree.spec[2] in ("position", "skills"))
 
-		# use the tuple returned by the search and iterate through each item
-		for item in temp_list:
+"""
+custDataSynced:		Applies the `cust_data` rows read by `cust_watcher` once another worker process wrote edits: each
+					person whose row differs from this worker's search index gets the changed columns applied to the
+					index and suggestions, and their cached details dropped (see `custDataChanged`).
 
-			# format the string to get just the name of the individual
-			s0 = item[1].split()
-			
-			item_name = s0[0] + '_'+ s0[1] 
-			item_name = item_name.replace("\'", "\'\'")
-
-			# check to see if the individiual is listed as a node already.
-			cont_node_flag = False
-			if send_data['nodes']:					# if there are nodes in the list,
-				for dict in send_data['nodes']:		# go through each node's dictionary
-					if dict['id'] == item_name:		# and see if the person's name is there
-						cont_node_flag = True	
-
-			# if the node is not in the list, add it
-			if not cont_node_flag:
-				send_data['nodes'].append({"id": item_name, "group":group})
-			
-				# recursion step --> goes thru the rest of the child nodes and adds descriptions for the links between parent-child nodes
-				if (group < GROUP_MAX and node_num < NODES_ON_SCREEN):
-					node_num += 1
-					# print("node num:\t", node_num)
-					createTree(item_name, group + 1)
-				else:
-					node_num_flag = True
-		
-			# add the new link to `send_data['links']`
-			temp_dict = {"source": item_name, "target": query, "value":(1 / group)}	# we may want to add the value argument here
-			send_data['links'].append(temp_dict)
-	
-	return	# return from createTree
+----Variables----
+rows:				every `cust_data` row, including this worker's edits not written yet
+columns:			the rows' column names
+"""
+def custDataSynced(rows, columns):
+	index = {column: i for i, column in enumerate(columns)}
+	for row in rows:
+		user = row[0]
+		current = search_index.person(user)[1]
+		if current is None:
+			search_index.addCust(user)
+			current = (user,) + ("",) * (len(CUST_COLUMNS) - 1)
+		changed = False
+		for col, column in enumerate(CUST_COLUMNS[1:], 1):
+			value = row[index[column]]
+			if current[col] != value:
+				search_index.setCustField(user, column, value)
+				suggester.setCustField(user, column, value)
+				changed = True
+		if changed:
+			custDataChanged(user)
+
+# notices custom data edits written by other worker processes (see write_behind.py); checked at most every
+# `CUST_SYNC_INTERVAL` seconds by `syncCustData`
+cust_watcher = CustWatcher(cust_writes, custDataSynced, interval=CUST_SYNC_INTERVAL)
 
+"""
+lookupNode:		Returns the DB rows behind a node's details as a tuple of (`tbl_data` row or None, list of `cust_data` 
+				rows, `cust_data` column names or None). Both tables are queried at the same time (see parallel_db.py).
+				Cached per node; see `custDataChanged`. A read that an edit invalidated while it ran isn't cached.
 
+----Variables----
+node:			the name of the node, formatted <first name>_<last name>
 """
-addBoss:		Adds a boss to the tree.
+def lookupNode(node):
+	cached = node_cache.get(node)
+	if cached is not None:
+		return cached
+	generation = node_cache.generation		# an edit invalidating the node while it's read keeps the read out of the cache
+
+	# search selected node's name and any custom data in the DB at the same time, plus custom data edits that are still
+	# queued (taken first, so each edit is either written already or in `edits`)
+	edits = cust_writes.pending(lambda user: node in user)
+	term = '%' + node + '%'
+	(search_result, _), (cust_result, column_names) = parallel_db.gather(
+		(f'SELECT * from {DB_TO_USE}.{TABLE_TO_USE} where uniqueID like %s', [term], True),
+		(f'SELECT * from {DB_TO_USE}.{CUST_DAT} where user like %s', [term]),
+		on_query=countQuery)
+	cust_result, column_names = applyEdits(cust_result, column_names, edits)
+	if not search_result:
+		cust_result, column_names = [], None		# custom data only counts for people in the hierarchy
+
+	found = (search_result, cust_result, column_names)
+	node_cache.put(node, found, generation=generation)
+	return found
+
+"""
+newTree:	Returns an empty `Tree` sized by the limits set at the top of this file.
+"""
+def newTree():
+	return Tree(group_max=GROUP_MAX, node_limit=NODES_ON_SCREEN, result_size=RESULT_SIZE)
+
+"""
+buildTree:	Builds the tree described by `spec`. A spec is a small JSON-serializable list that is kept in the user's 
+			session, so that any worker can rebuild the user's tree if it isn't already in its `tree_store`.
+
+			['user', <row from tbl_data>, <full_term>, <is_mult_list>]				--> tree under a person (`addUser`)
+			['people', <search_q>, <field>, <base_node>, <isSkill>]					--> people matching a search (`peopleOnNode`)
+			['empty']																--> no tree
 
 ----Variables----
-full_term:		The full name of the person that the boss will be attached to in the tree
-boss_name:		A formatted version of the boss' name: <first name>_<last name>
-isSkill:		flags whether the function is being used for a skill (searches for name in a different index)		
-"""
-def addBoss(full_term, name, isSkill=False):
-	if isSkill:
-		reg_name = name
-		boss_name = 'Reports To: ' + name
-	else:
-		temp = name.split("_")
-		reg_name = temp[1] + '_' + temp[2]
-		boss_name = 'Reports To: ' + temp[1] + "_" + temp[2]
-	add_boss = True
-	add_alt_link = False
-	temp_dict = {}
-
-	# check if the boss is already in the nodes list
-	for dict in send_data['nodes']:
-		if boss_name in dict.values():
-			add_boss = False
-		# check if the boss (as a person) is already in the tree
-		if reg_name in dict.values():
-			add_alt_link = True
-
-	if add_boss:
-		send_data['nodes'].append({"id": boss_name, "group":0})				# add the boss as a node to the list of nodes
-	
-	if add_alt_link:
-		temp_dict = {"source": full_term, "target": reg_name, "value":1}
-	else:
-		temp_dict = {"source": full_term, "target": boss_name, "value":1}
-	send_data['links'].append(temp_dict)									# add boss-query link to list of links
+spec:		the description of the tree to build
+"""
+def buildTree(spec):
+	start = time.perf_counter()
+	tree = newTree()
+	if spec[0] == 'user':
+		addUser(tree, org_graph, spec[1], spec[2], is_mult_list=spec[3])
+	elif spec[0] == 'people':
+		result = [hit.row for hit in search_index.search(spec[1], fields=[spec[2]], limit=RESULT_SIZE)]
+		peopleOnNode(tree, org_graph, result, spec[3], isSkill=spec[4])
+
+	m_tree_seconds.observe(time.perf_counter() - start, spec[0])
+	m_tree_nodes.observe(len(tree), spec[0])
+	m_tree_depth.observe(max(tree.nodes.values(), default=0), spec[0])
+	return tree
+
+"""
+specID:		Returns the id of the tree described by `spec`, built with the current tree limits (`GROUP_MAX`, `NODES_ON_SCREEN`)
+"""
+def specID(spec):
+	return treeID([spec, GROUP_MAX, NODES_ON_SCREEN])
 
 """
-addUser:	Creates a new tree to be rendered by the front-end. Adds the searched-for person (and their boss, if applicable)
-				to the base of the tree and then recursively finds and adds all related people under the searched-for person.
-				The tree render is limited by the global variable `GROUP-MAX`, which limits the degrees of separation from the 
-				searched-for person that is displayed by the tree. 
+useTree:	Builds the tree described by `spec` (or reuses it if it's already been built), remembers it as the user's
+			current tree, and returns a tuple of (tree id, tree).
 
 ----Variables----
-result:			the search result of the query from the database
-full_term:		the search query (a person's name) that spit out `result` from the database. Formatted <first name>_<last name>
-is_mult_list:	flag used to override the degrees of separation from a displayed node; used to display one layer of names from a search returning multiple results
-"""
-def addUser(result, full_term, is_mult_list=False):
-	global node_num
-	global node_num_flag
-	group = 0
-	node_num = 1
-	node_num_flag = False
-
-	# get the boss' name if possible
-	if result[2] != None:
-		boss_lowercase = result[2].lower()
-	
-	if (boss_lowercase.islower()):		# check that the name has valid characters
-		addBoss(full_term, result[2])	# Add boss to the tree
-		group += 1
-	
-	send_data['nodes'].append({"id": full_term, "group":group})		# add the name as a node to the list of nodes
-	group += 1
-	createTree(full_term, group, is_mult_list=is_mult_list)			# do recursion to gather all of the nodes and links
+spec:		the description of the tree to build (see `buildTree`)
+"""
+def useTree(spec):
+	tree_id = specID(spec)
+	if spec[0] == 'user' and snapshots.recordView(viewKey(spec)):
+		refreshSnapshots(snapshots.version)
+	tree = findTree(tree_id)
+	if tree is None:
+		tree = buildTree(spec)
+		tree.spec = spec
+		tree_store.put(tree_id, tree)
+	session['tree'] = spec
+	return (tree_id, tree)
+
+"""
+findTree:	Returns the finished tree with id `tree_id` from the snapshots or the `tree_store`, or None if neither has it.
+"""
+def findTree(tree_id):
+	tree = snapshots.get(tree_id)
+	return tree if tree is not None else tree_store.get(tree_id)
 
 """
-peopleOnNode():	creates a node with multiple individuals from the DB attached to it.
+userSpec:		Returns the spec (see `buildTree`) of the tree under the person `name`, or None if they're not in the directory.
 
 ----Variables----
-result:			the list of people to be attached to the base node. A list of tuples from the DB
-base_node:		name of the base node all the names will be attached to.
-isSkill:		flags whether `base_node` is a skill, i.e. not a person (searches for name in a different index)
+name:			the person's name, formatted <first name>_<last name>
+is_mult_list:	whether it's the tree shown for a search returning multiple names (see `addUser`)
+"""
+def userSpec(name, is_mult_list=False):
+	row = org_graph.byName(name)
+	return ['user', list(row), name, is_mult_list] if row else None
 
 """
-def peopleOnNode(result, base_node, isSkill=False):
-	boss_name = ""
+viewKey:	Returns the key views of the 'user' tree `spec` are counted under (see snapshots.py): the spec without the
+			person's row, which can change between reloads. `viewSpec` turns it back into the spec.
+"""
+def viewKey(spec):
+	return json.dumps(spec[2:])
 
-	# add base_node to tree
-	send_data['nodes'].append({"id": base_node, "group":0})
-	
-	# add each person to the tree
-	for item in result:
-		
-		# get the person's name and boss' names
-		if isSkill:		# if the base node is not a person's name
-			# grab person's name
-			full_term = item[0]	
-
-			# find person's entry in the hierarchy (.csv file)
-			s = f'SELECT * from {DB_TO_USE}.{TABLE_TO_USE} where userName like \'%{full_term}%\''
-			cursor.execute(s)
-			result = cursor.fetchone()
-			
-			# check if we got a result & get boss' name accordingly
-			if result:
-				boss_name = result[2]	# get boss' name	
-			else:
-				boss_name = "No_Boss_Found"
+"""
+viewSpec:	Returns the spec of the tree with view key `key` (see `viewKey`), or None if the person is no longer in the
+			directory.
+"""
+def viewSpec(key):
+	try:
+		name, is_mult_list = json.loads(key)
+	except (ValueError, TypeError):
+		name, is_mult_list = key, False		# view counts saved when they were kept by name
+	return userSpec(name, is_mult_list)
 
-		else:
-			# create person's and boss' names
-			temp = item[1].split()
-			full_term = temp[0] + '_' + temp[1]
-			boss_name = item[2]
-
-		# get the boss' name if possible
-		if boss_name != None:
-			boss_lowercase = boss_name.lower()
-		
-		if (boss_lowercase.islower()):		# check that the name has valid characters
-			addBoss(full_term, boss_name, isSkill=isSkill)		# Add boss to the tree
+"""
+refreshSnapshots:	Starts rebuilding the tree snapshots (see snapshots.py) in the background: the default tree under
+					`TOP_NODE` and the trees of the most-viewed people. Snapshots already built from the same version
+					are kept, so only the trees new to the most viewed are built.
 
-		send_data['nodes'].append({"id": full_term, "group":1})				# add the name as a node to the list of nodes
-		temp_dict = {"source": full_term, "target": base_node, "value":1}	# add person-to-base-node link
-		send_data['links'].append(temp_dict)
+----Variables----
+version:			version of the data in `tbl_data` (its ingest fingerprint); snapshots saved on disk for the same
+					version are reused
+"""
+def refreshSnapshots(version):
+	views = snapshots.topViewed(SNAPSHOT_TOP_N)
+	specs = [userSpec(TOP_NODE)] + [viewSpec(key) for key in views]
+	specs = [spec for spec in specs if spec is not None]
+	snapshots.refresh(specs, buildTree, version, tree_ids=specID, views=views)
+
+# the slow part of starting up, run in the background by `createApp` (or from the first request): load the .csv into the
+# DB, then build the org graph and search index from the freshly loaded tables. Until it's done, only the pages that
+# don't need the data are served
+startup = Startup([('tables', loadTables), ('indexes', refreshIndexes)], retry=STARTUP_RETRY)
+STARTUP_ENDPOINTS = {'index', 'static', 'login', 'logout', '_oidc_callback', 'giveReady', 'giveMetrics'}
+metrics.gauge('organizer_ready', 'Whether startup finished loading the data (1) or not (0)', fn=lambda: int(startup.ready))
+
+"""
+createApp:	Returns the Flask app with its startup (DB tables, .csv ingest, indexes) running in the background; `/ready`
+			reports its progress. Importing this file does none of that, so the server can bind its port right away.
+			A WSGI server can also load `server:app` directly: each worker then starts its startup on its first request
+			(a probe of `/ready` is enough), see `waitForStartup`.
+
+----Variables----
+wait:		block until startup is done (e.g. for scripts and tests)
+"""
+def createApp(wait=False):
+	startup.start()
+	if wait:
+		startup.wait()
+	return app
+
+# answer with a 503 (and the startup progress) while the data the page needs is still being loaded. Also starts the
+# startup if nothing did yet, e.g. under a WSGI server that loaded `server:app` without calling `createApp`
+@app.before_request
+def waitForStartup():
+	if startup.ready:
+		return None
+	startup.start()
+	if request.endpoint not in STARTUP_ENDPOINTS:
+		return make_response(jsonify(startup.status()), 503, {'Retry-After': str(STARTUP_RETRY)})
+
+# bring this worker's search index, suggestions and caches up to date with custom data edits other workers wrote
+@app.before_request
+def syncCustData():
+	if startup.ready:
+		cust_watcher.check()
 
-		
 
 # This route is what the user sees when they first visit the `/` URL
 @app.route('/')
@@ -348,17 +528,12 @@ def index():
 @oidc.require_login		# requires Okta login
 def organizer():
 	
-	# make sure we can access the variables we need
-	global send_data
-	global previously_searched
-	global previous_result
-	global multi_list_src
+	# the user's state between requests is kept in their session
+	previously_searched = session.get('previously_searched', "")	# keeps track of the last search
+	previous_result = session.get('previous_result', "")			# keeps track of last result
+	render_back_bttn = session.get('render_back_bttn', False)		# determines whether or not to render the on-screen back button
+	multi_list_src = None		# keeps track of the multiple search results (names) the user can choose from for a given search
 	full_term = ""		# the full term that gave results from the DB; used when the query is one word long
-	boss_name = ""		# the higher-up who the query (if they're a person) reports to
-	global result		# FIXME
-	global node_num_flag
-	global render_back_bttn
-	global name
 	is_mult_list = False	# flag used to make searches taken from the drop-down name list only display one layer of names
 	
 
@@ -380,99 +555,96 @@ def organizer():
 					item_name = search_q						# else, just use the query itself in the search
 				
 				if (previously_searched != item_name):			# check if we're searching again for the previous search
-					
-					# make sure our tree is empty
-					send_data['nodes'] = []
-					send_data['links'] = []
+
+					# search every field at once and build the tree from the field with the best-ranked match (on a tie,
+					# the first of name, position, skills, org), so a weak name match doesn't hide an exact skill match
+					results = searchFields(search_q)
+					best = results.bestField()
+					matches = {best: results.by_field[best]} if best else {}
 
 					# search for query in name column of DB
-					result = searchDB(search_term=search_q, column="userName", table=TABLE_TO_USE, fetchAll=True)
+					result = matches.get("userName", [])
 
 					# identify if multiple names have been found for a single search and set result to just the first name
 					if len(result) > 1:
-						#FIXME
-						# print('!!!			MULTIPLE NAMES HAVE BEEN FOUND FOR A SINGLE SEARCH			!!!')
-						# print('here is the tuple in question:\n', json.dumps(result, indent=3))
-						#FIXME
 						multi_list_src = result
+						session['multi_list_q'] = search_q		# lets us rebuild the drop-down list for later requests
 						result = result[0]
 
 					# if we have a result from the names column, make the tree
 					if result:
 
 						# get the full term (person's name) from the column of search from the first result
-						if len(result) > 1:
+						if multi_list_src:
 							t0 = result
-							temp = t0[1].split()
 							is_mult_list = True
 						else:
-							multi_list_src = None
+							session.pop('multi_list_q', None)
 							t0 = result[0]
-							temp = t0[1].split()	
 							is_mult_list = False		
 
-						full_term = temp[0] + '_' + temp[1]	
+						full_term = nameKey(t0[1])
 
-						addUser(t0, full_term, is_mult_list=is_mult_list)	# create the tree we'll render
+						tree_id, tree = useTree(['user', list(t0), full_term, is_mult_list])	# create the tree we'll render
 
-						previously_searched = full_term		# mark search as previously searched
-						previous_result = result			# mark down the search result
+						session['previously_searched'] = full_term		# mark search as previously searched
+						session['previous_result'] = list(t0)			# mark down the search result
 
 						# render again with the new tree
-						render_back_bttn = True
-						return render_template(WP_DASH, search_q=search_q, result=result, node_num_flag=node_num_flag, multi_list_src=multi_list_src,
-												render_back_bttn=render_back_bttn )
+						session['render_back_bttn'] = True
+						return render_template(WP_DASH, search_q=search_q, result=result, node_num_flag=tree.node_num_flag, multi_list_src=multi_list_src,
+												render_back_bttn=True, tree_id=tree_id)
 
 					# check custom DB for result in the title/position column
-					result = searchDB(search_term=search_q, column="position", table=CUST_DAT, fetchAll=True)
+					result = matches.get("position")
 					if result:
-						peopleOnNode(result=result, base_node=search_q, isSkill=True)
-						render_back_bttn = True
-						return render_template(WP_DASH, search_q=search_q, result=result, node_num_flag=node_num_flag, render_back_bttn=render_back_bttn)
+						tree_id, tree = useTree(['people', search_q, "position", search_q, True])
+						session['render_back_bttn'] = True
+						return render_template(WP_DASH, search_q=search_q, result=result, node_num_flag=tree.node_num_flag, render_back_bttn=True, tree_id=tree_id)
 
 					# check custom DB for result in the skills column
 					# I'm assuming there is only one skill that is being searched for, thus no delimiting
-					result = searchDB(search_term=search_q, column="skills", table=CUST_DAT, fetchAll=True)
+					result = matches.get("skills")
 					
 					# if we get a result from the skills column, make the tree
 					# Again,I'm assuming there is only one skill that is being searched for, thus no delimiting
 					if result:
-						peopleOnNode(result, search_q, isSkill=True)
+						tree_id, tree = useTree(['people', search_q, "skills", search_q, True])
 
 						# render again with the new tree
-						render_back_bttn = True
-						return render_template(WP_DASH, search_q=search_q, result=result, node_num_flag=node_num_flag, render_back_bttn=render_back_bttn)
+						session['render_back_bttn'] = True
+						return render_template(WP_DASH, search_q=search_q, result=result, node_num_flag=tree.node_num_flag, render_back_bttn=True, tree_id=tree_id)
 
 					
 					# check hierarchical DB for result in the orgName column
-					result = searchDB(search_term=search_q, column="orgName", table=TABLE_TO_USE, fetchAll=True)
+					result = matches.get("orgName")
 					
 					# if we get a result from the orgname column, make the tree
 					if result:				
 						base_node = "\"" + search_q + "\""
-						peopleOnNode(result=result, base_node=base_node)
+						tree_id, tree = useTree(['people', search_q, "orgName", base_node, False])
 						
 						# render again with the new tree
-						render_back_bttn = True
-						return render_template(WP_DASH, search_q=search_q, result=result, node_num_flag=node_num_flag, render_back_bttn=render_back_bttn)
+						session['render_back_bttn'] = True
+						return render_template(WP_DASH, search_q=search_q, result=result, node_num_flag=tree.node_num_flag, render_back_bttn=True, tree_id=tree_id)
 
 					# we don't get a result from any DB
 					else:
-						multi_list_src = None
-						return render_template(WP_DASH, search_q=search_q, result="", node_num_flag=node_num_flag, render_back_bttn=render_back_bttn)
+						session.pop('multi_list_q', None)
+						tree_id, tree = useTree(['empty'])
+						return render_template(WP_DASH, search_q=search_q, result="", node_num_flag=False, render_back_bttn=render_back_bttn, tree_id=tree_id)
 				
 			
 			# we don't have a valid query from the user
 			else:
 				# make sure our tree is empty
-				send_data['nodes'] = []
-				send_data['links'] = [] 
-				multi_list_src = None
-				return render_template(WP_DASH, search_q="", result="", node_num_flag=node_num_flag, render_back_bttn=render_back_bttn)
+				session.pop('multi_list_q', None)
+				tree_id, tree = useTree(['empty'])
+				return render_template(WP_DASH, search_q="", result="", node_num_flag=False, render_back_bttn=render_back_bttn, tree_id=tree_id)
 			
 		# process "submit" button for custom data added by the user
 		elif request.form['go'] == 'submit_cust_data':
-			global node
+			node = session.get('node', "")
 
 			# used for going between formatted column names and the column names stored in the DB
 			formatted_column_names = [None, "Position", "Email", "Skills", "Team Description", "Distros", "Sharepoints"]
@@ -486,28 +658,26 @@ def organizer():
 			selection = column_names[temp_index]
 
 			# get custom data submitted by the user
-			custom_data = request.form.get('cust_data').replace("\'", "\'\'")
-			
-			s = f'UPDATE {DB_TO_USE}.{CUST_DAT} SET {selection}=\'{custom_data}\' where user=\'{node}\''
+			custom_data = request.form.get('cust_data')
 
-			cursor.execute(s)
-			conn.commit()		# commit DB changes
+			cust_writes.setField(node, selection, custom_data)		# written to the DB in the next batch
+			search_index.setCustField(node, selection, custom_data)	# keep searches in sync with the edit
+			suggester.setCustField(node, selection, custom_data)
+			custDataChanged(node)
 
 			return render_template(WP_DASH, search_q=previously_searched, result=previous_result, render_back_bttn=render_back_bttn)
 		
 		# process "submit" button to add an entry for the node in the custom DB
 		elif request.form['go'] == 'req_cust_data':
-			s = f'INSERT into {DB_TO_USE}.{CUST_DAT} values("{node}", "", "", "", "", "", "")'
-			cursor.execute(s)	# add custom data entry for the node
-			conn.commit()		# commit DB changes
+			node = session.get('node', "")
+			cust_writes.addUser(node)	# add custom data entry for the node in the next batch
+			search_index.addCust(node)
+			custDataChanged(node)
 			return render_template(WP_DASH, search_q=previously_searched, result=previous_result)
 
 		# process "submit" button to visit the selected node's page	
 		elif request.form['go'] == 'visit_node_page':
-			
-			# make sure our tree is empty
-			send_data['nodes'] = []
-			send_data['links'] = []
+			node = session.get('node', "")
 
 			# special case for selecting a "Reports_To:" node
 			#FIXME ---> this is the result of a larger bug in the way we deal with boss names
@@ -519,102 +689,226 @@ def organizer():
 				temp = node.split(" ")
 				node = temp[1] + "_" + temp[2]
 
-			# search for query in name column of DB
-			result = searchDB(search_term=node, column="userName", table=TABLE_TO_USE, fetchOne=True)
-			addUser(result=result, full_term=node)
+			# look the person up in the hierarchy
+			result = org_graph.byName(node)
+			tree_id, tree = useTree(['user', list(result), node, False])
 
-			previously_searched = node			# mark search as previously searched
-			previous_result = result			# mark down the search result
+			session['node'] = node
+			session['previously_searched'] = node		# mark search as previously searched
+			session['previous_result'] = list(result)	# mark down the search result
 
 			# render again with the new tree
-			return render_template(WP_DASH, search_q=node, result=result, render_back_bttn=render_back_bttn)
+			return render_template(WP_DASH, search_q=node, result=result, render_back_bttn=render_back_bttn, tree_id=tree_id)
 
 		# process "submit" button to visit a name from the drop-down for multiple search results
 		elif request.form['go'] == 'submit_multi_name':
 			
 			# get name as selected by the drop-down menu
 			name = request.form.get('mult_list')
-			# name = n0[0]
-
-			# make sure our tree is empty
-			send_data['nodes'] = []
-			send_data['links'] = []
 
-			# search for query in name column of DB
-			result = searchDB(search_term=name, column="userName", table=TABLE_TO_USE, fetchOne=True)
+			# look the person up in the hierarchy
+			result = org_graph.byName(nameKey(name))
 
 			# get the full term (person's name) from the column of search from the first result
-			temp = result[1].split()
-			full_term = temp[0] + '_' + temp[1]	
+			full_term = nameKey(result[1])
 
-			addUser(result, full_term, is_mult_list=True)				# create the tree we'll render
+			tree_id, tree = useTree(['user', list(result), full_term, True])	# create the tree we'll render
 
-			previously_searched = full_term			# mark search as previously searched
-			previous_result = result				# mark down the search result
+			session['previously_searched'] = full_term		# mark search as previously searched
+			session['previous_result'] = list(result)		# mark down the search result
+
+			# rebuild the drop-down list from the search that produced it
+			if session.get('multi_list_q'):
+				multi_list_src = searchFields(session['multi_list_q']).by_field.get("userName")
 
 			# render again with the new tree
-			return render_template(WP_DASH, search_q=name, result=result, node_num_flag=node_num_flag, multi_list_src=multi_list_src,
-									render_back_bttn=render_back_bttn)
+			return render_template(WP_DASH, search_q=name, result=result, node_num_flag=tree.node_num_flag, multi_list_src=multi_list_src,
+									render_back_bttn=render_back_bttn, tree_id=tree_id)
 
 	# determine how we should respond to GET requests
 	elif request.method == 'GET':
-		global email
-		global TOP_NODE
-		group = 0
-
-		# make sure our tree is empty
-		send_data['nodes'] = []
-		send_data['links'] = []
+		name = session.get('name')
 
-		# search for the user's name in the custom_data DB
-		# s = f'SELECT * from {DB_TO_USE}.{CUST_DAT} where email like \'%{email}%\''
-		s = f'SELECT * from {DB_TO_USE}.{TABLE_TO_USE} where userName like \'%{name}%\''
-		cursor.execute(s)
-		result = cursor.fetchone()
+		# search for the user's name in the main hierarchical .csv
+		found = search_index.searchField(name, "userName") if name else []
 
 		# find the user in the main hierarchical .csv
-		if result != None:
+		if found:
 			# create user's name
-			temp = result[0].split("_")
+			temp = found[0][0].split("_")
 			item_name = temp[1] + "_" + temp[2]
-			s = f'SELECT * from {DB_TO_USE}.{TABLE_TO_USE} where uniqueID like \'%{item_name}%\''
-			cursor.execute(s)
 
 		# if they're not found in the .csv, show the max'd out tree
 		else: 
 			# create user's name
 			item_name = TOP_NODE
-			s = f'SELECT * from {DB_TO_USE}.{TABLE_TO_USE} where uniqueID like \'%{ TOP_NODE }%\''
-			cursor.execute(s)
-		result = cursor.fetchone()
+		result = org_graph.byName(item_name)
 
 		# create a tree from the user's Okta info
-		addUser(result, item_name)
+		tree_id, tree = useTree(['user', list(result), item_name, False])
 		
 		# render the webpage with the tree generated from the login user's credentials
-		return render_template(WP_DASH, search_q=None, result=None, data=None)
+		return render_template(WP_DASH, search_q=None, result=None, data=None, tree_id=tree_id)
 	
 	# load the dashboard page by default
 	return render_template(WP_DASH, search_q=None, result=None)
 
 
 
-# this route serves the JSON data that we generate from the DB upon a successful search
+# this route serves the JSON data for a tree built by `/organizer_tool`. The page asks for its tree by id; without 
+# one, the user's current tree (from their session) is served
 @app.route('/json')
 def giveJSON():
-	global send_data
-	return json.dumps(send_data)
+	spec = session.get('tree', ['empty'])
+	tree_id = request.args.get('tree') or specID(spec)
+
+	tree = findTree(tree_id)
+	if tree is None:
+		# the tree was built by another worker (or dropped from the store); rebuild it if it's the user's own tree
+		if tree_id != specID(spec):
+			tree = newTree()
+		else:
+			tree_id, tree = useTree(spec)
+
+	# the page already has this tree, in the encoding it would be sent with; tell it to reuse its copy
+	encoding = chooseEncoding(request.accept_encodings, tree)
+	etag = treeETag(tree, encoding)
+	headers = {'Cache-Control': 'private, no-cache', 'Vary': 'Accept-Encoding'}
+	if request.if_none_match.contains(etag):
+		response = Response(status=304, headers=headers)
+		response.set_etag(etag)
+		return response
+
+	# stream the tree out in batches, compressed if the browser accepts it
+	if encoding is not None:
+		headers['Content-Encoding'] = encoding
+	response = Response(compressChunks(iterTree(tree), encoding), mimetype='application/json', headers=headers)
+	response.set_etag(etag)
+	return response
+
+"""
+argName:	Returns the person named by the request argument `key`, formatted <first name>_<last name>. Accepts node ids
+			as the front-end has them, including "Reports To: " nodes (see `nodePerson`).
+"""
+def argName(key):
+	return nodePerson(org_graph, request.args.get(key) or "")[0]
+
+# serves the people under a node that's already on the page, so the front-end can grow its tree on click: 
+# `/expand?node=<node id>&depth=<levels>`. Every node comes with the number of people under it
+@app.route('/expand')
+@oidc.require_login
+def giveExpansion():
+	node = request.args.get('node') or ""
+	depth = min(max(request.args.get('depth', 1, type=int), 1), GROUP_MAX)
+
+	tree = Tree(group_max=depth, node_limit=NODES_ON_SCREEN, result_size=RESULT_SIZE)
+	expandNode(tree, org_graph, node)
+
+	data = tree.toDict()
+	for record in data['nodes']:
+		record['descendants'] = org_graph.subtreeSize(nodePerson(org_graph, record['id'])[0])
+	return jsonify(data)
+
+# reporting-chain queries, answered from the precomputed hierarchy (see hierarchy.py)
+# `/chain?node=<name>`: everyone above a person, from their boss up to the top
+@app.route('/chain')
+@oidc.require_login
+def giveChain():
+	name = argName('node')
+	return jsonify({'node': name, 'found': name in org_graph.hierarchy(), 'chain': org_graph.hierarchy().chain(name)})
+
+# `/is_under?node=<name>&manager=<name>`: whether a person reports to a manager, directly or indirectly
+@app.route('/is_under')
+@oidc.require_login
+def giveIsUnder():
+	name = argName('node')
+	manager = argName('manager')
+	return jsonify({'node': name, 'manager': manager, 'under': org_graph.hierarchy().isUnder(name, manager)})
+
+# `/headcount?node=<name>`: the number of people under a manager, and how many of them report to them directly
+@app.route('/headcount')
+@oidc.require_login
+def giveHeadcount():
+	name = argName('node')
+	return jsonify({'node': name, 'headcount': org_graph.subtreeSize(name), 'direct': len(org_graph.children(name))})
+
+# `/common_manager?a=<name>&b=<name>`: the closest manager both people are under
+@app.route('/common_manager')
+@oidc.require_login
+def giveCommonManager():
+	a = argName('a')
+	b = argName('b')
+	return jsonify({'a': a, 'b': b, 'manager': org_graph.hierarchy().lowestCommonManager(a, b)})
+
+"""
+sharedThings:	Returns what two people have in common besides their managers, as node ids: "Org: <orgName>" if they're
+				in the same org (from `tbl_data`) and "Skill: <skill>" for each skill they both listed (from `cust_data`)
+
+----Variables----
+a, b:			the two people's names, formatted <first name>_<last name>
+"""
+def sharedThings(a, b):
+	row_a, cust_a = search_index.person(a)
+	row_b, cust_b = search_index.person(b)
+	out = []
+	if row_a and row_b and row_a[COL_ORG] and row_a[COL_ORG] == row_b[COL_ORG]:
+		out.append('Org: ' + row_a[COL_ORG])
+	if cust_a and cust_b:
+		skills_b = {skill.strip().lower() for skill in (cust_b[3] or "").split(",")}
+		for skill in (cust_a[3] or "").split(","):
+			if skill.strip() and skill.strip().lower() in skills_b:
+				out.append('Skill: ' + skill.strip())
+	return out
+
+# `/connect?a=<name>&b=<name>[&shared=1]`: how two people are connected, in the same format as `/json`. The path goes
+# through their lowest common manager; with `shared=1`, an org or skill they share is used instead if that's shorter
+@app.route('/connect')
+@oidc.require_login
+def giveConnection():
+	a = argName('a')
+	b = argName('b')
+	tree = newTree()
+
+	path = org_graph.hierarchy().path(a, b)
+	length = len(path[0]) + len(path[1]) - 2 if path else None
+	shared = sharedThings(a, b) if request.args.get('shared') == '1' else []
+
+	if shared and (length is None or length > 2):
+		addShared(tree, a, b, shared[0])
+		via = shared[0].split(":")[0].lower()
+		length = 2
+	elif path:
+		addPath(tree, *path)
+		via = 'hierarchy'
+	else:
+		via = None
+
+	data = tree.toDict()
+	data.update(via=via, length=length, shared=shared)
+	return jsonify(data)
+
+# serves the merged, ranked results of a search over every field, with how long each field took: `/search?q=<text>[&n=<hits>]`
+@app.route('/search')
+@oidc.require_login
+def giveSearch():
+	limit = min(max(request.args.get('n', 50, type=int), 1), RESULT_SIZE)
+	return jsonify(searchFields(request.args.get('q', "")).report(limit=limit))
+
+# serves type-ahead suggestions (people, titles, orgs, skills) for what's been typed in the search bar: `/suggest?q=<text>`
+@app.route('/suggest')
+@oidc.require_login
+def giveSuggestions():
+	limit = min(max(request.args.get('n', SUGGEST_LIMIT, type=int), 1), 50)
+	return jsonify(suggester.suggest(request.args.get('q', ""), limit=limit))
 
 # when a node is clicked, this route serves data about that node to the front-end
 @app.route('/node_data')
 def giveNodeData():
 	# get the name of the node that's embedded in the front-end's POST request
-	global node
-	global isCustData
-	global email
-	global name
+	name = session.get('name') or ""
 	node = request.args.get('node')
 	column_names = None
+	isCustData = False			# used to add custom data for a node (name)
 	nodeUserMatches = False		# used to check if the user is allowed to edit the current node
 
 	# column names used for custom data drop-down menu
@@ -624,8 +918,11 @@ def giveNodeData():
 	if ":" in node:
 		node = node.split(":")[1]
 
-	# search selected node's name in the DB
-	search_result = searchDB(search_term=node, column="uniqueID", table=TABLE_TO_USE, fetchOne=True)
+	# remember the node the user clicked on for the forms on the node details page
+	session['node'] = node
+
+	# look up the selected node's rows in the DB
+	search_result, cust_result, cust_columns = lookupNode(node)
 	
 	if search_result:
 		"""	
@@ -633,9 +930,6 @@ def giveNodeData():
 			a dictionary based on the structure of the DB
 		"""
 
-		# search for any custom data
-		cust_result = searchDB(search_term=node, column="user", table=CUST_DAT, fetchAll=True)
-		
 		data = {
 			# "Unique ID":	search_result[0],
 			"Name":			search_result[1],
@@ -653,7 +947,7 @@ def giveNodeData():
 			if name.replace(" ", "_") == cust_result[0][0]:
 				nodeUserMatches = True
 
-			column_names = [i[0] for i in cursor.description]	# get names of columns
+			column_names = cust_columns								# get names of columns
 																# note to self: we expect only one entry--therefore one result--for a node (person)
 			for item in cust_result:							# go through each entry in the search result
 				for i in range(len(item)):	
@@ -663,8 +957,6 @@ def giveNodeData():
 			data["Title"] = (cust_result[0][1] if cust_result[0][1] else search_result[3])
 			data["Postion"] = (None if data["Title"] == data["Position"] else data["Position"])	# removes the redundancy of `title` and `position` matching
 
-		else:
-			isCustData = False
 	else:
 		data = None
 
@@ -673,23 +965,77 @@ def giveNodeData():
 							formatted_column_names=formatted_column_names) 
 
 
+"""
+isAdmin:	Returns true if the request carries the admin token. Admin endpoints are disabled when no token is set.
+"""
+def isAdmin():
+	return bool(ADMIN_TOKEN) and request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+# readiness check for load balancers and orchestrators: 200 once startup has loaded the data, 503 (with its progress) before
+@app.route('/ready')
+def giveReady():
+	return make_response(jsonify(startup.status()), 200 if startup.ready else 503)
+
+# serves the metrics in the Prometheus text format, for scraping
+@app.route('/metrics')
+def giveMetrics():
+	return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# reloads the hierarchy data from the .csv without restarting the server
+@app.route('/admin/reload', methods=['POST'])
+def adminReload():
+	if not isAdmin():
+		return make_response(jsonify({'error': 'forbidden'}), 403)
+
+	force = request.args.get('force') == '1'
+	start = time.perf_counter()
+	stats = reloadTable(getDB(), force=force)
+	recordIngest(stats, time.perf_counter() - start)
+	if stats['mode'] != 'unchanged':
+		refreshIndexes()
+	return jsonify(stats)
+
+
+# serves the hit/miss counters of the caches for monitoring
+@app.route('/admin/cache')
+def adminCache():
+	if not isAdmin():
+		return make_response(jsonify({'error': 'forbidden'}), 403)
+	return jsonify({'trees': tree_store.stats(), 'nodes': node_cache.stats(), 'suggestions': suggester.cache.stats(), 'snapshots': snapshots.stats()})
+
+# serves the DB connection pool's counters for monitoring
+@app.route('/admin/pool')
+def adminPool():
+	if not isAdmin():
+		return make_response(jsonify({'error': 'forbidden'}), 403)
+	return jsonify(dict(db_pool.stats(), parallel_db=parallel_db.stats(), storage=storage.stats(), cust_writes=cust_writes.stats(), cust_sync=cust_watcher.stats()))
+
+# serves the SQL traces of recent requests: `/admin/traces[?format=folded][&route=<route>]`. The folded format can be fed
+# straight to flamegraph tools. Requests are traced if `SQL_TRACE=1`, or one at a time with an `X-SQL-Trace: 1` header
+@app.route('/admin/traces')
+def adminTraces():
+	if not isAdmin():
+		return make_response(jsonify({'error': 'forbidden'}), 403)
+	route = request.args.get('route')
+	traces = [trace for trace in tracer.traces() if route is None or trace.route == route]
+	if request.args.get('format') == 'folded':
+		return Response('\n'.join(line for trace in traces for line in trace.folded()) + '\n', mimetype='text/plain')
+	return jsonify({'enabled': tracer.enabled, 'traces': [trace.report() for trace in traces]})
+
+
 @app.route("/login")
 @oidc.require_login
 def login():
 
 	# retrieve the user's email and name upon login
-	global email
-	global name
-	global previously_searched
-
 	info = oidc.user_getinfo(["email"])
-	email = info.get('email')
+	session['email'] = info.get('email')
 	
 	temp = oidc.user_getinfo(["name"])
-	name = temp.get('name')
+	session['name'] = temp.get('name')
 
 	# reset search query and redirect to the tool
-	previously_searched = ""
+	session['previously_searched'] = ""
 	return redirect(url_for('organizer'))
 
 
@@ -699,5 +1045,5 @@ def logout():
     return redirect(url_for("index"))
 
 if __name__ == "__main__":
-	app.run(host='0.0.0.0')
+	createApp().run(host='0.0.0.0', threaded=True)
 
@@ -0,0 +1,213 @@
+"""
+Prebuilt snapshots of the trees most people land on: the default tree (under `TOP_NODE`, shown to anyone who isn't in
+the directory) and the trees of the most-viewed people. Snapshots are built in the background whenever the data is
+reloaded and kept until the next reload, so serving one is a dictionary lookup no matter how big the tree is. Views
+are counted as trees are served, and once a tree without a snapshot makes it into the most viewed, its snapshot is
+added (at most once per `refresh_interval`), so the most-viewed trees don't have to wait for a reload. They can also
+be saved to disk, so a restarted server doesn't have to build them again before the data changes.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from tree_builder import Tree, treeID
+
+SNAPSHOT_FILE = 'tree_snapshots.json'
+
+
+"""
+TreeSnapshots:	the snapshot trees, keyed by tree id, plus the view counts used to pick whose trees get snapshots.
+
+----Variables----
+directory:			folder the snapshots (and view counts) are saved to, or None to keep them in memory only
+top_n:				number of most-viewed trees to keep snapshots of, besides the default tree
+refresh_interval:	fewest seconds between refreshes started by views (see `recordView`)
+"""
+class TreeSnapshots:
+
+	def __init__(self, directory=None, top_n=20, refresh_interval=60):
+		self._lock = threading.Lock()
+		self._trees = {}				# tree id -> Tree
+		self._generation = 0			# bumped by every refresh, so an older refresh finishing late is dropped
+		self._running = 0				# refreshes still building
+		self._covered = set()			# view keys the latest refresh was asked to snapshot
+		self._last_start = None			# time the latest refresh started
+		self.views = Counter()			# view key of a tree (see `recordView`) -> number of views
+		self.version = None				# version of the data the snapshots were built from
+		self.directory = directory
+		self.top_n = top_n
+		self.refresh_interval = refresh_interval
+		self.builds = 0					# number of snapshot trees built (rather than loaded from disk)
+		self.view_refreshes = 0			# number of refreshes due to views
+		self.last_refresh_ms = None
+		self._loadViews()
+
+	def __len__(self):
+		return len(self._trees)
+
+	"""
+	get:	returns the snapshot tree with id `tree_id`, or None if there isn't one
+	"""
+	def get(self, tree_id):
+		return self._trees.get(tree_id)
+
+	"""
+	recordView:	counts a view of the tree with view key `key`: a string that says which tree it is and stays the same
+				across reloads. Returns True if the snapshots should be refreshed now, because the tree made it into
+				the `top_n` most viewed without having a snapshot, no refresh is building, and the last one started at
+				least `refresh_interval` seconds ago.
+	"""
+	def recordView(self, key):
+		with self._lock:
+			self.views[key] += 1
+			if key in self._covered or self._running:
+				return False
+			if self._last_start is not None and time.monotonic() - self._last_start < self.refresh_interval:
+				return False
+			if key not in [top for top, count in self.views.most_common(self.top_n)]:
+				return False
+			self.view_refreshes += 1
+			return True
+
+	"""
+	topViewed:	returns the view keys of the trees viewed most, most-viewed first
+	"""
+	def topViewed(self, n):
+		with self._lock:
+			return [name for name, count in self.views.most_common(n)]
+
+	"""
+	refresh:	replaces the snapshots with trees for `specs`, built from the data with the given `version`. If the
+				snapshots saved on disk are from the same version they're loaded instead of built. Until the new
+				snapshots are ready none are served, so trees from the old data never outlive a reload.
+
+	----Variables----
+	specs:		specs of the trees to snapshot (see `buildTree` in server.py)
+	build:		function building the tree for a spec
+	version:	version of the data being snapshotted, e.g. the ingest fingerprint of `tbl_data`
+	tree_ids:	function returning the tree id of a spec
+	background:	build the snapshots on a background thread rather than before returning
+	views:		the view keys (see `recordView`) of the trees in `specs`
+	"""
+	def refresh(self, specs, build, version, tree_ids=treeID, background=True, views=()):
+		with self._lock:
+			self._generation += 1
+			generation = self._generation
+			self._running += 1
+			self._covered = set(views)
+			self._last_start = time.monotonic()
+			if version != self.version:
+				self._trees = {}
+			current = dict(self._trees)		# snapshots of the same data are kept rather than built again
+
+		def run():
+			start = time.perf_counter()
+			try:
+				saved = self._loadTrees(version) or {}
+				trees = {}
+				for spec in specs:
+					tree_id = tree_ids(spec)
+					tree = current.get(tree_id) or saved.get(tree_id)
+					if tree is None:
+						tree = build(spec)
+						tree.spec = spec
+						self.builds += 1
+					trees[tree_id] = tree
+
+				with self._lock:
+					if generation != self._generation:
+						return
+					self._trees = trees
+					self.version = version
+					self.last_refresh_ms = round((time.perf_counter() - start) * 1000, 1)
+			finally:
+				with self._lock:
+					self._running -= 1
+			self._save()
+			print(f'{len(trees)} tree snapshots ready in {self.last_refresh_ms} ms')
+
+		if background:
+			threading.Thread(target=run, name='tree-snapshots', daemon=True).start()
+		else:
+			run()
+
+	"""
+	stats:	returns the snapshots' counters as a dictionary
+	"""
+	def stats(self):
+		with self._lock:
+			return {
+				'size':				len(self._trees),
+				'top_n':			self.top_n,
+				'version':			self.version,
+				'builds':			self.builds,
+				'view_refreshes':	self.view_refreshes,
+				'last_refresh_ms':	self.last_refresh_ms,
+				'tracked_views':	len(self.views),
+			}
+
+	def _path(self):
+		return os.path.join(self.directory, SNAPSHOT_FILE) if self.directory else None
+
+	def _readFile(self):
+		path = self._path()
+		if not path or not os.path.exists(path):
+			return None
+		try:
+			with open(path) as fp:
+				return json.load(fp)
+		except (OSError, ValueError) as e:
+			print(f'Could not read tree snapshots from {path}: {e}')
+			return None
+
+	def _loadViews(self):
+		data = self._readFile()
+		if data:
+			self.views.update(data.get('views', {}))
+
+	def _loadTrees(self, version):
+		data = self._readFile() if version is not None else None
+		if not data or data.get('version') != version:
+			return None
+		trees = {}
+		for tree_id, saved in data.get('trees', {}).items():
+			tree = Tree(group_max=saved['group_max'], node_limit=saved['node_limit'], result_size=saved['result_size'])
+			tree.nodes = dict(saved['nodes'])
+			tree.links = [tuple(link) for link in saved['links']]
+			tree.truncated = saved['truncated']
+			tree.node_num_flag = saved['node_num_flag']
+			tree.spec = saved['spec']
+			trees[tree_id] = tree
+		return trees
+
+	def _save(self):
+		path = self._path()
+		if not path:
+			return
+		with self._lock:
+			trees = dict(self._trees)
+			views = dict(self.views.most_common(self.top_n * 10))
+		data = {
+			'version':	self.version,
+			'views':	views,
+			'trees':	{tree_id: {
+				'spec':				tree.spec,
+				'group_max':		tree.group_max,
+				'node_limit':		tree.node_limit,
+				'result_size':		tree.result_size,
+				'nodes':			list(tree.nodes.items()),
+				'links':			tree.links,
+				'truncated':		tree.truncated,
+				'node_num_flag':	tree.node_num_flag,
+			} for tree_id, tree in trees.items()},
+		}
+		try:
+			os.makedirs(self.directory, exist_ok=True)
+			with open(path + '.tmp', 'w') as fp:
+				json.dump(data, fp)
+			os.replace(path + '.tmp', path)
+		except OSError as e:
+			print(f'Could not save tree snapshots to {path}: {e}')
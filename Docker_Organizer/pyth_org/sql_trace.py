@@ -0,0 +1,177 @@
+"""
+Opt-in tracer for the SQL a request runs. Every statement is recorded with its timing, the rows it returned and the
+functions that ran it; at the end of the request the trace is checked for slow queries and for N+1 patterns (the same
+statement shape run over and over, e.g. once per search result). Recent traces are kept for `/admin/traces`, which can
+also dump them in the folded-stack format that flamegraph tools read.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+SLOW_QUERY_SECONDS	= 0.1		# queries taking longer than this are flagged as slow
+N_PLUS_ONE_MIN		= 5			# a statement shape run this many times in one request is flagged as N+1
+TRACES_KEPT			= 200		# number of recent request traces kept
+STACK_DEPTH			= 8			# most functions recorded per query
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.join(_APP_DIR, 'db_pool.py'), os.path.abspath(__file__)}
+
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTS = re.compile(r'\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+"""
+shape:	returns the shape of a statement: its text with literals and argument lists replaced by `?`, so queries that
+		only differ in the values they look up count as the same statement
+"""
+def shape(statement):
+	text = _STRINGS.sub('?', str(statement))
+	text = _NUMBERS.sub('?', text)
+	text = _LISTS.sub('(?)', text)
+	return _SPACES.sub(' ', text).strip()
+
+
+"""
+callers:	returns the names of the app's functions that led to the current query, outermost first
+"""
+def callers():
+	out = []
+	frame = sys._getframe(1)
+	while frame is not None and len(out) < STACK_DEPTH:
+		filename = frame.f_code.co_filename
+		if filename in _SKIP_FILES:
+			out = []			# anything called from the cursor itself (e.g. the query hook) isn't a caller
+		elif filename.startswith(_APP_DIR):
+			out.append(frame.f_code.co_name)
+		frame = frame.f_back
+	return out[::-1]
+
+
+"""
+RequestTrace:	the queries run while serving one request
+
+----Variables----
+route:			the route being served
+method:			the request's HTTP method
+"""
+class RequestTrace:
+
+	def __init__(self, route, method):
+		self.route = route
+		self.method = method
+		self.started = time.time()
+		self._start = time.perf_counter()
+		self.seconds = None
+		self.queries = []			# (statement, seconds, rows, callers)
+
+	def add(self, statement, seconds, rows):
+		self.queries.append((str(statement), seconds, rows, callers()))
+
+	def finish(self):
+		self.seconds = time.perf_counter() - self._start
+
+	"""
+	slowQueries:	returns the queries that took longer than `SLOW_QUERY_SECONDS`
+	"""
+	def slowQueries(self):
+		return [q for q in self.queries if q[1] >= SLOW_QUERY_SECONDS]
+
+	"""
+	nPlusOne:	returns {statement shape: (times run, total seconds, callers of the first run)} for every statement shape
+				run at least `N_PLUS_ONE_MIN` times
+	"""
+	def nPlusOne(self):
+		shapes = {}
+		for statement, seconds, rows, stack in self.queries:
+			key = shape(statement)
+			entry = shapes.get(key)
+			if entry is None:
+				shapes[key] = [1, seconds, stack]
+			else:
+				entry[0] += 1
+				entry[1] += seconds
+		return {key: tuple(entry) for key, entry in shapes.items() if entry[0] >= N_PLUS_ONE_MIN}
+
+	"""
+	report:	returns the trace as a dictionary
+	"""
+	def report(self):
+		sql_seconds = sum(q[1] for q in self.queries)
+		return {
+			'route':		self.route,
+			'method':		self.method,
+			'started':		self.started,
+			'seconds':		round(self.seconds or 0, 6),
+			'sql_seconds':	round(sql_seconds, 6),
+			'query_count':	len(self.queries),
+			'queries':		[{'statement': statement, 'seconds': round(seconds, 6), 'rows': rows, 'callers': stack}
+								for statement, seconds, rows, stack in self.queries],
+			'slow':			[{'statement': q[0], 'seconds': round(q[1], 6)} for q in self.slowQueries()],
+			'n_plus_one':	[{'shape': key, 'count': count, 'seconds': round(seconds, 6), 'callers': stack}
+								for key, (count, seconds, stack) in self.nPlusOne().items()],
+		}
+
+	"""
+	folded:	returns the trace in folded-stack format (`frame;frame;frame microseconds` per line): SQL time under
+			the functions that ran it, and the rest of the request's time under the route itself
+	"""
+	def folded(self):
+		lines = {}
+		sql_us = 0
+		for statement, seconds, rows, stack in self.queries:
+			us = int(seconds * 1e6)
+			sql_us += us
+			key = ';'.join([self.route] + stack + ['SQL ' + shape(statement).replace(';', ',')])
+			lines[key] = lines.get(key, 0) + us
+		other_us = int((self.seconds or 0) * 1e6) - sql_us
+		if other_us > 0:
+			lines[self.route] = lines.get(self.route, 0) + other_us
+		return [f'{key} {us}' for key, us in lines.items()]
+
+
+"""
+Tracer:		keeps the most recent request traces and logs the ones with slow queries or N+1 patterns
+
+----Variables----
+enabled:	trace every request (otherwise only requests asking for it, see `/admin/traces` in server.py)
+kept:		number of recent traces kept
+"""
+class Tracer:
+
+	def __init__(self, enabled=False, kept=TRACES_KEPT):
+		self.enabled = enabled
+		self._lock = threading.Lock()
+		self._traces = deque(maxlen=kept)
+
+	def start(self, route, method):
+		return RequestTrace(route, method)
+
+	"""
+	finish:	stores a finished trace and prints a warning for any slow queries or N+1 patterns in it
+	"""
+	def finish(self, trace):
+		trace.finish()
+		with self._lock:
+			self._traces.append(trace)
+
+		for statement, seconds, rows, stack in trace.slowQueries():
+			print(f'Slow query ({seconds * 1000:.0f} ms, {rows} rows) in {trace.route} via {" > ".join(stack)}: {statement[:200]}')
+		for key, (count, seconds, stack) in trace.nPlusOne().items():
+			print(f'N+1 in {trace.route}: {count} x "{key[:200]}" ({seconds * 1000:.0f} ms) via {" > ".join(stack)}')
+
+	"""
+	traces:	returns the kept traces, most recent last
+	"""
+	def traces(self):
+		with self._lock:
+			return list(self._traces)
+
+	def clear(self):
+		with self._lock:
+			self._traces.clear()
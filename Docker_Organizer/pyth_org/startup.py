@@ -0,0 +1,93 @@
+"""
+Background startup for the server. Loading the .csv into the DB and building the in-memory indexes takes seconds on a
+real directory, and the DB may not even be up yet when the server starts (e.g. both containers starting together).
+`Startup` runs those steps in order on a background thread so the server can bind its port and answer right away,
+retries a step that fails, and keeps track of how far it got for the readiness endpoint (`/ready`).
+"""
+
+import threading
+import time
+
+
+"""
+Startup:	runs the startup steps in order on a background thread, once.
+
+----Variables----
+steps:		list of (name, function) pairs. Each function is called with no arguments and must be safe to call again
+			if it failed part way through.
+retry:		seconds to wait before running a failed step again
+"""
+class Startup:
+
+	def __init__(self, steps, retry=5.0):
+		self.steps = list(steps)
+		self.retry = retry
+		self._lock = threading.Lock()
+		self._done = threading.Event()
+		self._thread = None
+		self._started_at = None
+		self._finished_at = None
+		self._step = None			# name of the step running now
+		self._timings = {}			# step name -> seconds it took, for the steps finished
+		self._attempts = 0			# failed attempts so far
+		self._error = None			# last error, as text
+
+	@property
+	def ready(self):
+		return self._done.is_set()
+
+	"""
+	start:		starts running the steps on a background thread. Does nothing if they were already started.
+	"""
+	def start(self):
+		with self._lock:
+			if self._thread is not None:
+				return
+			self._started_at = time.perf_counter()
+			self._thread = threading.Thread(target=self._run, name='startup', daemon=True)
+			self._thread.start()
+
+	"""
+	wait:		blocks until every step is done or `timeout` seconds passed; returns whether they are done
+	"""
+	def wait(self, timeout=None):
+		return self._done.wait(timeout)
+
+	def _run(self):
+		for name, fn in self.steps:
+			self._step = name
+			while True:
+				start = time.perf_counter()
+				try:
+					fn()
+					break
+				except Exception as e:
+					self._attempts += 1
+					self._error = f'{name}: {e!r}'
+					print(f'Startup step {name!r} failed ({e!r}); retrying in {self.retry}s')
+					time.sleep(self.retry)
+			self._timings[name] = round(time.perf_counter() - start, 3)
+		self._step = None
+		self._finished_at = time.perf_counter()
+		self._done.set()
+		print(f'Server ready in {self._finished_at - self._started_at:.2f}s ({", ".join(f"{n} {s}s" for n, s in self._timings.items())})')
+
+	"""
+	status:		returns where startup is at: whether it's done, the step running, the steps finished and how long each
+				took, failed attempts and the last error
+	"""
+	def status(self):
+		if self._started_at is None:
+			seconds = 0.0
+		else:
+			seconds = (self._finished_at or time.perf_counter()) - self._started_at
+		return {
+			'ready':		self.ready,
+			'step':			self._step,
+			'done':			len(self._timings),
+			'steps':		len(self.steps),
+			'timings':		dict(self._timings),
+			'seconds':		round(seconds, 3),
+			'attempts':		self._attempts,
+			'error':		self._error,
+		}
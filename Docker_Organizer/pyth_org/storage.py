@@ -0,0 +1,263 @@
+"""
+Storage backends for the organizer's tables (`tbl_data` and `cust_data`). The app runs its queries on DB-API
+connections handed out by the pool (db_pool.py); the backend opens those connections, creates the tables if needed,
+and owns the statements that differ between DBs, such as the custom data writes.
+
+	MySQLStorage	the `mysql` container (docker-compose.yml), whose data volume already has the tables
+	SQLiteStorage	embedded SQLite, in a file or in memory, so the app starts without a DB server. The tables are
+					created on first use with indexes on the lookup columns
+
+`server.py` picks one with the `STORAGE` setting.
+"""
+
+import fcntl
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# the app's tables, as created in the MySQL DB
+TABLES = {
+	'tbl_data':		'uniqueID varchar(64) primary key, userName varchar(64), reportsTo varchar(64), title varchar(64), location varchar(64), orgName varchar(64)',
+	'cust_data':	'user varchar(64), position varchar(64), email varchar(64), skills varchar(256), team_dscrp varchar(256), distros varchar(256), share_pnts varchar(256)',
+}
+CUST_COLUMNS = ["user", "position", "email", "skills", "team_dscrp", "distros", "share_pnts"]
+
+
+"""
+Storage:	the statements every backend shares. Table names may be DB-qualified (e.g. default.cust_data). Backends must
+			implement `connect` and `lock`; one that doesn't can't be constructed.
+"""
+class Storage(ABC):
+	name = None
+
+	"""
+	connect:	opens a new DB-API connection
+	"""
+	@abstractmethod
+	def connect(self):
+		pass
+
+	"""
+	setup:		creates the tables (and their indexes) if they don't exist yet
+	"""
+	def setup(self, conn):
+		pass
+
+	"""
+	setCustField:	sets one custom data column of `user`. Doesn't commit.
+	"""
+	def setCustField(self, cursor, table, user, column, value):
+		self.setCustFields(cursor, table, column, [(user, value)])
+
+	"""
+	setCustFields:	sets one custom data column for several people at once; `values` is a list of (user, value). Doesn't
+					commit.
+	"""
+	def setCustFields(self, cursor, table, column, values):
+		if column not in CUST_COLUMNS[1:]:
+			raise ValueError(f'not a custom data column: {column}')
+		cursor.executemany(f'UPDATE {table} SET {column}=%s where user=%s', [(value, user) for user, value in values])
+
+	"""
+	addCust:	adds an empty custom data entry for `user`. Doesn't commit.
+	"""
+	def addCust(self, cursor, table, user):
+		self.addCusts(cursor, table, [user])
+
+	"""
+	addCusts:	adds an empty custom data entry for each of `users`. Doesn't commit.
+	"""
+	def addCusts(self, cursor, table, users):
+		empty = ("",) * (len(CUST_COLUMNS) - 1)
+		cursor.executemany(f'INSERT into {table} values({", ".join(["%s"] * len(CUST_COLUMNS))})', [(user,) + empty for user in users])
+
+	"""
+	lock:		context manager holding the lock called `name` for every process using the DB, e.g. so only one worker
+				loads the .csv at a time. Raises TimeoutError if it isn't free within `timeout` seconds.
+	"""
+	@abstractmethod
+	def lock(self, conn, name, timeout):
+		pass
+
+	def stats(self):
+		return {'backend': self.name}
+
+
+"""
+MySQLStorage:	tables in MySQL, reached through `connect` (e.g. flaskext.mysql's `MySQL.connect`)
+"""
+class MySQLStorage(Storage):
+	name = 'mysql'
+
+	def __init__(self, connect):
+		self._connect = connect
+
+	def connect(self):
+		return self._connect()
+
+	# a named lock of the MySQL server, held by `conn`'s session (so it goes away if the connection drops)
+	@contextmanager
+	def lock(self, conn, name, timeout):
+		cursor = conn.cursor()
+		try:
+			cursor.execute('SELECT GET_LOCK(%s, %s)', (name, timeout))
+			if cursor.fetchone()[0] != 1:
+				raise TimeoutError(f'lock {name} still held after {timeout}s')
+			try:
+				yield
+			finally:
+				cursor.execute('SELECT RELEASE_LOCK(%s)', (name,))
+				cursor.fetchone()
+		finally:
+			cursor.close()
+
+
+"""
+SQLiteStorage:	tables in an embedded SQLite DB. Every connection sees the same data, including with an in-memory DB
+				(which lives as long as the `SQLiteStorage`). MySQL-only statements are rewritten on the way in; see
+				`SQLiteConnection`.
+
+----Variables----
+path:			the DB file, or ':memory:'
+"""
+class SQLiteStorage(Storage):
+	name = 'sqlite'
+
+	def __init__(self, path=':memory:'):
+		self.path = path
+		if path == ':memory:':
+			self._uri = f'file:organizer-{id(self)}?mode=memory&cache=shared'
+		else:
+			self._uri = 'file:' + path
+		self._keep = self.connect()		# an in-memory DB is dropped when its last connection closes
+		self._locks = {}
+		self._locks_lock = threading.Lock()
+
+	def connect(self):
+		conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False, timeout=30)
+		if self.path != ':memory:':
+			conn.execute('PRAGMA journal_mode=WAL')		# readers don't wait for writers
+		return SQLiteConnection(conn)
+
+	def setup(self, conn):
+		cursor = conn.cursor()
+		for table, columns in TABLES.items():
+			cursor.execute(f'CREATE TABLE IF NOT EXISTS {table} ({columns})')
+		cursor.execute('CREATE INDEX IF NOT EXISTS tbl_data_user ON tbl_data (userName)')
+		cursor.execute('CREATE INDEX IF NOT EXISTS tbl_data_boss ON tbl_data (reportsTo)')
+		cursor.execute('CREATE INDEX IF NOT EXISTS cust_data_user ON cust_data (user)')
+		# DB files from before search moved to the in-memory index have a full-text index that every write kept up
+		for trigger in ('cust_text_insert', 'cust_text_delete', 'cust_text_update'):
+			cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+		cursor.execute('DROP TABLE IF EXISTS cust_text')
+		conn.commit()
+
+	# SQLite has no named locks: an in-memory DB only lives in this process, so a thread lock will do; a DB file can be
+	# shared by several processes, so a lock file next to it is locked instead
+	@contextmanager
+	def lock(self, conn, name, timeout):
+		if self.path == ':memory:':
+			with self._locks_lock:
+				lock = self._locks.setdefault(name, threading.Lock())
+			if not lock.acquire(timeout=timeout):
+				raise TimeoutError(f'lock {name} still held after {timeout}s')
+			try:
+				yield
+			finally:
+				lock.release()
+			return
+
+		with open(f'{self.path}.{name}.lock', 'w') as fp:
+			deadline = time.monotonic() + timeout
+			while True:
+				try:
+					fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+					break
+				except BlockingIOError:
+					if time.monotonic() > deadline:
+						raise TimeoutError(f'lock {name} still held after {timeout}s')
+					time.sleep(0.1)
+			try:
+				yield
+			finally:
+				fcntl.flock(fp, fcntl.LOCK_UN)
+
+	def stats(self):
+		return {'backend': self.name, 'path': self.path}
+
+
+_DB_PREFIX = re.compile(r'\bdefault\.')
+_LIKE_TABLE = re.compile(r'CREATE TABLE IF NOT EXISTS (\w+) LIKE (\w+)', re.IGNORECASE)
+_TRUNCATE = re.compile(r'TRUNCATE TABLE (\w+)', re.IGNORECASE)
+
+
+"""
+sqliteStatement:	returns a statement written for MySQL rewritten for SQLite: no `default.` DB prefix, `?` placeholders
+					(only if the statement has arguments, as pymysql only formats those), `DELETE FROM` for
+					`TRUNCATE TABLE` and `CREATE TABLE ... AS SELECT` for `CREATE TABLE ... LIKE`
+"""
+def sqliteStatement(statement, has_args):
+	statement = _DB_PREFIX.sub('', statement)
+	if has_args:
+		statement = statement.replace('%s', '?')
+	statement = _TRUNCATE.sub(r'DELETE FROM \1', statement)
+	return _LIKE_TABLE.sub(r'CREATE TABLE IF NOT EXISTS \1 AS SELECT * FROM \2 WHERE 0', statement)
+
+
+"""
+SQLiteConnection:	a SQLite connection that takes the statements the app writes for MySQL (see `sqliteStatement`) and
+					has the pymysql connection methods the pool uses
+"""
+class SQLiteConnection:
+
+	def __init__(self, conn):
+		self._conn = conn
+
+	def cursor(self):
+		return SQLiteCursor(self._conn.cursor())
+
+	def commit(self):
+		self._conn.commit()
+
+	def rollback(self):
+		self._conn.rollback()
+
+	def ping(self, reconnect=False):
+		self._conn.execute('SELECT 1')
+
+	def close(self):
+		self._conn.close()
+
+
+class SQLiteCursor:
+
+	def __init__(self, cursor):
+		self._cursor = cursor
+
+	def execute(self, statement, args=None):
+		self._cursor.execute(sqliteStatement(statement, args is not None), args if args is not None else ())
+		return self._cursor.rowcount
+
+	def executemany(self, statement, args):
+		self._cursor.executemany(sqliteStatement(statement, True), args)
+		return self._cursor.rowcount
+
+	def fetchone(self):
+		return self._cursor.fetchone()
+
+	def fetchall(self):
+		return self._cursor.fetchall()
+
+	def close(self):
+		self._cursor.close()
+
+	@property
+	def rowcount(self):
+		return self._cursor.rowcount
+
+	@property
+	def description(self):
+		return self._cursor.description
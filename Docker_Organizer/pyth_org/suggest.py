@@ -0,0 +1,218 @@
+"""
+Type-ahead suggestions for the search bar. People, titles, orgs and skills are kept in sorted arrays of search keys
+(one array for the entries' full text and one for the later words in them), so all entries starting with a prefix
+sit next to each other and are found with a binary search. Results for recently typed prefixes are cached.
+
+The arrays are never changed once published: edits build new ones under the lock and swap them in, so `suggest`
+can search them without holding it.
+"""
+
+import threading
+from bisect import bisect_left, insort
+from cache import LRUCache
+from org_graph import COL_NAME, COL_TITLE, COL_ORG
+
+SUGGEST_LIMIT	= 10		# default number of suggestions returned
+SCAN_LIMIT		= 2000		# most entries looked at when ranking the suggestions for a short prefix
+CACHE_SIZE		= 5000		# number of prefixes whose suggestions are cached
+
+# order kinds are shown in when their entries are equally popular
+KIND_RANK = {'person': 0, 'title': 1, 'org': 2, 'skill': 3}
+
+# custom data columns suggested from, and the kind of entry they add
+CUST_KINDS = {'position': 'title', 'skills': 'skill'}
+
+
+"""
+custTexts:	returns the entry texts a custom data `value` of `column` holds (the skills are a comma separated list)
+"""
+def custTexts(column, value):
+	if column == 'skills':
+		texts = (value or "").split(",")
+	else:
+		texts = [value or ""]
+	return [text.strip() for text in texts if text.strip()]
+
+
+"""
+Suggester:	sorted prefix array of the suggestion entries, built from the rows of `tbl_data` and `cust_data`.
+
+----Variables----
+cache_size:	number of prefixes whose suggestions are cached
+"""
+class Suggester:
+
+	def __init__(self, cache_size=CACHE_SIZE):
+		self._lock = threading.Lock()
+		self._starts = []			# sorted list of (lowercase text, entry id)
+		self._words = []			# sorted list of (lowercase text from a later word on, entry id)
+		self._entries = []			# entry id -> [text, kind, count]
+		self._by_text = {}			# (kind, lowercase text) -> entry id
+		self._cust = {}				# (user, custom data column) -> ids of the entries the user's value counts toward
+		self.cache = LRUCache(max_size=cache_size)		# (prefix, limit) -> suggestions
+		self._generation = 0		# bumped whenever the entries change, so stale results aren't cached
+
+	def __len__(self):
+		return len(self._entries)
+
+	"""
+	load:	(re)builds the suggestions from the rows of both tables
+
+	----Variables----
+	tbl_rows:	rows of `tbl_data`
+	cust_rows:	rows of `cust_data`
+	"""
+	def load(self, tbl_rows, cust_rows):
+		entries = []
+		by_text = {}
+		cust = {}
+
+		def entryID(text, kind):
+			entry_id = by_text.get((kind, text.lower()))
+			if entry_id is None:
+				entry_id = by_text[(kind, text.lower())] = len(entries)
+				entries.append([text, kind, 0])
+			return entry_id
+
+		for row in tbl_rows:
+			for text, kind in ((row[COL_NAME], 'person'), (row[COL_TITLE], 'title'), (row[COL_ORG], 'org')):
+				text = (text or "").strip()
+				if text:
+					entries[entryID(text, kind)][2] += 1
+		# every user counts once toward each value in their custom data
+		for row in cust_rows:
+			for column, value in (('position', row[1]), ('skills', row[3])):
+				ids = cust.setdefault((row[0], column), set())
+				ids.update(entryID(text, CUST_KINDS[column]) for text in custTexts(column, value))
+		for ids in cust.values():
+			for entry_id in ids:
+				entries[entry_id][2] += 1
+
+		starts = []
+		words = []
+		for entry_id, entry in enumerate(entries):
+			starts.append((entry[0].lower(), entry_id))
+			for key in self._wordKeys(entry[0]):
+				words.append((key, entry_id))
+		starts.sort()
+		words.sort()
+
+		with self._lock:
+			self._starts = starts
+			self._words = words
+			self._entries = entries
+			self._by_text = by_text
+			self._cust = cust
+			self._generation += 1
+			self.cache.clear()
+
+	"""
+	_wordKeys:	the keys an entry can be found by besides its full text: the text starting at each later word, so
+				"Network Engineering" is suggested for "eng" as well as "net"
+	"""
+	def _wordKeys(self, text):
+		text = text.lower()
+		keys = []
+		for i in range(1, len(text)):
+			if text[i - 1] in " _-/,(" and text[i] not in " _-/,(":
+				keys.append(text[i:])
+		return keys
+
+	"""
+	setCustField:	updates the suggestions for an edit of `user`'s custom data without rebuilding them. The user stops
+					counting toward their old value and counts once toward the new one, however often it's saved.
+					Columns that aren't suggested from, and edits that change nothing, are ignored. Only the cached
+					prefixes of the entries whose counts changed are dropped.
+
+	----Variables----
+	user:			the person whose custom data changed
+	column:			the custom data column edited (e.g. 'position' or 'skills')
+	value:			its new value
+	"""
+	def setCustField(self, user, column, value):
+		kind = CUST_KINDS.get(column)
+		if kind is None:
+			return
+		texts = {text.lower(): text for text in custTexts(column, value)}
+		with self._lock:
+			old = self._cust.get((user, column), set())
+			ids = {self._by_text.get((kind, key)) for key in texts}
+			if ids == old:
+				return
+
+			# counts change by replacing or appending whole entries, which `suggest` sees either before or after; the
+			# sorted arrays are copied, changed and swapped in, and only when there's a new entry to put in them
+			entries = self._entries
+			new = [key for key in texts if (kind, key) not in self._by_text]
+			if new:
+				starts = list(self._starts)
+				words = list(self._words)
+				for key in new:
+					entry_id = self._by_text[(kind, key)] = len(entries)
+					entries.append([texts[key], kind, 0])
+					insort(starts, (key, entry_id))
+					for word in self._wordKeys(key):
+						insort(words, (word, entry_id))
+				ids = {self._by_text[(kind, key)] for key in texts}
+			for entry_id in old - ids:
+				entries[entry_id] = [entries[entry_id][0], kind, entries[entry_id][2] - 1]
+			for entry_id in ids - old:
+				entries[entry_id] = [entries[entry_id][0], kind, entries[entry_id][2] + 1]
+			self._cust[(user, column)] = ids
+			if new:
+				self._starts = starts
+				self._words = words
+			self._generation += 1
+
+			keys = []
+			for entry_id in old ^ ids:
+				text = entries[entry_id][0].lower()
+				keys.append(text)
+				keys.extend(self._wordKeys(text))
+			self.cache.invalidateWhere(lambda cached, out: any(key.startswith(cached[0]) for key in keys))
+
+	"""
+	suggest:	returns up to `limit` suggestions for `prefix` as a list of dictionaries with the suggested text, its
+				kind, and how many people it applies to. Entries starting with `prefix` come before entries with a
+				later word starting with it; more popular entries come first within each. Entries nobody has any more
+				(e.g. a skill everyone removed) aren't suggested.
+
+	----Variables----
+	prefix:		what the user has typed so far
+	limit:		the most suggestions returned
+	"""
+	def suggest(self, prefix, limit=SUGGEST_LIMIT):
+		prefix = " ".join((prefix or "").lower().split())
+		if not prefix:
+			return []
+
+		cache_key = (prefix, limit)
+		cached = self.cache.get(cache_key)
+		if cached is not None:
+			return cached
+
+		with self._lock:
+			starts = self._starts
+			words = self._words
+			entries = self._entries
+			generation = self._generation
+
+		ranked = []
+		for keys in (starts, words):
+			found = set()
+			i = bisect_left(keys, (prefix,))
+			while i < len(keys) and keys[i][0].startswith(prefix) and len(found) < SCAN_LIMIT:
+				if entries[keys[i][1]][2]:
+					found.add(keys[i][1])
+				i += 1
+			found.difference_update(ranked)
+			ranked.extend(sorted(found, key=lambda e: (-entries[e][2], KIND_RANK[entries[e][1]], entries[e][0])))
+			if len(ranked) >= limit:
+				break
+
+		out = [{'text': entries[e][0], 'kind': entries[e][1], 'count': entries[e][2]} for e in ranked[:limit]]
+
+		with self._lock:
+			if generation == self._generation:
+				self.cache.put(cache_key, out)
+		return out
@@ -0,0 +1,375 @@
+"""
+Builders for the trees rendered by the front-end. Each tree is built into its own `Tree` object instead of a shared
+module-level structure, so concurrent requests (and users) never see or clobber each other's trees. Finished trees
+are cached by server.py under an id derived from how the tree was built (see `treeID`), so the `/json` route can
+serve them back to whichever page asked for them.
+"""
+
+import hashlib
+import json
+from itertools import zip_longest
+
+from org_graph import nameKey, COL_ID, COL_NAME, COL_BOSS
+
+
+"""
+Tree:	the nodes and links of one tree, plus the counters used to limit its size. Nodes are kept in a dictionary of
+		node id --> group, which doubles as the registry used to check whether a node is already in the tree, and
+		links as (source, target, value) tuples. `toDict` turns them into the structure that gets sent to the
+		front-end as a JSON object, once the tree is finished. Nodes whose reports didn't all fit in the tree carry
+		a "more" count of the reports left out.
+
+----Variables----
+group_max:		limits the degrees of separation used in creating the visual tree
+node_limit:		limits the number of nodes in the tree
+result_size:	limits the number of children looked at per node
+"""
+class Tree:
+	__slots__ = ('nodes', 'links', 'truncated', 'node_num_flag', 'group_max', 'node_limit', 'result_size', 'spec', 'etag')
+
+	def __init__(self, group_max, node_limit, result_size):
+		self.nodes = {}					# node id -> group
+		self.links = []					# (source, target, value)
+		self.truncated = {}				# node id -> number of its reports left out of the tree
+		self.node_num_flag = False		# set when the tree got truncated; renders the "too many nodes!" message
+		self.group_max = group_max
+		self.node_limit = node_limit
+		self.result_size = result_size
+		self.spec = None				# how the tree was built (see `buildTree` in server.py)
+		self.etag = None				# set once the finished tree is first sent (see `treeETag` in json_stream.py)
+
+	def __len__(self):
+		return len(self.nodes)
+
+	def hasNode(self, node_id):
+		return node_id in self.nodes
+
+	"""
+	addNode:	adds a node to the tree unless it's already there. Returns True if the node was added.
+	"""
+	def addNode(self, node_id, group):
+		if node_id in self.nodes:
+			return False
+		self.nodes[node_id] = group
+		return True
+
+	def addLink(self, source, target, value):
+		self.links.append((source, target, value))
+
+	"""
+	nodeRecord:	returns the record the front-end gets for a node
+	"""
+	def nodeRecord(self, node_id, group):
+		more = self.truncated.get(node_id)
+		if more:
+			return {"id": node_id, "group": group, "more": more}
+		return {"id": node_id, "group": group}
+
+	def toDict(self):
+		return {
+			'nodes': [self.nodeRecord(node_id, group) for node_id, group in self.nodes.items()],
+			'links': [{"source": source, "target": target, "value": value} for source, target, value in self.links],
+		}
+
+
+"""
+graphLevel:		Returns a level fetcher (see `createTree`) that answers from the in-memory org graph.
+
+----Variables----
+graph:			the `OrgGraph` to read the hierarchy from
+"""
+def graphLevel(graph):
+	def fetch(parents):
+		return [graph.children(nameKey(row[COL_NAME]) if row else name) for name, row in parents]
+	return fetch
+
+
+"""
+sqlLevel:		Returns a level fetcher (see `createTree`) that looks a whole level of the hierarchy up in one query.
+				Reports are matched on the exact uniqueID of their boss (`reportsTo IN (...)`), which unlike the old
+				`reportsTo like '%<name>%'` can use an index on reportsTo.
+
+----Variables----
+cursor:			a cursor on the DB
+table:			the hierarchy table, e.g. default.tbl_data
+"""
+def sqlLevel(cursor, table):
+	def fetch(parents):
+		ids = list({row[COL_ID] for name, row in parents if row})
+		if not ids:
+			return [[] for parent in parents]
+		cursor.execute(f'SELECT * from {table} where reportsTo in ({", ".join(["%s"] * len(ids))})', ids)
+		by_boss = {}
+		for item in cursor.fetchall():
+			by_boss.setdefault(item[COL_BOSS], []).append(item)
+		return [by_boss.get(row[COL_ID], []) if row else [] for name, row in parents]
+	return fetch
+
+
+"""
+createTree:		Walks the reportsTo hierarchy down from `parents` one level at a time in order to add to the tree. Each
+				level's reports are fetched in one go, and when the tree's node limit is reached the remaining room
+				is shared out evenly: every node on a level gets its first report added before any node gets its
+				second, and so on. Reports that don't fit are counted in `tree.truncated` under their boss.
+
+----Variables----
+tree:			the `Tree` being built
+fetch:			the level fetcher: takes a list of (node id, row) pairs and returns the rows reporting to each of them
+parents:		(node id, row) pairs of the nodes to start from, already in the tree
+group:			the degree of separation from the root of the tree of the first level added
+"""
+def createTree(tree, fetch, parents, group):
+	frontier = parents
+	while frontier:
+		level = fetch(frontier)
+		next_frontier = []
+
+		# take one report from each boss in turn, so no branch uses up the node limit on its own
+		branches = [[(name, item) for item in items[:tree.result_size]] for (name, row), items in zip(frontier, level)]
+		for batch in zip_longest(*branches):
+			for entry in batch:
+				if entry is None:
+					continue
+				boss, item = entry
+
+				# format the string to get just the name of the individual
+				item_name = nameKey(item[COL_NAME])
+
+				# if the individual isn't listed as a node already, add them (if there's room left)
+				if not tree.hasNode(item_name):
+					if len(tree) >= tree.node_limit:
+						tree.truncated[boss] = tree.truncated.get(boss, 0) + 1
+						tree.node_num_flag = True
+						continue
+					tree.addNode(item_name, group)
+					next_frontier.append((item_name, item))
+
+				# add the new link to the tree
+				tree.addLink(item_name, boss, 1 / group)
+
+		# stop at the degrees of separation limit
+		if group >= tree.group_max:
+			break
+		group += 1
+		frontier = next_frontier
+
+
+"""
+addBoss:		Adds a boss to the tree.
+
+----Variables----
+tree:			the `Tree` being built
+full_term:		The full name of the person that the boss will be attached to in the tree
+name:			the boss' entry from the reportsTo column: <id>_<first name>_<last name>
+isSkill:		flags whether the function is being used for a skill (searches for name in a different index)
+"""
+def addBoss(tree, full_term, name, isSkill=False):
+	if isSkill:
+		reg_name = name
+		boss_name = 'Reports To: ' + name
+	else:
+		temp = name.split("_")
+		reg_name = temp[1] + '_' + temp[2]
+		boss_name = 'Reports To: ' + temp[1] + "_" + temp[2]
+
+	# check if the boss (as a person) is already in the tree
+	add_alt_link = tree.hasNode(reg_name)
+
+	tree.addNode(boss_name, 0)				# add the boss as a node, unless they're already in the list of nodes
+
+	if add_alt_link:
+		tree.addLink(full_term, reg_name, 1)
+	else:
+		tree.addLink(full_term, boss_name, 1)
+
+
+"""
+addUser:	Creates a new tree to be rendered by the front-end. Adds the searched-for person (and their boss, if applicable)
+				to the base of the tree and then finds and adds all related people under the searched-for person, level by level.
+				The tree render is limited by the tree's `group_max`, which limits the degrees of separation from the
+				searched-for person that is displayed by the tree.
+
+----Variables----
+tree:			the `Tree` being built
+graph:			the `OrgGraph` to read the hierarchy from
+result:			the search result of the query from the database
+full_term:		the search query (a person's name) that spit out `result` from the database. Formatted <first name>_<last name>
+is_mult_list:	flag used to override the degrees of separation from a displayed node; used to display one layer of names from a search returning multiple results
+fetch:			the level fetcher to read the hierarchy with (see `createTree`); defaults to reading `graph`
+"""
+def addUser(tree, graph, result, full_term, is_mult_list=False, fetch=None):
+	group = 0
+	tree.node_num_flag = False
+
+	# get the boss' name if possible
+	boss_lowercase = result[2].lower() if result[2] != None else ""
+
+	if (boss_lowercase.islower()):			# check that the name has valid characters
+		addBoss(tree, full_term, result[2])	# Add boss to the tree
+		group += 1
+
+	tree.addNode(full_term, group)			# add the name as a node to the list of nodes
+	group += 1
+	createTree(tree, fetch or graphLevel(graph), [(full_term, result)], group)	# gather all of the nodes and links
+
+
+"""
+nodePerson:		Returns (name, row) for the person behind a node id as the front-end has it: a person (<first name>_<last
+				name>) or a "Reports To: " node. The boss nodes of trees built from position and skills searches carry
+				the boss' uniqueID instead of their name (see `addBoss`), so both are looked up. The row is None if
+				nobody matches.
+
+----Variables----
+graph:			the `OrgGraph` to read the hierarchy from
+node_id:		the id of the node
+"""
+def nodePerson(graph, node_id):
+	key = node_id.split(":")[-1].strip()
+	row = graph.byName(key) or graph.byID(key)
+	return (nameKey(row[COL_NAME]) if row else key, row)
+
+
+"""
+expandNode:		Adds the people under an already-rendered node to `tree`, down to the tree's `group_max` levels, so the
+				front-end can grow the tree it has instead of fetching a new one. The node itself is added as the root
+				(group 0) so the new links have something to point to.
+
+----Variables----
+tree:			the `Tree` being built
+graph:			the `OrgGraph` to read the hierarchy from
+node_id:		the id of the node being expanded: a person (<first name>_<last name>) or a "Reports To: " node
+"""
+def expandNode(tree, graph, node_id):
+	tree.node_num_flag = False
+	name, row = nodePerson(graph, node_id)
+	tree.addNode(node_id, 0)
+	createTree(tree, graphLevel(graph), [(node_id, row)], 1)
+
+
+"""
+addPath:		Adds the path between two people through their lowest common manager to the tree. The manager is the
+				root (group 0) and everyone else is grouped by how far below the manager they are.
+
+----Variables----
+tree:			the `Tree` being built
+up:				names from the first person up to the manager (see `Hierarchy.path`)
+down:			names from the manager down to the second person
+"""
+def addPath(tree, up, down):
+	tree.addNode(down[0], 0)
+	for chain in (up[::-1], down):
+		for group, (boss, name) in enumerate(zip(chain, chain[1:]), 1):
+			tree.addNode(name, group)
+			tree.addLink(name, boss, 1 / group)
+
+
+"""
+addShared:		Connects two people through something they have in common (an org, a skill) instead of through their
+				managers: both are linked to a node for the shared thing.
+
+----Variables----
+tree:			the `Tree` being built
+a, b:			the two people's names, formatted <first name>_<last name>
+shared_node:	id of the node for the shared thing, e.g. "Skill: Python"
+"""
+def addShared(tree, a, b, shared_node):
+	tree.addNode(shared_node, 0)
+	for name in (a, b):
+		tree.addNode(name, 1)
+		tree.addLink(name, shared_node, 1)
+
+
+"""
+graphLookup:	Returns a people lookup (see `peopleOnNode`) that answers from the in-memory org graph.
+
+----Variables----
+graph:			the `OrgGraph` to read the hierarchy from
+"""
+def graphLookup(graph):
+	def lookup(names):
+		out = {}
+		for name in names:
+			row = graph.byName(name)
+			if row is not None:
+				out[name] = row
+		return out
+	return lookup
+
+
+"""
+sqlLookup:		Returns a people lookup (see `peopleOnNode`) that finds everyone in one query, matching the exact
+				userName of each person (`userName IN (...)`) instead of running a `userName like` query per person.
+
+----Variables----
+cursor:			a cursor on the DB
+table:			the hierarchy table, e.g. default.tbl_data
+"""
+def sqlLookup(cursor, table):
+	def lookup(names):
+		names = list(dict.fromkeys(names))
+		if not names:
+			return {}
+		cursor.execute(f'SELECT * from {table} where userName in ({", ".join(["%s"] * len(names))})', [name.replace("_", " ") for name in names])
+		out = {}
+		for row in cursor.fetchall():
+			out.setdefault(nameKey(row[COL_NAME]), row)
+		return out
+	return lookup
+
+
+"""
+peopleOnNode():	creates a node with multiple individuals from the DB attached to it. Everyone's boss is looked up in one
+				go, and people are added grouped by boss, so each boss' node gets all of its reports at once.
+
+----Variables----
+tree:			the `Tree` being built
+graph:			the `OrgGraph` to read the hierarchy from
+result:			the list of people to be attached to the base node. A list of tuples from the DB
+base_node:		name of the base node all the names will be attached to.
+isSkill:		flags whether `base_node` is a skill, i.e. not a person (searches for name in a different index)
+lookup:			the people lookup used to find everyone's boss when `isSkill` is set: takes a list of names and returns
+				a dictionary of name --> row. Defaults to reading `graph`
+"""
+def peopleOnNode(tree, graph, result, base_node, isSkill=False, lookup=None):
+
+	# add base_node to tree
+	tree.addNode(base_node, 0)
+
+	# get each person's name and boss' name
+	if isSkill:		# if the base node is not a person's name
+		# grab the people's names and find their entries in the hierarchy (.csv file) all at once
+		names = [item[0] for item in result]
+		rows = (lookup or graphLookup(graph))(names)
+		people = [(name, rows[name][COL_BOSS] if name in rows else "No_Boss_Found") for name in names]
+	else:
+		# create person's and boss' names
+		people = [(nameKey(item[1]), item[2]) for item in result]
+
+	# group the people by boss
+	by_boss = {}
+	for full_term, boss_name in people:
+		by_boss.setdefault(boss_name, []).append(full_term)
+
+	# add each person to the tree
+	for boss_name, names in by_boss.items():
+
+		# get the boss' name if possible
+		boss_lowercase = boss_name.lower() if boss_name != None else ""
+
+		for full_term in names:
+			if (boss_lowercase.islower()):		# check that the name has valid characters
+				addBoss(tree, full_term, boss_name, isSkill=isSkill)		# Add boss to the tree
+
+			tree.addNode(full_term, 1)					# add the name as a node to the list of nodes
+			tree.addLink(full_term, base_node, 1)		# add person-to-base-node link
+
+
+"""
+treeID:		Returns the id of the tree described by `spec`. The id only depends on how the tree is built, so every
+			worker process computes the same id for the same tree.
+
+----Variables----
+spec:		JSON-serializable description of how to build the tree (see `buildTree` in server.py)
+"""
+def treeID(spec):
+	return hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
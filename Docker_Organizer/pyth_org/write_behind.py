@@ -0,0 +1,321 @@
+"""
+Write-behind queue for custom data edits (`cust_data`). An edit is queued and the request carries on; a background
+thread writes everything queued in one transaction every `interval` seconds, so a rush of people filling in their
+skills at once costs one commit per interval instead of one per edit. Edits to the same person's column in the same
+interval are coalesced: only the last value is written.
+
+Reads stay consistent with the edits: the in-memory search index and caches are updated when the edit is made (see
+`server.py`), and `pending` hands out the edits not written yet so DB reads can be patched with `applyEdits`. The queue
+lives in one process. Every batch written also stamps a new version of the table in the ingest metadata table, so a
+`CustWatcher` in each of the other worker processes notices the edit and brings its own indexes up to date.
+"""
+
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from ingest import createMeta, getFingerprint, setFingerprint
+from storage import CUST_COLUMNS
+
+
+"""
+WriteBehind:	queues custom data edits and writes them in batches on a background thread.
+
+----Variables----
+pool:			the `ConnectionPool` the batches are written with
+storage:		the storage backend (see storage.py) doing the writes
+table:			the custom data table, e.g. default.cust_data
+interval:		seconds edits are held to be written together; 0 writes each edit before returning
+retry:			seconds to wait before writing a batch again after it failed
+"""
+class WriteBehind:
+
+	def __init__(self, pool, storage, table, interval=0.25, retry=5.0):
+		self.pool = pool
+		self.storage = storage
+		self.table = table
+		self.interval = interval
+		self.retry = retry
+		self._cond = threading.Condition()
+		self._flush_lock = threading.Lock()		# one batch is written at a time
+		self._adds = {}			# user -> True, for the entries to add, in the order asked for
+		self._fields = {}		# user -> {column: latest value}
+		self._writing = ({}, {})	# the batch being written, (adds, fields); still pending until it's committed
+		self._thread = None
+		self._meta_ready = False	# whether the metadata table the batches stamp their version in is known to exist
+
+		self.edits = 0
+		self.coalesced = 0		# edits overwritten by a later edit before being written
+		self.batches = 0
+		self.rows_written = 0
+		self.errors = 0
+		self.last_batch_ms = 0.0
+		self.max_batch_ms = 0.0
+
+	"""
+	setField:	queues setting `column` of `user`'s custom data to `value`
+	"""
+	def setField(self, user, column, value):
+		if column not in CUST_COLUMNS[1:]:
+			raise ValueError(f'not a custom data column: {column}')
+		with self._cond:
+			fields = self._fields.setdefault(user, {})
+			if column in fields:
+				self.coalesced += 1
+			fields[column] = value
+			self.edits += 1
+		self._queued()
+
+	"""
+	addUser:	queues adding an empty custom data entry for `user`
+	"""
+	def addUser(self, user):
+		with self._cond:
+			if user in self._adds:
+				self.coalesced += 1
+			self._adds[user] = True
+			self.edits += 1
+		self._queued()
+
+	def _queued(self):
+		if self.interval <= 0 and self.flush():
+			return
+		with self._cond:
+			if self._thread is None:
+				self._thread = threading.Thread(target=self._run, name='cust-writes', daemon=True)
+				self._thread.start()
+			self._cond.notify()
+
+	def _run(self):
+		while True:
+			with self._cond:
+				while not self._adds and not self._fields:
+					self._cond.wait()
+			time.sleep(self.interval)		# let the edits made meanwhile join the batch
+			if not self.flush():
+				time.sleep(self.retry)
+
+	"""
+	flush:		writes everything queued in one transaction. Returns False if that failed, in which case the edits stay
+				queued (under any made since) and are tried again.
+	"""
+	def flush(self):
+		with self._flush_lock:
+			with self._cond:
+				adds, fields = self._adds, self._fields
+				self._adds, self._fields = {}, {}
+				self._writing = (adds, fields)
+			if not adds and not fields:
+				return True
+
+			by_column = {}
+			for user, values in fields.items():
+				for column, value in values.items():
+					by_column.setdefault(column, []).append((user, value))
+			rows = len(adds) + sum(len(values) for values in by_column.values())
+
+			start = time.perf_counter()
+			try:
+				with self.pool.connection() as conn:
+					cursor = conn.cursor()
+					try:
+						if not self._meta_ready:
+							createMeta(cursor)		# before the batch's writes, since it commits on MySQL
+							self._meta_ready = True
+						if adds:
+							self.storage.addCusts(cursor, self.table, list(adds))
+						for column, values in by_column.items():
+							self.storage.setCustFields(cursor, self.table, column, values)
+						setFingerprint(cursor, self.table, uuid.uuid4().hex)		# tells the other workers' `CustWatcher`
+						conn.commit()
+					except Exception:
+						conn.rollback()
+						raise
+					finally:
+						cursor.close()
+			except Exception as e:
+				with self._cond:
+					adds.update(self._adds)
+					for user, values in self._fields.items():
+						fields.setdefault(user, {}).update(values)
+					self._adds, self._fields = adds, fields
+					self._writing = ({}, {})
+					self.errors += 1
+				print(f'Writing {rows} custom data edits failed ({e!r}); retrying in {self.retry}s')
+				return False
+
+			ms = (time.perf_counter() - start) * 1000
+			with self._cond:
+				self._writing = ({}, {})
+				self.batches += 1
+				self.rows_written += rows
+				self.last_batch_ms = round(ms, 3)
+				self.max_batch_ms = max(self.max_batch_ms, self.last_batch_ms)
+			return True
+
+	"""
+	pending:	returns the edits not written yet as {user: (whether an entry is being added, {column: value})}, for the
+				people `match(user)` is true for (everyone by default). Take it before reading `cust_data`: an edit is
+				then either in what's read or in what's returned.
+	"""
+	def pending(self, match=None):
+		out = {}
+		with self._cond:
+			for adds, fields in (self._writing, (self._adds, self._fields)):
+				for user in adds:
+					if match is None or match(user):
+						out[user] = (True, out.get(user, (False, {}))[1])
+				for user, values in fields.items():
+					if match is None or match(user):
+						added, current = out.get(user, (False, {}))
+						out[user] = (added, dict(current, **values))
+		return out
+
+	"""
+	close:		writes whatever is still queued, e.g. when the server stops
+	"""
+	def close(self):
+		self.flush()
+
+	def __len__(self):
+		with self._cond:
+			return self._count()
+
+	def _count(self):
+		return len(self._adds) + sum(len(values) for values in self._fields.values())
+
+	"""
+	stats:		returns the queue's counters as a dictionary
+	"""
+	def stats(self):
+		with self._cond:
+			return {
+				'interval':			self.interval,
+				'pending':			self._count(),
+				'edits':			self.edits,
+				'coalesced':		self.coalesced,
+				'batches':			self.batches,
+				'rows_written':		self.rows_written,
+				'errors':			self.errors,
+				'last_batch_ms':	self.last_batch_ms,
+				'max_batch_ms':		self.max_batch_ms,
+			}
+
+
+"""
+CustWatcher:	notices custom data edits written by other worker processes. `check` compares the version stamped by the
+				last batch written (see `WriteBehind.flush`) with the one last seen, at most once every `interval`
+				seconds, and when it moved on hands every `cust_data` row to `on_change(rows, columns)`. The rows
+				include this process's own edits that aren't written yet (see `applyEdits`).
+
+----Variables----
+writes:			this process's `WriteBehind`; its pool, table and pending edits are used
+on_change:		called with the rows of the table (the user first) and their column names
+interval:		seconds between checks of the version
+"""
+class CustWatcher:
+
+	def __init__(self, writes, on_change, interval=2.0):
+		self.writes = writes
+		self.on_change = on_change
+		self.interval = interval
+		self._lock = threading.Lock()		# held while checking, and while the indexes are rebuilt (see `paused`)
+		self._version = None
+		self._next_check = 0.0
+
+		self.checks = 0
+		self.changes = 0
+
+	"""
+	version:	returns the version of the table now in the DB, read with `cursor`
+	"""
+	def version(self, cursor):
+		return getFingerprint(cursor, self.writes.table)
+
+	"""
+	paused:		context manager holding off checks while the indexes are rebuilt from a fresh read of the table, so rows
+				read before the rebuild can't be applied over it. Call `seen` inside it.
+	"""
+	@contextmanager
+	def paused(self):
+		with self._lock:
+			yield
+
+	"""
+	seen:		records that everything up to `version` is in the indexes already, e.g. after they were rebuilt
+	"""
+	def seen(self, version):
+		self._version = version
+
+	"""
+	check:		looks for edits from other processes if the last look was `interval` seconds ago or more, and hands the
+				rows to `on_change` if there were any. Returns whether it did. Doesn't wait if another thread is
+				already looking.
+	"""
+	def check(self):
+		now = time.monotonic()
+		if now < self._next_check or not self._lock.acquire(blocking=False):
+			return False
+		try:
+			self._next_check = now + self.interval
+			self.checks += 1
+			edits = self.writes.pending()		# taken first, so each edit is either read or in `edits`
+			with self.writes.pool.connection() as conn:
+				cursor = conn.cursor()
+				try:
+					version = self.version(cursor)
+					if version == self._version:
+						conn.commit()
+						return False
+					cursor.execute(f'SELECT * from {self.writes.table}')
+					rows, columns = applyEdits(cursor.fetchall(), [column[0] for column in cursor.description], edits)
+					conn.commit()
+				finally:
+					cursor.close()
+			self.on_change(rows, columns)
+			self._version = version
+			self.changes += 1
+			return True
+		except Exception as e:
+			print(f'Checking for custom data edits failed ({e!r})')
+			return False
+		finally:
+			self._lock.release()
+
+	"""
+	stats:		returns the watcher's counters as a dictionary
+	"""
+	def stats(self):
+		return {'interval': self.interval, 'version': self._version, 'checks': self.checks, 'changes': self.changes}
+
+
+"""
+applyEdits:	returns (rows, column names) for `cust_data` rows read from the DB with the edits from `WriteBehind.pending`
+			applied: pending values replace what was read, and people whose entry is still being added get one.
+
+----Variables----
+rows:		the rows read, the user first
+columns:	the rows' column names, or None if unknown (the table's column order is assumed)
+edits:		what `WriteBehind.pending` returned
+"""
+def applyEdits(rows, columns, edits):
+	if not edits:
+		return (rows, columns)
+	columns = list(columns) if columns else list(CUST_COLUMNS)
+	index = {column: i for i, column in enumerate(columns)}
+	out = []
+	seen = set()
+	for row in rows:
+		user = row[0]
+		seen.add(user)
+		if user in edits:
+			row = list(row)
+			for column, value in edits[user][1].items():
+				row[index[column]] = value
+			row = tuple(row)
+		out.append(row)
+	for user, (added, values) in edits.items():
+		if added and user not in seen:
+			out.append(tuple(user if column == 'user' else values.get(column, "") for column in columns))
+	return (out, columns)